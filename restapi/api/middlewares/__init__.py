@@ -1 +1 @@
-from .user_auth import AuthenticationMiddleware
\ No newline at end of file
+from .user_auth import AuthenticationMiddleware, HTTPAuthenticationMiddleware
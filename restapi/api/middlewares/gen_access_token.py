@@ -1,4 +1,6 @@
+import asyncio
 import os
+import secrets
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
@@ -7,19 +9,23 @@ from fastapi.security import (
     OAuth2PasswordRequestForm,
 )
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from wasabi import msg
 from dotenv import load_dotenv
 
+from database.users import UserStore, user_store
+from .password_hasher import PasswordHasher, password_hasher
+from .revocation import TokenRevocationList, revoked_refresh_tokens
+
 load_dotenv()
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 
 class TokenData(BaseModel):
@@ -27,8 +33,6 @@ class TokenData(BaseModel):
     email: Optional[str] = None
     full_name: Optional[str] = None
     idm_role: str
-    disabled: Optional[bool] = None
-    hashed_password: str
 
 
 class User(BaseModel):
@@ -45,50 +49,72 @@ class UserInDB(User):
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 
-oauth2_scheme = APIKeyHeader(name="API-Key", auto_error=False)
-
-DATABASE = {
-    "tim": {
-        "username": "tim",
-        "full_name": "Tim Ruscica",
-        "email": "tim@gmail.com",
-        "idm_role": "Viewer",
-        "hashed_password": "$2b$12$HxWHkvMuL7WrZad6lcCfluNFj1/Zp63lvP5aUrKlSTYtoFzPXHOtu",
-        "disabled": False,
-    }
-}
+# User fields copied into tokens. Tokens are only signed, not encrypted, so anything else a
+# user record holds, such as the password hash, must never be added here.
+TOKEN_CLAIMS = ("username", "email", "full_name", "idm_role")
 
+oauth2_scheme = APIKeyHeader(name="API-Key", auto_error=False)
 
 class GenAccToken:
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-    def __init__(self) -> None:
-
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    REFRESH_TOKEN_EXPIRE_DAYS = 7
+    REFRESH_TOKEN_TYPE = "refresh"
+
+    def __init__(
+        self,
+        hasher: PasswordHasher = password_hasher,
+        revoked_tokens: TokenRevocationList = revoked_refresh_tokens,
+        users: UserStore = user_store,
+    ) -> None:
+        # The hasher (and its CryptContext) is shared process-wide, not built per instance.
+        self.hasher = hasher
+        self.pwd_context = hasher.context
+        self.revoked_tokens = revoked_tokens
+        self.users = users
 
     def generate(self, form_data: OAuth2PasswordRequestForm = Depends()):
         user = self.authenticate_user(
             username=form_data.username, password=form_data.password
         )
+        return self._issue_token(user)
+
+    async def agenerate(self, form_data: OAuth2PasswordRequestForm = Depends()):
+        """
+        Same as `generate`, but the bcrypt check runs on the hasher's worker pool so the
+        event loop keeps serving other requests while a password is verified.
+        """
+        user = await self.aauthenticate_user(
+            username=form_data.username, password=form_data.password
+        )
+        return self._issue_token(user)
+
+    def _issue_token(self, user):
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        return self._issue_token_pair(data=user.model_dump(include=set(TOKEN_CLAIMS)))
+
+    def _issue_token_pair(self, data: dict) -> dict:
         access_token_expires = timedelta(minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = self.create_access_token(
-            data=user.model_dump(),
+            data=data,
             expires_delta=access_token_expires,
         )
-        return {"access_token": access_token, "token_type": "bearer"}
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": self.create_refresh_token(data=data),
+        }
 
     def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return self.hasher.verify(plain_password, hashed_password)
 
     def get_password_hash(self, password):
-        return self.pwd_context.hash(password)
+        return self.hasher.hash(password)
 
     def get_user(self, db=None, token_data: str = None):
         if db is not None and isinstance(token_data, str):
@@ -107,34 +133,93 @@ class GenAccToken:
             )
 
     def authenticate_user(self, username: str, password: str):
-        token_data ={
-            "username": username,
-            "full_name": "full_name",
-            "email": f"{username}@gmail.com",
-            "idm_role": "Viewer",
-            "hashed_password": "hashed_password",
-            "disabled": False,
-        }
-        user = self.get_user(db=None, token_data=token_data)
-        # if not user:
-        #     return False
-        # if not self.verify_password(password, user.hashed_password):
-        #     return False
+        user = self.get_user(db=self.users, token_data=username)
+        if not user or user.disabled:
+            return False
+        if not self.verify_password(password, user.hashed_password):
+            return False
         return user
 
+    async def aauthenticate_user(self, username: str, password: str):
+        # the user store query blocks, so it runs on a worker thread like the bcrypt check
+        user = await asyncio.to_thread(self.get_user, db=self.users, token_data=username)
+        if not user or user.disabled:
+            return False
+        if not await self.hasher.averify(password, user.hashed_password):
+            return False
+        return user
+
+    @staticmethod
+    def _claims(data: dict) -> dict:
+        return {claim: data[claim] for claim in TOKEN_CLAIMS if claim in data}
+
     def create_access_token(
         self, data: dict, expires_delta: Optional[timedelta] = None
     ):
-        to_encode = data.copy()
+        to_encode = self._claims(data)
+        # `exp` must be an absolute UTC instant: jose serialises naive datetimes
+        # as if they were UTC, which skews expiry on hosts in other timezones.
         if expires_delta:
-            expire = datetime.now() + expires_delta
+            expire = datetime.now(timezone.utc) + expires_delta
         else:
-            expire = datetime.now() + timedelta(minutes=15)
+            expire = datetime.now(timezone.utc) + timedelta(minutes=15)
 
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_jwt
 
+    def create_refresh_token(self, data: dict) -> str:
+        to_encode = self._claims(data)
+        expire = datetime.now(timezone.utc) + timedelta(
+            days=self.REFRESH_TOKEN_EXPIRE_DAYS
+        )
+        to_encode.update(
+            {
+                "exp": expire,
+                "typ": self.REFRESH_TOKEN_TYPE,
+                "jti": secrets.token_hex(16),
+            }
+        )
+        return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=self.ALGORITHM)
+
+    def refresh(self, refresh_token: str) -> dict:
+        """
+        Exchanges a refresh token for a new access token and a new refresh token.
+        Args:
+            refresh_token (str): A refresh token issued by `generate` or a previous `refresh`.
+        Returns:
+            dict: The new access token, token type and rotated refresh token.
+        Raises:
+            HTTPException: If the refresh token is invalid, expired, not a refresh token, or
+            has already been used.
+        Notes:
+            - Only the token signature is checked; no password hashing or user lookup happens.
+            - The presented token is revoked, so each refresh token can be used once.
+        """
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        try:
+            payload = jwt.decode(
+                refresh_token, JWT_SECRET_KEY, algorithms=[self.ALGORITHM]
+            )
+        except JWTError:
+            raise credentials_exception
+
+        jti = payload.pop("jti", None)
+        expires_at = payload.pop("exp", None)
+        if payload.pop("typ", None) != self.REFRESH_TOKEN_TYPE or jti is None:
+            raise credentials_exception
+        if not self.is_active(payload.get("username"), payload.get("idm_role")):
+            raise credentials_exception
+        # Revoking is atomic across workers: only the first use of the token gets here.
+        if not self.revoked_tokens.revoke(jti, expires_at=float(expires_at)):
+            raise credentials_exception
+
+        return self._issue_token_pair(data=payload)
+
     def get_current_user(self, token: str = Depends(oauth2_scheme)):
         """
         Retrieves the current user based on the provided authentication token.
@@ -149,11 +234,45 @@ class GenAccToken:
             - The payload must contain "username" and "idm_role" fields.
             - If the user cannot be retrieved from the database, an exception is raised.
         """
+        current_user = self._token_user(token)
+        if not self.is_active(current_user.username, current_user.idm_role):
+            raise self._inactive_user_exception()
+        return current_user
+
+    async def aget_current_user(self, token: str) -> User:
+        """
+        Same as `get_current_user`, but a user whose status is not cached is looked up on a
+        worker thread, so the event loop never waits on the user database.
+        """
+        current_user = self._token_user(token)
+        if not await self.ais_active(current_user.username, current_user.idm_role):
+            raise self._inactive_user_exception()
+        return current_user
+
+    @staticmethod
+    def _inactive_user_exception() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Can not validate current user",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    def _token_user(self, token: str) -> User:
+        """
+        Decodes an access token into its user, without checking that the user is still active.
+        """
         try:
             payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[self.ALGORITHM])
 
             username: str = payload.get("username")
             idm_role: str = payload.get("idm_role")
+            # Refresh tokens are only accepted by `refresh`, never as access tokens.
+            if payload.get("typ") == self.REFRESH_TOKEN_TYPE:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Refresh token can not be used as an access token",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
             if username is None or idm_role is None:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -170,15 +289,25 @@ class GenAccToken:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        current_user = self.get_user(db=None, token_data=token_data.model_dump())
-        if current_user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Can not validate current user",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        return User(**token_data.model_dump())
 
-        return current_user
+    def is_active(self, username: str, idm_role: str) -> bool:
+        """
+        Checks that a token's user still exists, is not disabled and still has the role the
+        token was issued for. Served from the user store's status cache.
+        """
+        return self._status_allows(self.users.get_status(username), idm_role)
+
+    async def ais_active(self, username: str, idm_role: str) -> bool:
+        return self._status_allows(await self.users.aget_status(username), idm_role)
+
+    @staticmethod
+    def _status_allows(user_status, idm_role: str) -> bool:
+        return (
+            user_status is not None
+            and not user_status[1]
+            and user_status[0] == idm_role
+        )
 
     @staticmethod
     def get_user(db: dict = None, token_data: str = None) -> UserInDB:
@@ -186,7 +315,7 @@ class GenAccToken:
         Retrieves a user from a database or a dictionary.
 
         Args:
-            db (dict, optional): A dictionary representing the database. Defaults to None.
+            db (dict, optional): A dictionary or `UserStore` representing the database. Defaults to None.
             token_data (str, optional): The token_data of the user to retrieve. Defaults to None.
                 If a dictionary is passed as token_data, it should contain user data.
 
@@ -214,10 +343,9 @@ class GenAccToken:
             user = AuthenticationMiddleware.get_user(username={"username": "tim", ...})
         """
         if db is not None and isinstance(token_data, str):
-            # TODO: customize this feature to use a real database
-            if token_data in db:
-                token_data = db[token_data]
-                return UserInDB(**token_data)
+            record = db.get(token_data)
+            if record is not None:
+                return UserInDB(**record)
             else:
                 return None  # User not found in the database
 
@@ -231,12 +359,9 @@ class GenAccToken:
 
 
 def generate_access_token():
-    form_data = DATABASE["tim"]
-    form_data = OAuth2PasswordRequestForm(
-        username=form_data["username"], password="tim1234"
-    )
+    form_data = OAuth2PasswordRequestForm(username="tim", password="tim1234")
     token_generator = GenAccToken()
-    token_data = token_generator.login_for_access_token(form_data=form_data)[
+    token_data = token_generator.generate(form_data=form_data)[
         "access_token"
     ]
     msg.text(token_data, color="green")
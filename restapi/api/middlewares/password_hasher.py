@@ -0,0 +1,71 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_CONCURRENCY = int(
+    os.getenv("PASSWORD_HASH_CONCURRENCY", PASSWORD_HASH_WORKERS)
+)
+
+
+class PasswordHasher:
+    """
+    One shared bcrypt `CryptContext` plus a small worker pool for password checks.
+
+    bcrypt takes hundreds of milliseconds per check, so running it inside an `async def`
+    route blocks every other request on the event loop. `averify` runs it on a dedicated
+    thread pool instead (bcrypt releases the GIL), and a semaphore caps how many checks may
+    be in flight, so a login storm queues on the semaphore rather than using every core.
+
+    Args:
+        max_workers (int): Number of threads in the hashing pool.
+        max_concurrency (int): Maximum number of password checks in flight at once.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = PASSWORD_HASH_WORKERS,
+        max_concurrency: int = PASSWORD_HASH_CONCURRENCY,
+    ) -> None:
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password-hasher"
+            )
+        return self._executor
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self.context.verify(plain_password, hashed_password)
+
+    def hash(self, password: str) -> str:
+        return self.context.hash(password)
+
+    async def averify(self, plain_password: str, hashed_password: str) -> bool:
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(
+                self.executor, self.verify, plain_password, hashed_password
+            )
+
+    async def ahash(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(self.executor, self.hash, password)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
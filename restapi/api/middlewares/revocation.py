@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import threading
+import time
+
+from api.routes.token_bucket import RATELIMIT_STORAGE_DIR, RATELIMIT_STORAGE_NAME
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti BLOB PRIMARY KEY,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+_REVOKE = """
+INSERT INTO revoked_tokens (jti, expires_at) VALUES (:jti, :expires_at)
+ON CONFLICT (jti) DO NOTHING
+"""
+_IS_REVOKED = "SELECT 1 FROM revoked_tokens WHERE jti = :jti"
+_PRUNE = "DELETE FROM revoked_tokens WHERE expires_at < :now"
+
+
+class TokenRevocationList:
+    """
+    Revoked refresh token ids (`jti` claims), kept in a SQLite file next to the rate-limit
+    buckets, so every worker on the host sees a revocation as soon as it is made.
+
+    Ids are stored as 16 raw bytes with the token's expiry. Revoking is a single
+    `INSERT ... ON CONFLICT DO NOTHING`: when two workers race to use the same refresh token,
+    exactly one of them inserts the row and wins. Entries are dropped once the token would
+    have expired anyway, so the table only holds refresh tokens still within their lifetime.
+
+    Args:
+        path (str): The SQLite file; defaults to `<RATELIMIT_STORAGE_NAME>-revoked.db` in
+            `RATELIMIT_STORAGE_DIR`.
+        prune_every (int): Number of revocations per thread between two sweeps of expired entries.
+    """
+
+    def __init__(self, path: str = None, prune_every: int = 1024) -> None:
+        self.path = path or os.path.join(
+            RATELIMIT_STORAGE_DIR, f"{RATELIMIT_STORAGE_NAME}-revoked.db"
+        )
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._connection().execute(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.since_prune = 0
+        return connection
+
+    @staticmethod
+    def _key(jti: str) -> bytes:
+        return bytes.fromhex(jti)
+
+    def revoke(self, jti: str, expires_at: float) -> bool:
+        """
+        Revokes a token id.
+        Args:
+            jti (str): The token id, as hex.
+            expires_at (float): Unix time at which the token expires.
+        Returns:
+            bool: True if this call revoked the id, False if it was already revoked.
+        """
+        connection = self._connection()
+        cursor = connection.execute(
+            _REVOKE, {"jti": self._key(jti), "expires_at": expires_at}
+        )
+        self._local.since_prune += 1
+        if self._local.since_prune >= self.prune_every:
+            self._local.since_prune = 0
+            connection.execute(_PRUNE, {"now": time.time()})
+        return cursor.rowcount == 1
+
+    def is_revoked(self, jti: str) -> bool:
+        row = self._connection().execute(_IS_REVOKED, {"jti": self._key(jti)}).fetchone()
+        return row is not None
+
+    def prune(self) -> None:
+        self._connection().execute(_PRUNE, {"now": time.time()})
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM revoked_tokens")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM revoked_tokens").fetchone()[0]
+
+
+revoked_refresh_tokens = TokenRevocationList()
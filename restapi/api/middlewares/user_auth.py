@@ -1,22 +1,23 @@
 import sys
-import os
-from typing import Optional, Union
+from typing import Optional
 
-from fastapi import Depends, Request, status, Response
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from pydantic import BaseModel
 from fastapi.security import APIKeyHeader
+from jose import jwt
 
 sys.path.append("backend/VCP_athfinder/app")
 
 from .gen_access_token import GenAccToken
+from .token_cache import TokenCache
 
 class TokenData(BaseModel):
     username: str
     idm_role: str
-    hashed_password: str
 
 
 class User(BaseModel):
@@ -33,66 +34,159 @@ class UserInDB(User):
 oauth2_scheme = APIKeyHeader(name="API-Key", auto_error=False)
 
 
-# Middleware to handle user authentication
-class AuthenticationMiddleware(BaseHTTPMiddleware):
+PUBLIC_METHODS = ("OPTIONS", "GET")
+PUBLIC_PATHS = ("/login_for_access_token", "/refresh_access_token")
+
+
+class TokenVerifier:
+    """
+    Token checks shared by the authentication middlewares.
+    """
+
     ALGORITHM = "HS256"
 
     token_generator = GenAccToken()
+    token_cache = TokenCache()
 
-    async def dispatch(self, request: Request, call_next):
+    async def authenticate(self, method: str, path: str, bearer_data: Optional[str]):
         """
-        Middleware method to handle user authentication by verifying the presence
-        and validity of an authentication token in the request headers.
+        Applies the authentication rules to a request.
         Args:
-            request (Request): The incoming HTTP request object.
-            call_next (Callable): The next middleware or endpoint to be called.
+            method (str): The HTTP method of the request.
+            path (str): The request path.
+            bearer_data (str): The raw `Authorization` header, if any.
         Returns:
-            JSONResponse: A response with a 401 status code if the authentication
-            token is missing or invalid.
-            Response: The response from the next middleware or endpoint if the
-            authentication token is valid.
+            tuple: `(current_user, None)` when the request may proceed, where `current_user` is
+            None for public requests, or `(None, error_message)` when it must be rejected.
         """
-        if request.method in ["OPTIONS", "GET"]:
-            return await call_next(request)
-        
-        # Skip authentication for the login_for_access_token endpoint
-        if request.url.path == "/login_for_access_token":
-            return await call_next(request)
-        
+        if method in PUBLIC_METHODS:
+            return None, None
+
+        # Skip authentication for the login_for_access_token and refresh_access_token endpoints
+        if path in PUBLIC_PATHS:
+            return None, None
+
         # Perform authentication for other endpoints
-        bearer_data = request.headers.get("Authorization")
         token = bearer_data.replace("Bearer ", "") if bearer_data else None
-
         if not token:
-            return JSONResponse(
-                content="Missing authentication token.",
-                status_code=status.HTTP_401_UNAUTHORIZED,
-            )
+            return None, "Missing authentication token."
 
-        if not self._verify_token(token):
-            return JSONResponse(
-                content="Invalid authentication token.",
-                status_code=status.HTTP_401_UNAUTHORIZED,
-            )
-        return await call_next(request)
+        current_user = await self._get_current_user(token)
+        if current_user is None or current_user.idm_role != "Viewer":
+            return None, "Invalid authentication token."
 
-    def _verify_token(self, token: str = Depends(oauth2_scheme)) -> bool:
+        return current_user, None
+
+    async def _verify_token(self, token: str) -> bool:
         """
         Verifies the provided authentication token and checks if the current user has the Viewer role.
         Args:
             token (str): The authentication token to be verified.
         Returns:
             bool: True if the token is valid and the current user has the Viewer role, False otherwise.
-        Raises:
-            HTTPException: If the authentication token is invalid, an HTTP 401 Unauthorized response is returned.
         """
+        current_user = await self._get_current_user(token)
+        return current_user is not None and current_user.idm_role == "Viewer"
+
+    async def _get_current_user(self, token: str) -> Optional[User]:
+        """
+        Resolves the user behind a token. Verified users are kept in `token_cache` until the
+        token's `exp` claim, so a reused token is not decoded again. A user status missing
+        from the user store's cache is read on a worker thread, off the event loop.
+        Args:
+            token (str): The authentication token to be verified.
+        Returns:
+            User: The authenticated user, or None if the token is invalid.
+        """
+        current_user = self.token_cache.get(token)
+        if current_user is not None:
+            # a cached token is still subject to the user being disabled or changing role
+            if not await self.token_generator.ais_active(
+                current_user.username, current_user.idm_role
+            ):
+                return None
+            return current_user
+
         try:
-            current_user = self.token_generator.get_current_user(token)
-            print(f"Current_user: {current_user}")
-            return current_user.idm_role == "Viewer"
+            current_user = await self.token_generator.aget_current_user(token)
 
         except HTTPException:
-            JSONResponse(
-                content="Invalid authentication token.",
+            return None
+
+        # The signature was checked above, so reading `exp` unverified is safe here.
+        expires_at = jwt.get_unverified_claims(token).get("exp")
+        if expires_at is not None:
+            self.token_cache.set(token, current_user, expires_at=float(expires_at))
+        return current_user
+
+
+# Middleware to handle user authentication
+class AuthenticationMiddleware(TokenVerifier):
+    """
+    Pure ASGI authentication middleware.
+
+    Unlike `BaseHTTPMiddleware`, requests are passed straight to the wrapped app without an
+    extra task or memory stream, so streaming responses are not buffered. The authenticated
+    user is stored on `request.state.user` for the routes behind it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        bearer_data = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                bearer_data = value.decode("latin-1")
+                break
+
+        current_user, error = await self.authenticate(
+            scope["method"], scope["path"], bearer_data
+        )
+        if error is not None:
+            response = JSONResponse(
+                content=error, status_code=status.HTTP_401_UNAUTHORIZED
+            )
+            await response(scope, receive, send)
+            return
+
+        if current_user is not None:
+            scope.setdefault("state", {})["user"] = current_user
+        await self.app(scope, receive, send)
+
+
+class HTTPAuthenticationMiddleware(TokenVerifier, BaseHTTPMiddleware):
+    """
+    `BaseHTTPMiddleware` variant of `AuthenticationMiddleware`, kept for comparison in
+    `benchmarks/bench_auth_middleware.py`.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        """
+        Middleware method to handle user authentication by verifying the presence
+        and validity of an authentication token in the request headers.
+        Args:
+            request (Request): The incoming HTTP request object.
+            call_next (Callable): The next middleware or endpoint to be called.
+        Returns:
+            JSONResponse: A response with a 401 status code if the authentication
+            token is missing or invalid.
+            Response: The response from the next middleware or endpoint if the
+            authentication token is valid.
+        """
+        current_user, error = await self.authenticate(
+            request.method, request.url.path, request.headers.get("Authorization")
+        )
+        if error is not None:
+            return JSONResponse(
+                content=error,
                 status_code=status.HTTP_401_UNAUTHORIZED,
             )
+
+        if current_user is not None:
+            request.state.user = current_user
+        return await call_next(request)
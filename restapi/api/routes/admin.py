@@ -0,0 +1,42 @@
+import os
+from typing import Optional
+
+import fastapi
+from fastapi import HTTPException, Request, status
+from fastapi.params import Depends
+from pydantic import BaseModel, Field
+
+from .search_cache import search_cache
+
+# Comma-separated usernames allowed to call the admin endpoints.
+ADMIN_USERNAMES = {
+    name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()
+}
+
+router = fastapi.APIRouter()
+
+
+def require_admin(request: Request):
+    """
+    Lets the request through only for users listed in `ADMIN_USERNAMES`.
+    Raises:
+        HTTPException: 403 for any other user.
+    """
+    user = getattr(request.state, "user", None)
+    if user is None or user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin rights required."
+        )
+    return user
+
+
+class InvalidateCache(BaseModel):
+    engine_type: Optional[str] = Field(
+        default=None, description="Engine whose entries are dropped; all entries if omitted"
+    )
+
+
+@router.post("/v1/admin/search_cache/invalidate", tags=["Admin"])
+async def invalidate_search_cache(item: InvalidateCache, _=Depends(require_admin)):
+    removed = search_cache.invalidate(item.engine_type)
+    return {"engine_type": item.engine_type, "removed": removed}
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, NamedTuple, Optional, TypeVar
+
+from fastapi import Request
+
+from exceptions import ClientDisconnected, DeadlineExceeded, TypingError
+from .concurrency import PRIORITY_CLASSES
+
+T = TypeVar("T")
+
+# Priority class per `idm_role`; `default` covers every other role and requests without an
+# authenticated user.
+ROLE_PRIORITIES = json.loads(os.getenv("ROLE_PRIORITIES", '{"default": "interactive"}'))
+# Seconds a request stays worth answering when it has no `X-Request-Deadline`, the timeout of
+# the bundled `webapp.py` client; 0 means no deadline.
+REQUEST_DEFAULT_TIMEOUT = float(os.getenv("REQUEST_DEFAULT_TIMEOUT", 45))
+
+admission_stats = {"cancelled_on_disconnect": 0}
+
+
+class Admission(NamedTuple):
+    priority: str
+    # `time.monotonic()` after which nobody waits for the answer, or None
+    deadline: Optional[float]
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+def request_admission(request: Request) -> Admission:
+    """
+    Priority class and deadline of a request, for `AdaptiveConcurrencyLimiter.acquire`.
+
+    The class comes from the user's role in `ROLE_PRIORITIES`; an `X-Request-Priority`
+    header may lower it to `batch` but not raise it. `X-Request-Deadline` is the Unix time,
+    in seconds, after which the client gives up, e.g. its own timeout; without it the
+    deadline is `REQUEST_DEFAULT_TIMEOUT` seconds after arrival.
+    Raises:
+        TypingError: If a header holds an invalid value.
+    """
+    user = getattr(request.state, "user", None)
+    role = user.idm_role if user is not None else "default"
+    priority = ROLE_PRIORITIES.get(role, ROLE_PRIORITIES.get("default", "interactive"))
+
+    requested = request.headers.get("x-request-priority")
+    if requested is not None:
+        if requested not in PRIORITY_CLASSES:
+            raise TypingError(
+                message=f"X-Request-Priority must be one of {', '.join(PRIORITY_CLASSES)}",
+                name="admission",
+            )
+        priority = max(priority, requested, key=PRIORITY_CLASSES.index)
+
+    deadline = None
+    header = request.headers.get("x-request-deadline")
+    if header is not None:
+        try:
+            deadline = time.monotonic() + float(header) - time.time()
+        except ValueError:
+            raise TypingError(
+                message="X-Request-Deadline must be a Unix time in seconds", name="admission"
+            )
+    elif REQUEST_DEFAULT_TIMEOUT > 0:
+        deadline = time.monotonic() + REQUEST_DEFAULT_TIMEOUT
+    return Admission(priority, deadline)
+
+
+def check_deadline(admission: Admission, name: str) -> None:
+    """
+    Raises:
+        DeadlineExceeded: If the request's deadline has passed, so its work is not started.
+    """
+    if admission.expired():
+        raise DeadlineExceeded(message="Request deadline passed", name=name)
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Awaits `work`, cancelling it as soon as the client disconnects, so an abandoned request
+    frees its concurrency slot instead of finishing for nobody. The request body must have
+    been read already.
+    Raises:
+        ClientDisconnected: If the client went away before `work` finished.
+    """
+    task = asyncio.ensure_future(work)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request))
+    gone = False
+    try:
+        await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        gone = not task.done()
+    finally:
+        disconnected.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+    if gone:
+        admission_stats["cancelled_on_disconnect"] += 1
+        raise ClientDisconnected(message="Client disconnected", name="admission")
+    return task.result()
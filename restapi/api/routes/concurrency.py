@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from exceptions import DeadlineExceeded, ServiceError, ServiceOverloaded
+
+# Priority classes in the order their queued requests are served.
+PRIORITY_CLASSES = ("interactive", "batch")
+
+GENERATE_CONCURRENCY_INITIAL = float(os.getenv("GENERATE_CONCURRENCY_INITIAL", 4))
+GENERATE_CONCURRENCY_MIN = float(os.getenv("GENERATE_CONCURRENCY_MIN", 1))
+GENERATE_CONCURRENCY_MAX = float(os.getenv("GENERATE_CONCURRENCY_MAX", 64))
+GENERATE_MAX_QUEUE = int(os.getenv("GENERATE_MAX_QUEUE", 16))
+GENERATE_QUEUE_TIMEOUT = float(os.getenv("GENERATE_QUEUE_TIMEOUT", 1.0))
+# Batch requests only run when no interactive one is waiting, so they may wait longer.
+GENERATE_QUEUE_TIMEOUT_BATCH = float(os.getenv("GENERATE_QUEUE_TIMEOUT_BATCH", 10.0))
+GENERATE_LATENCY_TOLERANCE = float(os.getenv("GENERATE_LATENCY_TOLERANCE", 2.0))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by measured request latency.
+
+    The baseline is the lowest latency among the last `window` requests. A request that takes
+    more than `latency_tolerance` times the baseline, or fails with `ServiceError`, means the
+    backend is queueing internally, so the limit is multiplied by `backoff` (at most once per
+    baseline latency). Otherwise, while the limit is actually in use, it grows by `1 / limit`
+    per request, i.e. by one per round of requests.
+
+    Requests above the limit wait in a short queue of `max_queue` entries for at most
+    `queue_timeout` seconds (`batch_queue_timeout` for batch requests); beyond that they are
+    shed with `ServiceOverloaded` instead of piling up in front of the backend. Freed slots go
+    to interactive requests before batch ones, and within a class to the earliest deadline.
+    A full queue sheds its last batch request to make room for an interactive one. A request
+    whose deadline passes before it gets a slot fails with `DeadlineExceeded` without running.
+
+    Args:
+        initial_limit (float): Starting concurrency limit.
+        min_limit (float): Lowest limit the backoff may reach.
+        max_limit (float): Highest limit the additive increase may reach.
+        max_queue (int): Number of requests allowed to wait for a slot.
+        queue_timeout (float): Seconds a request may wait for a slot before being shed.
+        batch_queue_timeout (float): `queue_timeout` of batch requests.
+        latency_tolerance (float): Latency ratio to the baseline treated as overload.
+        backoff (float): Factor applied to the limit on overload.
+        window (int): Number of recent latencies the baseline is taken from.
+        name (str): Name of the limited service, reported in its errors.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = GENERATE_CONCURRENCY_INITIAL,
+        min_limit: float = GENERATE_CONCURRENCY_MIN,
+        max_limit: float = GENERATE_CONCURRENCY_MAX,
+        max_queue: int = GENERATE_MAX_QUEUE,
+        queue_timeout: float = GENERATE_QUEUE_TIMEOUT,
+        latency_tolerance: float = GENERATE_LATENCY_TOLERANCE,
+        backoff: float = 0.9,
+        window: int = 100,
+        batch_queue_timeout: float = GENERATE_QUEUE_TIMEOUT_BATCH,
+        name: str = "generate",
+    ) -> None:
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.batch_queue_timeout = batch_queue_timeout
+        self.name = name
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self.shed = 0
+        self.expired = 0
+        self.completed = 0
+        # heap of (priority rank, deadline, arrival, future)
+        self._waiters = []
+        self._queued = 0
+        self._sequence = 0
+        self._latencies = deque(maxlen=window)
+        self._last_decrease = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @asynccontextmanager
+    async def acquire(self, priority: str = "interactive", deadline: Optional[float] = None):
+        """
+        Holds one concurrency slot for the duration of the `async with` block.
+        Args:
+            priority (str): One of `PRIORITY_CLASSES`; earlier classes are served first.
+            deadline (float): `time.monotonic()` after which the work is no longer wanted.
+        Raises:
+            ServiceOverloaded: If no slot frees up within the queue limits.
+            DeadlineExceeded: If `deadline` passes before a slot is granted.
+        """
+        await self._admit(priority, deadline)
+        if deadline is not None and time.monotonic() >= deadline:
+            # the slot came too late for this request, so it goes to the next one
+            self.expired += 1
+            self._hand_over()
+            raise DeadlineExceeded(message="Request deadline passed", name=self.name)
+        in_flight = self.in_flight
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except ServiceError:
+            failed = True
+            raise
+        finally:
+            self._release(time.perf_counter() - start, in_flight, failed)
+
+    async def _admit(self, priority: str, deadline: Optional[float]) -> None:
+        rank = PRIORITY_CLASSES.index(priority)
+        timeout = self.batch_queue_timeout if priority == "batch" else self.queue_timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.expired += 1
+                raise DeadlineExceeded(message="Request deadline passed", name=self.name)
+            timeout = min(timeout, remaining)
+
+        if self.in_flight < int(self.limit) and not self._queued:
+            self.in_flight += 1
+            return
+
+        order = (rank, math.inf if deadline is None else deadline)
+        if self._queued >= self.max_queue and not self._shed_waiter_below(rank):
+            self.shed += 1
+            raise ServiceOverloaded(message="Too many concurrent requests", name=self.name)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._sequence += 1
+        heapq.heappush(self._waiters, (*order, self._sequence, waiter))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except BaseException as error:
+            # the slot may have been handed over just as this request timed out or was cancelled
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self._hand_over()
+            if isinstance(error, asyncio.TimeoutError):
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.expired += 1
+                    raise DeadlineExceeded(
+                        message="Request deadline passed", name=self.name
+                    ) from error
+                self.shed += 1
+                raise ServiceOverloaded(
+                    message="Too many concurrent requests", name=self.name
+                ) from error
+            raise
+        finally:
+            self._queued -= 1
+            # finished waiters are skipped by `_hand_over`; rebuild once they dominate
+            if len(self._waiters) > 2 * self._queued + 16:
+                self._waiters = [entry for entry in self._waiters if not entry[-1].done()]
+                heapq.heapify(self._waiters)
+
+    def _shed_waiter_below(self, rank: int) -> bool:
+        # Makes room in a full queue by shedding the waiter served last, if its class ranks
+        # below `rank`, e.g. a batch request when an interactive one arrives.
+        waiting = [entry for entry in self._waiters if not entry[-1].done()]
+        if not waiting:
+            return False
+        last = max(waiting, key=lambda entry: entry[:3])
+        if last[0] <= rank:
+            return False
+        self.shed += 1
+        last[-1].set_exception(
+            ServiceOverloaded(message="Too many concurrent requests", name=self.name)
+        )
+        return True
+
+    def _release(self, latency: float, in_flight: int, failed: bool) -> None:
+        self.completed += 1
+        now = time.perf_counter()
+        baseline = min(self._latencies) if self._latencies else None
+        self._latencies.append(latency)
+
+        overloaded = failed or (
+            baseline is not None and latency > baseline * self.latency_tolerance
+        )
+        if overloaded:
+            if now - self._last_decrease > (baseline or latency):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif in_flight >= self.limit / 2:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self._hand_over()
+
+    def _hand_over(self) -> None:
+        # Pass the slot straight to the first live waiter in priority and deadline order if
+        # the limit still allows it.
+        if self.in_flight <= int(self.limit):
+            while self._waiters:
+                waiter = heapq.heappop(self._waiters)[-1]
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "shed": self.shed,
+            "expired": self.expired,
+            "completed": self.completed,
+            "baseline_latency_ms": round(min(self._latencies) * 1000, 2)
+            if self._latencies
+            else None,
+        }
@@ -1,4 +1,3 @@
-import gc
 import os
 
 import fastapi
@@ -53,7 +52,6 @@ async def webapp_feedback(response: Response, context: FeedBack):
             result = {"error": "something wrong with server"}
     except Exception as e:
         logger.exception(e)
-    gc.collect()
     return result
 
 
@@ -85,5 +83,4 @@ async def feedback(response: Response, request: UserFeedback):
             result = {"error": "something wrong with server"}
     except Exception as e:
         logger.exception(e)
-    gc.collect()
     return result
@@ -1,5 +1,4 @@
 import copy
-import gc
 import os
 import sys
 import time
@@ -49,6 +48,5 @@ async def upload_file(response: Response, task: str = "", file: UploadFile = Fil
         finally:
             pass
 
-    gc.collect()
     torch.cuda.empty_cache()
     return result
@@ -1,3 +1,6 @@
+import asyncio
+from typing import Optional
+
 from pydantic import BaseModel
 from fastapi import status, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
@@ -6,20 +9,32 @@ from api.middlewares.gen_access_token import GenAccToken
 
 router = APIRouter()
 
+# Built once at import time and shared by every login request.
+token_generator = GenAccToken()
+
 class GenToken(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshToken(BaseModel):
+    refresh_token: str
+
 
 @router.post("/login_for_access_token", response_model=GenToken, tags=["Token"])
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user_info = OAuth2PasswordRequestForm(
-        username=form_data.username, password=form_data
-    )
-    token_data = GenAccToken().generate(form_data=user_info)
+    token_data = await token_generator.agenerate(form_data=form_data)
     if not token_data:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return token_data
\ No newline at end of file
+    return token_data
+
+
+@router.post("/refresh_access_token", response_model=GenToken, tags=["Token"])
+async def refresh_access_token(item: RefreshToken):
+    # the user lookup and the revocation write block, so they run off the event loop
+    return await asyncio.to_thread(token_generator.refresh, item.refresh_token)
@@ -1,18 +1,49 @@
-import gc
+import asyncio
+import time
+from typing import AsyncIterator, Optional
 
 import fastapi
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.params import Depends
-from .limiter import limiter
+from fastapi.responses import StreamingResponse
+from .admission import (
+    Admission,
+    admission_stats,
+    cancel_on_disconnect,
+    check_deadline,
+    request_admission,
+    wait_for_disconnect,
+)
+from .concurrency import AdaptiveConcurrencyLimiter
+from .generation_cache import generation_cache
+from .limiter import limiter, role_quota
+from . import metrics
 
-from exceptions import TypingError, ServiceError
+from exceptions import DeadlineExceeded, TypingError, ServiceError, ServiceOverloaded
 from fastapi import HTTPException, Request
-from modules.generate import generator
+from modules.generate import agenerator, check_context, sse_event, stream_generator
 from modules.core import LLMGeneratorInit, init_generator
+from modules.histogram import Histogram
+from modules.streaming import GENERATE_MAX_STREAMS
 from schemas import GenerateQuery
 
 router = fastapi.APIRouter()
 
+SSE = "text/event-stream"
+
+# Sheds `/v1/from_search` requests with 503 once the generator is saturated.
+generate_concurrency = AdaptiveConcurrencyLimiter()
+metrics.register("generate_concurrency", generate_concurrency.stats)
+metrics.register("admission", lambda: dict(admission_stats))
+metrics.register("generation_cache", generation_cache.stats)
+
+stream_stats = {"active": 0, "completed": 0, "disconnected": 0}
+time_to_first_token_ms = Histogram([10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000])
+metrics.register(
+    "generate_stream",
+    lambda: {**stream_stats, "time_to_first_token_ms": time_to_first_token_ms.stats()},
+)
+
 
 @router.get("/v1/generate/healthcheck", include_in_schema=False)
 async def healthcheck():
@@ -27,15 +58,131 @@ async def custom_swagger_ui_html():
     )
 
 
+class _StreamSlot:
+    """
+    One of the `GENERATE_MAX_STREAMS` streams. The route takes it before it returns, so a
+    burst of requests cannot all pass the check before any stream starts; it is released
+    once, by whichever of the stream or the response ends first.
+    """
+
+    def __init__(self) -> None:
+        if stream_stats["active"] >= GENERATE_MAX_STREAMS:
+            raise ServiceOverloaded(message="Too many concurrent streams", name="generate")
+        stream_stats["active"] += 1
+        self.held = True
+
+    def release(self, completed: bool) -> None:
+        if self.held:
+            self.held = False
+            stream_stats["active"] -= 1
+            stream_stats["completed" if completed else "disconnected"] += 1
+
+
+class _SSEResponse(StreamingResponse):
+    """`StreamingResponse` releasing its stream slot even when its body never starts."""
+
+    def __init__(self, content: AsyncIterator[bytes], stream_slot: _StreamSlot, **kwargs) -> None:
+        super().__init__(content, **kwargs)
+        self.stream_slot = stream_slot
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.stream_slot.release(completed=False)
+
+
+async def _stream_events(
+    request: Request,
+    events: AsyncIterator[bytes],
+    started: float,
+    admission: Admission,
+    stream_slot: Optional[_StreamSlot] = None,
+) -> AsyncIterator[bytes]:
+    # Forwards events as they are produced and closes `events`, which stops decoding, as
+    # soon as the client disconnects. A concurrency slot is held until the first token, the
+    # part of a stream comparable to a plain request; headers are already sent by then, so
+    # a shed stream gets an `error` event.
+    stream_slot = stream_slot or _StreamSlot()
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request))
+    slot = generate_concurrency.acquire(admission.priority, admission.deadline)
+    holding = False
+    completed = False
+    next_event = None
+    try:
+        try:
+            await slot.__aenter__()
+            holding = True
+        except (ServiceOverloaded, DeadlineExceeded) as error:
+            completed = True
+            yield sse_event("error", {"message": error.message})
+            return
+
+        while True:
+            next_event = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                return
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                completed = True
+                return
+            if holding:
+                holding = False
+                time_to_first_token_ms.observe((time.perf_counter() - started) * 1000)
+                await slot.__aexit__(None, None, None)
+            yield event
+    finally:
+        # the server may also close this iterator when a write to a gone client fails
+        stream_slot.release(completed)
+        disconnected.cancel()
+        if next_event is not None and not next_event.done():
+            # the generator must finish unwinding before it can be closed
+            next_event.cancel()
+            await asyncio.wait({next_event})
+        await events.aclose()
+        if holding:
+            await slot.__aexit__(None, None, None)
+
+
 @router.post("/v1/from_search", status_code=200, tags=["Generate"])
-@limiter.limit("1/second")
+@limiter.limit(role_quota)
 async def generate(
     request: Request,
     item: GenerateQuery,
     llm_generator: LLMGeneratorInit = Depends(init_generator),
+    admission: Admission = Depends(request_admission),
 ):
+    # Work whose client has given up is never started.
+    check_deadline(admission, "generate")
+
+    # Opt-in token streaming over Server-Sent Events.
+    if SSE in request.headers.get("accept", ""):
+        started = time.perf_counter()
+        try:
+            check_context(item.context)
+        except TypingError as error:
+            raise HTTPException(status_code=404) from error
+        stream_slot = _StreamSlot()
+        return _SSEResponse(
+            _stream_events(
+                request, stream_generator(item, llm_generator), started, admission, stream_slot
+            ),
+            stream_slot,
+            media_type=SSE,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def compute():
+        async with generate_concurrency.acquire(admission.priority, admission.deadline):
+            return await agenerator(item, llm_generator)
+
     try:
-        result = generator(item, llm_generator)
+        # repeated queries are answered from the cache without taking a concurrency slot
+        result = await cancel_on_disconnect(
+            request, generation_cache.get_or_compute(item, llm_generator.fingerprint, compute)
+        )
 
     except TypingError as error:
         raise HTTPException(status_code=404) from error
@@ -46,5 +193,4 @@ async def generate(
     finally:
         print("save_to_db...")
 
-    gc.collect()
     return result
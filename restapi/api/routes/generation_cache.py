@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from .search_cache import query_key
+
+GENERATION_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", "generation_cache.db")
+# Upper bound on the cached responses; 0 disables the cache.
+GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Eviction frees space down to this fraction of the bound, so it does not run on every insert.
+GENERATION_CACHE_LOW_WATERMARK = float(os.getenv("GENERATION_CACHE_LOW_WATERMARK", 0.9))
+# Seconds between two `last_used` updates of an entry, which keeps hot hits read-only.
+GENERATION_CACHE_TOUCH_INTERVAL = float(os.getenv("GENERATION_CACHE_TOUCH_INTERVAL", 60))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key BLOB PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+DROP INDEX IF EXISTS responses_last_used;
+CREATE INDEX IF NOT EXISTS responses_last_used_size ON responses (last_used, size);
+"""
+# covered by `responses_last_used_size`, like `_OLDEST`, so it reads no bodies
+_USAGE = "SELECT COUNT(*), SUM(size) FROM responses"
+_GET = "SELECT body, last_used FROM responses WHERE key = :key"
+_TOUCH = "UPDATE responses SET last_used = :now WHERE key = :key"
+_PUT = """
+INSERT OR REPLACE INTO responses (key, fingerprint, body, size, last_used)
+VALUES (:key, :fingerprint, :body, :size, :now)
+"""
+_OLDEST = "SELECT key, size FROM responses ORDER BY last_used"
+
+
+def generation_key(item, fingerprint: str) -> bytes:
+    """
+    SHA-256 of the generator's fingerprint and the query's task, domain and context, with
+    runs of whitespace in the context collapsed.
+    """
+    return hashlib.sha256(fingerprint.encode() + query_key(item)).digest()
+
+
+class GenerationCache:
+    """
+    Generated responses kept in a SQLite file, so they outlive restarts and are shared by
+    every worker on the host.
+
+    Entries are keyed by `generation_key`, which includes the fingerprint of the generator's
+    model version and configs, so a response of another model is never served. `purge`
+    drops such entries for good. Least recently used entries are evicted once the stored
+    bodies exceed `max_bytes`.
+
+    Concurrent misses on the same key are merged like in `SearchResultCache`. Failed
+    generations are not cached. In `get_or_compute` the SQLite reads and writes run on a
+    worker thread, and a failing cache, e.g. a locked or full file, only costs a miss: the
+    error is logged and the response is still served. Every write recounts the file's
+    entries, since other workers write to it too; `stats` serves the last count and never
+    touches the file.
+
+    Args:
+        path (str): The SQLite file.
+        max_bytes (int): Upper bound on the stored bodies; 0 disables the cache.
+    """
+
+    def __init__(
+        self, path: str = GENERATION_CACHE_PATH, max_bytes: int = GENERATION_CACHE_MAX_BYTES
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self._bytes_used: Optional[int] = None
+        self._entries: Optional[int] = None
+        self._in_flight: Dict[bytes, asyncio.Future] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # opened on first use, so importing the routes creates no file
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # losing the last writes on power loss only costs regenerating them
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    @property
+    def bytes_used(self) -> int:
+        if self._bytes_used is None:
+            self._recount()
+        return self._bytes_used
+
+    def _recount(self) -> int:
+        entries, bytes_used = self._connection().execute(_USAGE).fetchone()
+        self._entries, self._bytes_used = entries, bytes_used or 0
+        return self._bytes_used
+
+    def get(self, key: bytes) -> Any:
+        """Returns the cached response for `key`, or None."""
+        connection = self._connection()
+        row = connection.execute(_GET, {"key": key}).fetchone()
+        if row is None:
+            return None
+        body, last_used = row
+        now = time.time()
+        if now - last_used > GENERATION_CACHE_TOUCH_INTERVAL:
+            connection.execute(_TOUCH, {"key": key, "now": now})
+        return json.loads(body)
+
+    def set(self, key: bytes, fingerprint: str, response: Any) -> None:
+        body = json.dumps(response).encode()
+        if len(body) > self.max_bytes:
+            return
+        params = {
+            "key": key,
+            "fingerprint": fingerprint,
+            "body": body,
+            "size": len(body),
+            "now": time.time(),
+        }
+        with self._lock:
+            self._connection().execute(_PUT, params)
+            # counts what every worker wrote, not only this one
+            if self._recount() > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        connection = self._connection()
+        excess = self._bytes_used - int(self.max_bytes * GENERATION_CACHE_LOW_WATERMARK)
+        keys = []
+        for key, size in connection.execute(_OLDEST):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+            self._bytes_used -= size
+        connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self._entries -= len(keys)
+        self.evictions += len(keys)
+
+    async def get_or_compute(
+        self, item, fingerprint: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Returns the cached response to `item` from the generator with `fingerprint`,
+        joining an identical in-flight generation or starting one with `compute()` on a miss.
+        """
+        if not self.enabled:
+            return await compute()
+        key = generation_key(item, fingerprint)
+        try:
+            response = await asyncio.to_thread(self.get, key)
+        except (sqlite3.Error, ValueError) as error:
+            logger.warning(f"Generation cache read failed: {error!r}")
+            response = None
+        if response is not None:
+            self.hits += 1
+            return response
+
+        future = self._in_flight.get(key)
+        while future is not None:
+            self.merged += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the request computing it was cancelled, e.g. its client went away
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            future = self._in_flight.get(key)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # retrieve it so a miss nobody else waited on does not log "never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            # the finished future stays in flight until written, so new requests join it
+            try:
+                await asyncio.to_thread(self.set, key, fingerprint, response)
+            except (sqlite3.Error, TypeError, ValueError) as error:
+                logger.warning(f"Generation cache write failed: {error!r}")
+            return response
+        finally:
+            del self._in_flight[key]
+
+    def purge(self, fingerprint: str) -> int:
+        """
+        Drops the entries of every generator but the one with `fingerprint`, e.g. after the
+        model was upgraded.
+        Returns:
+            int: Number of entries dropped.
+        """
+        with self._lock:
+            cursor = self._connection().execute(
+                "DELETE FROM responses WHERE fingerprint != :fingerprint",
+                {"fingerprint": fingerprint},
+            )
+            self._recount()
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM responses")
+            self._entries = self._bytes_used = 0
+
+    def stats(self) -> dict:
+        # served from the counts of the last write or purge, so it never blocks on the file
+        lookups = self.hits + self.misses + self.merged
+        stats = {
+            "enabled": self.enabled,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.merged) / lookups, 4) if lookups else 0.0,
+        }
+        if self.enabled:
+            stats["entries"] = self._entries
+            stats["bytes_used"] = self._bytes_used
+        return stats
+
+
+generation_cache = GenerationCache()
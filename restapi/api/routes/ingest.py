@@ -0,0 +1,57 @@
+import asyncio
+
+import fastapi
+from fastapi import HTTPException, status
+from fastapi.params import Depends
+
+from .admin import require_admin
+from .search_cache import search_cache
+from modules.core import SearcherInit, init_searcher
+from modules.engines.segments import SegmentedIndex
+from schemas import DeleteDocuments, IngestDocuments
+
+router = fastapi.APIRouter()
+
+
+async def _segmented_index(search_engine: SearcherInit) -> SegmentedIndex:
+    # the first use of the engine builds its index, which must not block the event loop
+    index = await asyncio.to_thread(search_engine.backends.get, "numpy")
+    if not isinstance(index, SegmentedIndex):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The search engine does not accept new documents.",
+        )
+    return index
+
+
+def _invalidate_cached_results() -> None:
+    # engines reading the vector index see the change right away, cached results do not
+    search_cache.invalidate("numpy")
+    search_cache.invalidate("hybrid")
+
+
+@router.post("/v1/documents", tags=["Ingest"])
+async def ingest_documents(
+    item: IngestDocuments,
+    _=Depends(require_admin),
+    search_engine: SearcherInit = Depends(init_searcher),
+):
+    index = await _segmented_index(search_engine)
+    seq = await asyncio.to_thread(
+        index.add,
+        [document.id for document in item.documents],
+        [document.text for document in item.documents],
+    )
+    _invalidate_cached_results()
+    return {"ingested": len(item.documents), "seq": seq}
+
+
+@router.post("/v1/documents/delete", tags=["Ingest"])
+async def delete_documents(
+    item: DeleteDocuments,
+    _=Depends(require_admin),
+    search_engine: SearcherInit = Depends(init_searcher),
+):
+    seq = (await _segmented_index(search_engine)).delete(item.ids)
+    _invalidate_cached_results()
+    return {"deleted": len(item.ids), "seq": seq}
@@ -1,4 +1,79 @@
+import json
+import math
+import os
+import time
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+from .token_bucket import SQLiteTokenBuckets, TokenBucketRateLimiter
+
+# `token-bucket` shares the buckets between every uvicorn worker on the host; any other
+# value falls back to slowapi's own per-process strategies (e.g. `fixed-window`).
+RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "token-bucket")
+
+# Quota per `idm_role`, as slowapi limit strings; `default` covers every other role and
+# requests without an authenticated user.
+RATE_LIMIT_TIERS = json.loads(
+    os.getenv("RATE_LIMIT_TIERS", '{"Viewer": "1/second", "default": "1/second"}')
+)
+
+
+def principal_key(request: Request) -> str:
+    """
+    Rate-limit key for a request: `<idm_role>:<username>` of the user the authentication
+    middleware already verified, or the client address when there is none. Clients behind
+    the same load balancer or NAT therefore get separate buckets.
+    """
+    user = getattr(request.state, "user", None)
+    if user is None:
+        return f"ip:{get_remote_address(request)}"
+    return f"{user.idm_role}:{user.username}"
+
+
+def role_quota(key: str) -> str:
+    """
+    Limit string for a key built by `principal_key`, looked up in `RATE_LIMIT_TIERS`.
+    """
+    role = key.split(":", 1)[0]
+    return RATE_LIMIT_TIERS.get(role, RATE_LIMIT_TIERS["default"])
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse:
+    """
+    Like slowapi's handler, but always tells the client when to retry through `Retry-After`.
+    """
+    response = JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.detail}"}, status_code=429
+    )
+    current_limit = getattr(request.state, "view_rate_limit", None)
+    if current_limit is not None:
+        reset_at, _ = limiter.limiter.get_window_stats(
+            current_limit[0], *current_limit[1]
+        )
+        response.headers["Retry-After"] = str(max(1, math.ceil(reset_at - time.time())))
+    return limiter._inject_headers(response, current_limit)
+
+
+class SharedLimiter(Limiter):
+    """
+    slowapi `Limiter` whose decisions are made by `TokenBucketRateLimiter`, so a limit such
+    as `1/second` holds for the host instead of once per worker.
+    """
+
+    def __init__(self, *args, buckets: SQLiteTokenBuckets = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets or SQLiteTokenBuckets()
+        self._limiter = TokenBucketRateLimiter(self.buckets)
+
+    def reset(self) -> None:
+        self.buckets.reset()
+
+
+if RATELIMIT_STRATEGY == "token-bucket":
+    limiter = SharedLimiter(key_func=principal_key)
+else:
+    limiter = Limiter(key_func=principal_key, strategy=RATELIMIT_STRATEGY)
@@ -0,0 +1,19 @@
+from typing import Callable, Dict
+
+import fastapi
+
+router = fastapi.APIRouter()
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, collector: Callable[[], dict]) -> None:
+    """
+    Adds a component to `/v1/metrics`; `collector` returns its current stats as a dict.
+    """
+    _collectors[name] = collector
+
+
+@router.get("/v1/metrics", include_in_schema=False)
+async def metrics():
+    return {name: collector() for name, collector in _collectors.items()}
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Request, Response, status
 from dotenv import load_dotenv
 
-from api.routes import generate, search, gen_token
+from api.middlewares import AuthenticationMiddleware
+from api.routes import admin, generate, ingest, search, gen_token, metrics
 
 
 load_dotenv()
@@ -11,8 +12,21 @@ router = APIRouter()
 router.include_router(gen_token.router, tags=["Token"]) 
 router.include_router(search.router, tags=["Search"])
 router.include_router(generate.router, tags=["Generate"])
+router.include_router(metrics.router)
+router.include_router(admin.router)
+router.include_router(ingest.router)
+
+metrics.register("token_cache", AuthenticationMiddleware.token_cache.stats)
 
 
 @router.get("/", include_in_schema=False)
 async def read_root():
     return Response("Server is serving...")
+
+
+@router.get("/ready", include_in_schema=False)
+async def ready(request: Request, response: Response):
+    if not getattr(request.app.state, "ready", False):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"message": "warming up"}
+    return {"message": "ready"}
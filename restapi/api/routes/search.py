@@ -1,17 +1,43 @@
-import gc
+import os
+
 import fastapi
 from fastapi.openapi.docs import get_swagger_ui_html
-from fastapi import HTTPException, Request
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.params import Depends
 
-from .limiter import limiter
+from .admission import Admission, cancel_on_disconnect, check_deadline, request_admission
+from .concurrency import AdaptiveConcurrencyLimiter
+from .limiter import limiter, role_quota
+from .search_cache import query_key, search_cache, with_query
+from . import metrics
 from exceptions import TypingError, ServiceError
-from modules.search import searcher
+from modules.search import asearcher, check_context, stream_searcher
 from modules.core import init_searcher, SearcherInit
 from schemas import SearchQuery
 
 router = fastapi.APIRouter()
 
+NDJSON = "application/x-ndjson"
+# Searches running at once; search latency varies too much between engines and cache
+# states for the adaptive limit, so this one is fixed.
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", 16))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", 64))
+SEARCH_QUEUE_TIMEOUT = float(os.getenv("SEARCH_QUEUE_TIMEOUT", 5.0))
+SEARCH_QUEUE_TIMEOUT_BATCH = float(os.getenv("SEARCH_QUEUE_TIMEOUT_BATCH", 30.0))
+
+search_concurrency = AdaptiveConcurrencyLimiter(
+    initial_limit=SEARCH_CONCURRENCY,
+    min_limit=SEARCH_CONCURRENCY,
+    max_limit=SEARCH_CONCURRENCY,
+    max_queue=SEARCH_MAX_QUEUE,
+    queue_timeout=SEARCH_QUEUE_TIMEOUT,
+    batch_queue_timeout=SEARCH_QUEUE_TIMEOUT_BATCH,
+    name="search",
+)
+metrics.register("search_cache", search_cache.stats)
+metrics.register("search_concurrency", search_concurrency.stats)
+
 
 @router.get("/v1/search/healthcheck", include_in_schema=False)
 async def healthcheck():
@@ -27,14 +53,36 @@ async def custom_swagger_ui_html():
 
 
 @router.post("/v1/from_query", status_code=200, tags=["Search"])
-@limiter.limit("1/second")
+@limiter.limit(role_quota)
 async def search(
     request: Request,
     item: SearchQuery,
     search_engine: SearcherInit = Depends(init_searcher),
+    admission: Admission = Depends(request_admission),
 ):
+    # Work whose client has given up is never started.
+    check_deadline(admission, "search")
+
+    # Opt-in NDJSON streaming; the rate limit above and the auth middleware still apply.
+    if NDJSON in request.headers.get("accept", ""):
+        if isinstance(item.context, str):
+            try:
+                check_context(item.context)
+            except TypingError as error:
+                raise HTTPException(status_code=404) from error
+        return StreamingResponse(stream_searcher(item, search_engine), media_type=NDJSON)
+
+    async def compute() -> bytes:
+        async with search_concurrency.acquire(admission.priority, admission.deadline):
+            result = await asearcher(item, search_engine)
+        return result.model_dump_json().encode()
+
     try:
-        result = searcher(item, search_engine)
+        # identical queries are answered from the cache, or share one in-flight search
+        body = await cancel_on_disconnect(
+            request, search_cache.get_or_compute(query_key(item), item.engine_type, compute)
+        )
+        body = with_query(body, item.context)
 
     except TypingError as error:
         raise HTTPException(status_code=404) from error
@@ -45,5 +93,4 @@ async def search(
     finally:
         print("save_to_db...")
 
-    gc.collect()
-    return result
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 300))
+# Rough per-entry cost of the key, the tuple and the dict slot, on top of the payload.
+ENTRY_OVERHEAD = 200
+
+
+def _normalize_context(context):
+    if isinstance(context, list):
+        return [" ".join(text.split()) for text in context]
+    return " ".join(context.split())
+
+
+def query_key(item) -> bytes:
+    """
+    SHA-256 of the query's fields as canonical JSON, with runs of whitespace in the context
+    collapsed, so payloads differing only in field order or spacing share an entry.
+    """
+    fields = item.model_dump()
+    fields["context"] = _normalize_context(fields["context"])
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).digest()
+
+
+def with_query(body: bytes, context) -> bytes:
+    """
+    Returns a cached response body with the query fields set to this request's `context`.
+
+    Entries are shared by queries that differ only in spacing, so the body may echo the
+    query of the request that computed it. The body is only rewritten when it does.
+    """
+    response = json.loads(body)
+    if "results" in response:
+        items = response["results"]
+        if [item["query"] for item in items] == context:
+            return body
+        for item, query in zip(items, context):
+            item["query"] = query
+    else:
+        if response.get("query") == context:
+            return body
+        response["query"] = context
+    return json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class SearchResultCache:
+    """
+    LRU + TTL cache of serialised search responses, bounded by bytes.
+
+    Each entry holds the response body as JSON bytes, so its size is known exactly and a
+    hit is returned without rebuilding the pydantic models. Least recently used entries are
+    evicted once the payloads exceed `max_bytes`.
+
+    Concurrent misses on the same key are merged: the first request computes the result and
+    the others await the same future, so a burst of identical queries costs one backend call.
+    A failed computation is raised to every waiter and not cached.
+
+    Args:
+        max_bytes (int): Upper bound on the cached payloads plus per-entry overhead.
+        ttl (float): Seconds an entry is served before it is recomputed.
+    """
+
+    def __init__(
+        self, max_bytes: int = SEARCH_CACHE_MAX_BYTES, ttl: float = SEARCH_CACHE_TTL
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        # key -> (body, expires_at, engine_type)
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._in_flight: Dict[bytes, asyncio.Future] = {}
+        # bumped by `invalidate`, so results computed before it are not stored after it
+        self._generations: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: bytes, body: bytes, engine_type: str) -> None:
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, time.monotonic() + self.ttl, engine_type)
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: bytes) -> None:
+        body, _, _ = self._entries.pop(key)
+        self.bytes_used -= len(body) + ENTRY_OVERHEAD
+
+    def _generation(self, engine_type: str) -> tuple:
+        return self._generations.get(None, 0), self._generations.get(engine_type, 0)
+
+    async def get_or_compute(
+        self, key: bytes, engine_type: str, compute: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """
+        Returns the cached body for `key`, joining an identical in-flight computation or
+        starting one with `compute()` on a miss.
+        """
+        body = self.get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        future = self._in_flight.get(key)
+        while future is not None:
+            self.merged += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the request computing it was cancelled, e.g. its client went away
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            future = self._in_flight.get(key)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        generation = self._generation(engine_type)
+        try:
+            body = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # retrieve it so a miss nobody else waited on does not log "never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(body)
+            if self._generation(engine_type) == generation:
+                self.set(key, body, engine_type)
+            return body
+        finally:
+            del self._in_flight[key]
+
+    def invalidate(self, engine_type: Optional[str] = None) -> int:
+        """
+        Drops the entries of `engine_type`, or every entry when it is None.
+        Returns:
+            int: Number of entries dropped.
+        """
+        with self._lock:
+            self._generations[engine_type] = self._generations.get(engine_type, 0) + 1
+            keys = [
+                key
+                for key, (_, _, entry_engine) in self._entries.items()
+                if engine_type is None or entry_engine == engine_type
+            ]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.merged
+        return {
+            "entries": len(self._entries),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.merged) / lookups, 4) if lookups else 0.0,
+        }
+
+
+search_cache = SearchResultCache()
@@ -0,0 +1,195 @@
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Tuple
+
+from limits import RateLimitItem
+from limits.util import WindowStats
+
+RATELIMIT_STORAGE_DIR = os.getenv(
+    "RATELIMIT_STORAGE_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+)
+RATELIMIT_STORAGE_NAME = os.getenv("RATELIMIT_STORAGE_NAME", "restapi-ratelimit")
+RATELIMIT_SHARDS = int(os.getenv("RATELIMIT_SHARDS", 8))
+RATELIMIT_PRUNE_EVERY = int(os.getenv("RATELIMIT_PRUNE_EVERY", 4096))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    ts REAL NOT NULL,
+    full_at REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# Every expression in an UPSERT's SET clause sees the row as it was before the update, so
+# refill, take and the "was it allowed" flag are computed in one atomic statement.
+_REFILL = "MIN(:capacity, tokens + (:now - ts) * :rate)"
+_TAKE = f"CASE WHEN {_REFILL} >= :cost THEN {_REFILL} - :cost ELSE {_REFILL} END"
+_HIT = f"""
+INSERT INTO buckets (key, tokens, ts, full_at, allowed)
+VALUES (:key, :capacity - :cost, :now, :now + :cost / :rate, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = {_TAKE},
+    full_at = :now + (:capacity - ({_TAKE})) / :rate,
+    allowed = {_REFILL} >= :cost,
+    ts = :now
+RETURNING allowed, tokens
+"""
+_PEEK = "SELECT tokens, ts FROM buckets WHERE key = :key"
+_PRUNE = "DELETE FROM buckets WHERE full_at < :now"
+
+
+class SQLiteTokenBuckets:
+    """
+    Token buckets kept in SQLite files that every worker on the host opens.
+
+    Keys are spread over `shards` database files by CRC32, and each decision is a single
+    UPSERT on the key's primary-key row, so a decision costs one B-tree probe whatever the
+    number of clients, and writers only contend within a shard. The files default to
+    `/dev/shm`, so the state lives in shared memory and is dropped on reboot.
+
+    Rows whose bucket has refilled completely carry no information and are pruned
+    every `prune_every` hits per shard.
+
+    Args:
+        directory (str): Directory holding the shard files.
+        name (str): Prefix of the shard file names.
+        shards (int): Number of SQLite files the keys are spread over.
+        prune_every (int): Number of hits on a shard between two prunes.
+    """
+
+    def __init__(
+        self,
+        directory: str = RATELIMIT_STORAGE_DIR,
+        name: str = RATELIMIT_STORAGE_NAME,
+        shards: int = RATELIMIT_SHARDS,
+        prune_every: int = RATELIMIT_PRUNE_EVERY,
+    ) -> None:
+        self.paths = [
+            os.path.join(directory, f"{name}-{shard}.db") for shard in range(shards)
+        ]
+        self.prune_every = prune_every
+        self._local = threading.local()
+        for shard in range(shards):
+            self._connection(shard).execute(_SCHEMA)
+
+    def _connection(self, shard: int) -> sqlite3.Connection:
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+            self._local.hits = [0] * len(self.paths)
+
+        connection = connections.get(shard)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.paths[shard], timeout=5, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # buckets are throwaway state, there is no point in syncing them to disk
+            connection.execute("PRAGMA synchronous=OFF")
+            connections[shard] = connection
+        return connection
+
+    def _shard(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % len(self.paths)
+
+    def hit(
+        self, key: str, capacity: float, rate: float, cost: float = 1
+    ) -> Tuple[bool, float, float]:
+        """
+        Takes `cost` tokens from the bucket if it holds that many.
+        Args:
+            key (str): The bucket key.
+            capacity (float): Maximum number of tokens in the bucket.
+            rate (float): Tokens added per second.
+            cost (float): Tokens this decision needs.
+        Returns:
+            tuple: `(allowed, tokens_left, now)`.
+        """
+        shard = self._shard(key)
+        connection = self._connection(shard)
+        now = time.time()
+        params = {
+            "key": key,
+            "capacity": capacity,
+            "rate": rate,
+            "cost": cost,
+            "now": now,
+        }
+        allowed, tokens = connection.execute(_HIT, params).fetchone()
+
+        hits = self._local.hits
+        hits[shard] += 1
+        if hits[shard] >= self.prune_every:
+            hits[shard] = 0
+            connection.execute(_PRUNE, {"now": now})
+
+        return bool(allowed), tokens, now
+
+    def peek(self, key: str, capacity: float, rate: float) -> Tuple[float, float]:
+        """
+        Returns `(tokens, now)` for the bucket without taking from it.
+        """
+        now = time.time()
+        row = self._connection(self._shard(key)).execute(_PEEK, {"key": key}).fetchone()
+        if row is None:
+            return capacity, now
+        return min(capacity, row[0] + (now - row[1]) * rate), now
+
+    def clear(self, key: str) -> None:
+        self._connection(self._shard(key)).execute(
+            "DELETE FROM buckets WHERE key = :key", {"key": key}
+        )
+
+    def reset(self) -> None:
+        for shard in range(len(self.paths)):
+            self._connection(shard).execute("DELETE FROM buckets")
+
+
+class TokenBucketRateLimiter:
+    """
+    `limits`-style strategy backed by `SQLiteTokenBuckets`.
+
+    A limit such as `10/minute` becomes a bucket holding at most 10 tokens and refilling at
+    10 tokens per minute, so bursts up to the limit are allowed and the long-run rate holds
+    across every worker sharing the bucket files.
+    """
+
+    def __init__(self, buckets: SQLiteTokenBuckets) -> None:
+        self.storage = buckets
+
+    @staticmethod
+    def _bucket(item: RateLimitItem) -> Tuple[float, float]:
+        capacity = float(item.amount)
+        return capacity, capacity / item.get_expiry()
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        capacity, rate = self._bucket(item)
+        allowed, _, _ = self.storage.hit(
+            item.key_for(*identifiers), capacity, rate, cost
+        )
+        return allowed
+
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        capacity, rate = self._bucket(item)
+        tokens, _ = self.storage.peek(item.key_for(*identifiers), capacity, rate)
+        return tokens >= cost
+
+    def get_window_stats(self, item: RateLimitItem, *identifiers: str) -> WindowStats:
+        """
+        Returns the time at which the next token is available and the whole tokens left.
+        """
+        capacity, rate = self._bucket(item)
+        tokens, now = self.storage.peek(item.key_for(*identifiers), capacity, rate)
+        reset_at = now + max(0.0, 1 - tokens) / rate
+        return WindowStats(math.ceil(reset_at), int(tokens))
+
+    def clear(self, item: RateLimitItem, *identifiers: str) -> None:
+        self.storage.clear(item.key_for(*identifiers))
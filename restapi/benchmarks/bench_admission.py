@@ -0,0 +1,91 @@
+"""
+Compares first-come admission with priority and deadline admission under overload.
+
+Interactive and batch clients send more requests than the backend can serve. Every client
+gives up after `--timeout` seconds. Without deadlines the backend keeps serving requests
+whose client is already gone; with them such requests are dropped before they start, and
+interactive requests are served before batch ones.
+
+Usage:
+    python -m benchmarks.bench_admission --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from api.routes.concurrency import AdaptiveConcurrencyLimiter
+from exceptions import DeadlineExceeded, ServiceOverloaded
+
+
+async def _load(args, aware: bool):
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=args.slots,
+        min_limit=args.slots,
+        max_limit=args.slots,
+        max_queue=10_000,
+        queue_timeout=60,
+        batch_queue_timeout=60,
+    )
+    results = {"interactive": [], "batch": []}
+    wasted = 0
+    rng = random.Random(0)
+
+    async def request(priority: str):
+        nonlocal wasted
+        start = time.monotonic()
+        deadline = start + args.timeout
+        try:
+            if aware:
+                context = limiter.acquire(priority, deadline)
+            else:
+                context = limiter.acquire()
+            async with context:
+                await asyncio.sleep(args.work_ms / 1000)
+        except (DeadlineExceeded, ServiceOverloaded):
+            results[priority].append(None)
+            return
+        latency = time.monotonic() - start
+        if latency > args.timeout:
+            # the client gave up, so the slot was spent for nothing
+            wasted += 1
+            results[priority].append(None)
+        else:
+            results[priority].append(latency * 1000)
+
+    capacity = args.slots / (args.work_ms / 1000)
+    tasks = []
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        priority = "batch" if rng.random() < args.batch_share else "interactive"
+        tasks.append(asyncio.ensure_future(request(priority)))
+        await asyncio.sleep(rng.expovariate(capacity * args.overload))
+    await asyncio.gather(*tasks)
+    return results, wasted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--work-ms", type=float, default=20)
+    parser.add_argument("--overload", type=float, default=1.5)
+    parser.add_argument("--batch-share", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    for name, aware in (("fifo", False), ("priority", True)):
+        results, wasted = asyncio.run(_load(args, aware))
+        line = [f"{name:<9}"]
+        for priority, latencies in results.items():
+            served = np.array([latency for latency in latencies if latency is not None])
+            p99 = f"{np.percentile(served, 99):7.1f} ms" if len(served) else "      -   "
+            line.append(f"{priority} in time {len(served) / len(latencies):6.1%} p99 {p99}")
+        line.append(f"wasted {wasted}")
+        print("  ".join(line))
+
+
+if __name__ == "__main__":
+    main()
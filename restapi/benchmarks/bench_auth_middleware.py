@@ -0,0 +1,100 @@
+"""
+Compares the pure ASGI `AuthenticationMiddleware` with the `BaseHTTPMiddleware` variant on
+`/v1/from_query`.
+
+Usage:
+    python -m benchmarks.bench_auth_middleware --requests 1000 --concurrency 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+import httpx
+import numpy as np
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+from fastapi import FastAPI
+
+from api.middlewares import AuthenticationMiddleware, HTTPAuthenticationMiddleware
+from api.middlewares.gen_access_token import GenAccToken
+from api.routes.limiter import limiter
+from api.routes.router import router as api_router
+
+PAYLOAD = {
+    "context": "this is example query",
+    "engine_type": "weaviate",
+    "search_configs": "search_configs",
+}
+
+
+def build_app(middleware_class) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware_class)
+    app.state.limiter = limiter
+    app.include_router(api_router)
+    return app
+
+
+async def run(app: FastAPI, token: str, n_requests: int, concurrency: int) -> dict:
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/v1/from_query", json=PAYLOAD, headers=headers
+                )
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        # warm the token cache and the route before timing
+        await one_request()
+        latencies.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "rps": n_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # The benchmark measures middleware overhead, not the route's rate limit.
+    limiter.enabled = False
+
+    token_generator = GenAccToken()
+    user = token_generator.authenticate_user(username="tim", password="tim1234")
+    token = token_generator.create_access_token(data=user.model_dump())
+
+    for middleware_class in (HTTPAuthenticationMiddleware, AuthenticationMiddleware):
+        app = build_app(middleware_class)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = asyncio.run(run(app, token, args.requests, args.concurrency))
+        print(
+            f"{middleware_class.__name__:<32} "
+            f"{stats['rps']:>9.1f} req/s  "
+            f"p50 {stats['p50_ms']:>7.2f} ms  "
+            f"p99 {stats['p99_ms']:>7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures the `numpy` engine's query throughput for list contexts of several batch sizes,
+where each batch is embedded and scored as one matrix product, and checks every batch
+against the same queries answered one by one.
+
+Usage:
+    python -m benchmarks.bench_batch_search --size 100000 --batch-sizes 1,8,32,128,512
+"""
+import argparse
+import time
+
+import numpy as np
+
+from modules.core import SearcherInit
+from modules.engines.numpy_index import NumpyIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--batch-sizes", default="1,8,32,128,512")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.size, args.dim), dtype=np.float32)
+    searcher = SearcherInit(
+        numpy_index=NumpyIndex(embeddings, [str(i) for i in range(args.size)])
+    )
+    del embeddings
+    words = [f"w{i}" for i in range(5000)]
+    queries = [" ".join(rng.choice(words, 8)) for _ in range(args.queries)]
+
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        start = time.perf_counter()
+        for offset in range(0, len(queries), batch_size):
+            searcher.search_batch(
+                queries[offset : offset + batch_size], engine_type="numpy", top_k=args.k
+            )
+        elapsed = time.perf_counter() - start
+
+        batch = searcher.search_batch(queries[:batch_size], engine_type="numpy", top_k=args.k)
+        for item in batch[:8]:
+            single = searcher.search(item["query"], engine_type="numpy", top_k=args.k)
+            np.testing.assert_allclose(item["scores"], single["scores"], rtol=1e-5, atol=1e-6)
+
+        print(
+            f"n={args.size:<8} batch={batch_size:<5} "
+            f"{len(queries) / elapsed:9.1f} QPS  "
+            f"{elapsed / len(queries) * 1000:7.3f} ms/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Builds a BM25 index over a synthetic Zipf-distributed corpus and reports build time,
+index size, and query latency with MaxScore against exhaustive scoring of every posting.
+
+Usage:
+    python -m benchmarks.bench_bm25 --size 3000000 --ks 10,100
+"""
+import argparse
+import time
+
+import numpy as np
+
+from modules.engines.bm25 import BM25Index
+
+
+def _corpus(rng, size: int, vocab_size: int, mean_length: int):
+    weights = 1 / np.arange(1, vocab_size + 1) ** 1.1
+    weights /= weights.sum()
+    lengths = rng.poisson(mean_length, size).clip(1)
+    words = rng.choice(vocab_size, int(lengths.sum()), p=weights)
+    ends = np.cumsum(lengths)
+    names = np.array([f"w{i}" for i in range(vocab_size)], dtype=object)
+    for start, end in zip(ends - lengths, ends):
+        yield " ".join(names[words[start:end]])
+
+
+def _exhaustive(index, query: str, k: int) -> np.ndarray:
+    scores = np.zeros(len(index), dtype=np.float32)
+    for term in {index.vocab[t] for t in query.split() if t in index.vocab}:
+        docs, tfs = index._postings(term)
+        scores[docs] += index._score(index.idf[term], tfs, index.norms[docs], index.k1)
+    best = np.argpartition(-scores, k)[:k]
+    return np.sort(scores[best])[::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--vocab", type=int, default=200000)
+    parser.add_argument("--length", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--ks", default="10,100")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    index = BM25Index.from_texts(
+        _corpus(rng, args.size, args.vocab, args.length),
+        [str(i) for i in range(args.size)],
+    )
+    build = time.perf_counter() - start
+    postings = len(index.gaps)
+    print(
+        f"n={args.size} terms={len(index.vocab)} postings={postings} "
+        f"build {build:.1f}s  size {index.nbytes / 2**20:.1f} MiB "
+        f"({index.nbytes / postings:.2f} bytes/posting)"
+    )
+
+    # queries of 2-5 words with log-uniform frequency ranks, mixing common and rare words
+    queries = [
+        " ".join(
+            f"w{int(w)}" for w in np.exp(rng.uniform(0, np.log(50000), rng.integers(2, 6)))
+        )
+        for _ in range(args.queries)
+    ]
+    for k in map(int, args.ks.split(",")):
+        maxscore, exhaustive = [], []
+        for query in queries:
+            start = time.perf_counter()
+            _, scores = index.search_terms(query, k)
+            maxscore.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            expected = _exhaustive(index, query, k)
+            exhaustive.append(time.perf_counter() - start)
+            np.testing.assert_allclose(scores, expected[: len(scores)], rtol=1e-5)
+
+        for name, latencies in (("maxscore", maxscore), ("exhaustive", exhaustive)):
+            latencies = np.array(latencies) * 1000
+            print(
+                f"k={k:<4} {name:<10} "
+                f"p50 {np.percentile(latencies, 50):7.2f} ms  "
+                f"p99 {np.percentile(latencies, 99):7.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
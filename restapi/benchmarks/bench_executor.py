@@ -0,0 +1,105 @@
+"""
+Compares generation in worker threads with generation in a pool of worker processes.
+
+The model is a stand-in for the Python-heavy parts of decoding, such as sampling and
+detokenization, which hold the GIL. While clients keep the generator busy, a probe measures
+how late the event loop wakes up from a 10 ms sleep, i.e. how long any other request, such
+as a healthcheck, would wait for the loop.
+
+Usage:
+    python -m benchmarks.bench_executor --clients 16 --requests 128
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from modules.batching import MicroBatcher
+from modules.executor import ProcessPool
+
+TOKENS = 64
+STEPS_PER_TOKEN = 2000
+
+
+class PyDecoder:
+    def generate_batch(self, prompts):
+        results = []
+        for prompt in prompts:
+            state = len(prompt)
+            for _ in range(TOKENS):
+                for step in range(STEPS_PER_TOKEN):
+                    state = (state * 31 + step) % 1000003
+            results.append(state)
+        return results
+
+
+def build_decoder() -> PyDecoder:
+    return PyDecoder()
+
+
+async def _probe(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - start - 0.01) * 1000)
+
+
+async def _load(batcher, clients: int, requests: int):
+    remaining = iter(range(requests))
+    lags = []
+    stop = asyncio.Event()
+
+    async def client():
+        for i in remaining:
+            await batcher.submit(f"prompt {i}")
+
+    probe = asyncio.ensure_future(_probe(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    await batcher.aclose()
+    return elapsed, np.array(lags)
+
+
+async def _run_process(args):
+    pool = ProcessPool("benchmarks.bench_executor:build_decoder", workers=args.workers)
+    await pool.start()
+
+    async def handle(prompts):
+        return await pool.call("generate_batch", prompts)
+
+    batcher = MicroBatcher(handle, args.max_batch_size, max_concurrent_batches=args.workers)
+    try:
+        return await _load(batcher, args.clients, args.requests)
+    finally:
+        await pool.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    model = PyDecoder()
+    runs = (
+        ("thread", lambda: _load(MicroBatcher(model.generate_batch, args.max_batch_size),
+                                 args.clients, args.requests)),
+        ("process", lambda: _run_process(args)),
+    )
+    for name, run in runs:
+        elapsed, lags = asyncio.run(run())
+        print(
+            f"{name:<8} {args.requests / elapsed:6.1f} req/s  loop lag "
+            f"p50 {np.percentile(lags, 50):6.1f} ms  p99 {np.percentile(lags, 99):6.1f} ms  "
+            f"max {lags.max():6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
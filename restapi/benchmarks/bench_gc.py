@@ -0,0 +1,70 @@
+"""
+Compares per-request `gc.collect()` with the memory governor on a large long-lived heap.
+
+The heap stands in for what a worker holds after startup (modules, vocabularies, index
+metadata); every request allocates a few thousand objects, some in reference cycles.
+
+Usage:
+    python -m benchmarks.bench_gc --heap-objects 1000000 --requests 200
+"""
+import argparse
+import gc
+import time
+
+import numpy as np
+
+from modules.memory import MemoryGovernor
+
+
+def _build_heap(objects: int) -> list:
+    return [{"id": i, "tokens": [i, str(i)]} for i in range(objects // 3)]
+
+
+def _handle_request(i: int) -> int:
+    hits = [{"doc": j, "score": j / 7, "text": f"passage {j}"} for j in range(500)]
+    for hit in hits[:50]:
+        hit["self"] = hit  # cycles only the collector frees
+    return len(hits) + i
+
+
+def _run(requests: int, per_request_collect: bool, governor: MemoryGovernor) -> np.ndarray:
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        _handle_request(i)
+        if per_request_collect:
+            gc.collect()
+        elif governor.due() is not None:
+            # what the governor's background task does between requests
+            governor.collect("timer")
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heap-objects", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--full-interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    heap = _build_heap(args.heap_objects)
+    for name, per_request in (("per-request gc.collect()", True), ("governor", False)):
+        governor = MemoryGovernor(full_interval=args.full_interval)
+        if not per_request:
+            governor.install()
+            governor.freeze()
+        start = time.perf_counter()
+        latencies = _run(args.requests, per_request, governor)
+        elapsed = time.perf_counter() - start
+        governor.uninstall()
+        print(
+            f"{name:<25} {args.requests / elapsed:8.1f} req/s  "
+            f"p50 {np.percentile(latencies, 50):7.2f} ms  p99 {np.percentile(latencies, 99):7.2f} ms  "
+            f"max {latencies.max():7.2f} ms  full collections {governor.collections['timer']}"
+        )
+    del heap
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures the generation cache on a workload where many users generate from the same
+passages: passage popularity follows a Zipf law, and a miss costs one simulated generation.
+
+Usage:
+    python -m benchmarks.bench_generation_cache --requests 5000 --passages 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from api.routes.generation_cache import GenerationCache
+from schemas import GenerateQuery
+
+
+async def _run(cache, queries, generate_seconds: float):
+    latencies = []
+
+    async def generate():
+        await asyncio.sleep(generate_seconds)
+        return "generated question and answer " * 20
+
+    start = time.perf_counter()
+    for query in queries:
+        started = time.perf_counter()
+        await cache.get_or_compute(query, "bench", generate)
+        latencies.append(time.perf_counter() - started)
+    return time.perf_counter() - start, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--generate-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    picks = rng.zipf(args.zipf, args.requests * 4)
+    picks = picks[picks <= args.passages][: args.requests]
+    queries = [GenerateQuery(context=f"passage number {i} " * 20) for i in picks]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        for name, max_bytes in (("no cache", 0), ("cold", 64 << 20), ("restarted", 64 << 20)):
+            cache = GenerationCache(path, max_bytes=max_bytes)
+            elapsed, latencies = asyncio.run(_run(cache, queries, args.generate_ms / 1000))
+            hits = cache.hits / len(queries)
+            print(
+                f"{name:<10} {len(queries) / elapsed:8.1f} req/s  hit ratio {hits:5.1%}  "
+                f"p50 {np.percentile(latencies, 50):6.3f} ms  p99 {np.percentile(latencies, 99):6.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
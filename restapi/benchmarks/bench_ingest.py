@@ -0,0 +1,95 @@
+"""
+Measures ingestion throughput into `SegmentedIndex`, then query latency with pending
+segments, while a compaction into the memory-mapped store runs in the background, and
+after it.
+
+Usage:
+    python -m benchmarks.bench_ingest --base 200000 --docs 20000 --batch 100
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from modules.engines.embedding_store import EmbeddingStore
+from modules.engines.numpy_index import NumpyIndex
+from modules.engines.segments import SegmentedIndex
+
+
+def _latencies(index, queries, stop=None):
+    latencies = []
+    for query in queries:
+        if stop is not None and stop.is_set():
+            break
+        start = time.perf_counter()
+        index.search([query], k=10)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _report(name, latencies):
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{name:<22} {len(latencies):5d} queries  "
+        f"p50 {np.percentile(latencies, 50):7.2f} ms  p99 {np.percentile(latencies, 99):7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base", type=int, default=200000)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(20000)]
+
+    def texts(n):
+        return [" ".join(rng.choice(words, 12)) for _ in range(n)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.emb")
+        EmbeddingStore.write(
+            path,
+            rng.standard_normal((args.base, args.dim), dtype=np.float32),
+            [f"base-{i}" for i in range(args.base)],
+        )
+        index = SegmentedIndex(NumpyIndex.open(path))
+        queries = texts(args.queries)
+        _report("base only", _latencies(index, queries))
+
+        documents = texts(args.docs)
+        start = time.perf_counter()
+        for offset in range(0, args.docs, args.batch):
+            batch = documents[offset : offset + args.batch]
+            index.add([f"new-{offset + i}" for i in range(len(batch))], batch)
+        elapsed = time.perf_counter() - start
+        print(
+            f"ingested {args.docs} docs in batches of {args.batch}: "
+            f"{args.docs / elapsed:,.0f} docs/s, {index.stats()['segments']} segments"
+        )
+        index.delete([f"base-{i}" for i in range(0, args.base, 1000)])
+        _report("with segments", _latencies(index, queries))
+
+        stop = threading.Event()
+        during = []
+        worker = threading.Thread(target=lambda: during.extend(_latencies(index, queries * 100, stop)))
+        worker.start()
+        start = time.perf_counter()
+        index.compact()
+        compaction = time.perf_counter() - start
+        stop.set()
+        worker.join()
+        print(f"compaction took {compaction:.2f}s")
+        _report("during compaction", during)
+        _report("after compaction", _latencies(index, queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures the `numpy` engine's single-query latency and QPS for several corpus sizes and k,
+and checks each result against an exact full sort.
+
+Usage:
+    python -m benchmarks.bench_numpy_index --sizes 10000,100000,1000000 --ks 1,10,100,1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from modules.engines.numpy_index import NumpyIndex, normalize
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--ks", default="1,10,100,1000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in map(int, args.sizes.split(",")):
+        embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+        index = NumpyIndex(embeddings, [str(i) for i in range(size)])
+        del embeddings
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        for k in map(int, args.ks.split(",")):
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                rows, scores = index.search_vectors(query, k)
+                latencies.append(time.perf_counter() - start)
+
+            # exactness: the returned scores equal the k best scores of a full sort
+            exact = np.sort(normalize(queries[:1]) @ index.embeddings.T, axis=1)[:, ::-1]
+            _, scores = index.search_vectors(queries[0], k)
+            np.testing.assert_allclose(scores, exact[:, :k], rtol=1e-5, atol=1e-6)
+
+            latencies = np.array(latencies) * 1000
+            print(
+                f"n={size:<8} k={k:<5} "
+                f"{1000 / latencies.mean():8.1f} QPS  "
+                f"p50 {np.percentile(latencies, 50):7.2f} ms  "
+                f"p99 {np.percentile(latencies, 99):7.2f} ms  exact"
+            )
+
+
+if __name__ == "__main__":
+    main()
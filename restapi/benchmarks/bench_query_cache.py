@@ -0,0 +1,53 @@
+"""
+Measures query embedding time with and without `QueryEmbeddingCache` on a stream of
+queries drawn from a Zipf distribution, where a few queries repeat often and most are rare.
+
+Usage:
+    python -m benchmarks.bench_query_cache --distinct 50000 --queries 100000 --capacity 16384
+"""
+import argparse
+import time
+
+import numpy as np
+
+from modules.embedding import HashingEmbedder
+from modules.engines.embedding_cache import QueryEmbeddingCache
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--distinct", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--capacity", type=int, default=16384)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(20000)]
+    distinct = [" ".join(rng.choice(words, 12)) for _ in range(args.distinct)]
+    ranks = np.minimum(rng.zipf(args.zipf, args.queries), args.distinct) - 1
+    stream = [distinct[rank] for rank in ranks]
+
+    embedder = HashingEmbedder(args.dim)
+    start = time.perf_counter()
+    for query in stream:
+        embedder.embed([query])
+    uncached = time.perf_counter() - start
+
+    cache = QueryEmbeddingCache(args.dim, capacity=args.capacity)
+    start = time.perf_counter()
+    for query in stream:
+        cache.embed([query], embedder)
+    cached = time.perf_counter() - start
+
+    per_query = 1e6 / args.queries
+    print(f"uncached  {uncached * per_query:7.1f} us/query")
+    print(
+        f"cached    {cached * per_query:7.1f} us/query  "
+        f"({cache.stats()['hit_rate']:.1%} hits, {cache.stats()['bytes'] / 2**20:.0f} MiB slab)"
+    )
+
+
+if __name__ == "__main__":
+    main()
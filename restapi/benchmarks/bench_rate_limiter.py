@@ -0,0 +1,84 @@
+"""
+Measures the per-decision cost of the rate limiter strategies.
+
+Compares slowapi's default in-memory fixed window (per worker) with the shared SQLite token
+bucket, for a single hot key and for many distinct clients, and the token bucket again with
+several processes deciding at once.
+
+Usage:
+    python -m benchmarks.bench_rate_limiter --decisions 50000 --processes 4
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+
+from api.routes.token_bucket import SQLiteTokenBuckets, TokenBucketRateLimiter
+
+LIMIT = parse("1000/second")
+
+
+def time_decisions(strategy, n_decisions: int, n_keys: int) -> float:
+    keys = [f"client-{i}" for i in range(n_keys)]
+    start = time.perf_counter()
+    for i in range(n_decisions):
+        strategy.hit(LIMIT, keys[i % n_keys], "/v1/from_query")
+    return (time.perf_counter() - start) / n_decisions * 1e6
+
+
+def _worker(directory: str, n_decisions: int, n_keys: int, queue) -> None:
+    strategy = TokenBucketRateLimiter(SQLiteTokenBuckets(directory=directory))
+    queue.put(time_decisions(strategy, n_decisions, n_keys))
+
+
+def time_processes(directory: str, n_processes: int, n_decisions: int, n_keys: int):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(directory, n_decisions, n_keys, queue))
+        for _ in range(n_processes)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    per_decision = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return sum(per_decision) / len(per_decision), n_processes * n_decisions / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--decisions", type=int, default=50000)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    strategies = {
+        "fixed-window (memory, per worker)": FixedWindowRateLimiter(MemoryStorage()),
+        "token-bucket (sqlite, shared)": TokenBucketRateLimiter(
+            SQLiteTokenBuckets(directory=directory)
+        ),
+    }
+    for n_keys in (1, 10000):
+        for name, strategy in strategies.items():
+            per_decision = time_decisions(strategy, args.decisions, n_keys)
+            print(f"{name:<36} keys={n_keys:<6} {per_decision:7.2f} us/decision")
+
+    for n_keys in (1, 10000):
+        per_decision, throughput = time_processes(
+            directory, args.processes, args.decisions // args.processes, n_keys
+        )
+        print(
+            f"token-bucket x{args.processes} processes{'':<14} keys={n_keys:<6} "
+            f"{per_decision:7.2f} us/decision  {throughput:9.0f} decisions/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Fires concurrent queries at a Weaviate stand-in running in a separate process, and reports
+latency percentiles for the pooled `RemoteSearchBackend`, for a new client per query, and
+for the same queries sent as batch requests.
+
+Usage:
+    python -m benchmarks.bench_remote_backend --concurrency 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from modules.engines.remote import RemoteSearchBackend
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str) -> None:
+    for _ in range(200):
+        try:
+            httpx.get(f"{url}/v1/.well-known/ready").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise RuntimeError("stand-in did not start")
+
+
+def _report(name: str, latencies, elapsed: float) -> None:
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{name:<18} p50 {np.percentile(latencies, 50):7.1f} ms  "
+        f"p95 {np.percentile(latencies, 95):7.1f} ms  "
+        f"p99 {np.percentile(latencies, 99):7.1f} ms  "
+        f"total {elapsed * 1000:7.1f} ms"
+    )
+
+
+async def _timed(call):
+    start = time.perf_counter()
+    await call
+    return time.perf_counter() - start
+
+
+async def pooled(url: str, concurrency: int, max_connections: int):
+    backend = RemoteSearchBackend(url, max_connections=max_connections, max_keepalive=max_connections)
+    await backend.warmup()
+    start = time.perf_counter()
+    latencies = await asyncio.gather(
+        *(_timed(backend.search(f"query {i}")) for i in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+    await backend.aclose()
+    return latencies, elapsed
+
+
+async def client_per_query(url: str, concurrency: int):
+    async def one(i):
+        backend = RemoteSearchBackend(url)
+        try:
+            await backend.search(f"query {i}")
+        finally:
+            await backend.aclose()
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(_timed(one(i)) for i in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def batched(url: str, concurrency: int, batch_size: int):
+    backend = RemoteSearchBackend(url, batch_size=batch_size)
+    await backend.warmup()
+    start = time.perf_counter()
+    await backend.search_batch([f"query {i}" for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    await backend.aclose()
+    return [elapsed], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    standin = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.weaviate_standin",
+            "--port", str(port), "--latency", str(args.latency),
+        ]
+    )
+    try:
+        _wait_ready(url)
+        print(f"{args.concurrency} concurrent queries, backend latency {args.latency * 1000:.0f} ms")
+        _report(
+            f"pooled ({args.max_connections})",
+            *asyncio.run(pooled(url, args.concurrency, args.max_connections)),
+        )
+        _report("client per query", *asyncio.run(client_per_query(url, args.concurrency)))
+        _report(
+            f"batches of {args.batch_size}",
+            *asyncio.run(batched(url, args.concurrency, args.batch_size)),
+        )
+    finally:
+        standin.terminate()
+        standin.wait()
+
+
+if __name__ == "__main__":
+    main()
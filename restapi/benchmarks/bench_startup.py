@@ -0,0 +1,86 @@
+"""
+Measures the time and memory a fresh process needs to build the searcher and reach
+readiness, with every engine prewarmed and with engines built on first use, and the
+latency of the first query to each engine in the lazy case.
+
+Usage:
+    python -m benchmarks.bench_startup --docs 200000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from modules.engines.bm25 import BM25Index
+from modules.engines.embedding_store import EmbeddingStore
+
+# Run in a child process so each measurement starts from a cold interpreter.
+CHILD = """
+import json, os, time
+start = time.perf_counter()
+from modules.core import build_searcher
+from modules.engines.registry import SEARCH_ENGINE_PREWARM
+searcher = build_searcher()
+searcher.backends.prewarm(SEARCH_ENGINE_PREWARM)
+searcher.warmup()
+ready = time.perf_counter() - start
+with open("/proc/self/statm") as f:
+    rss_mib = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+first = {}
+for engine_type in ("numpy", "bm25"):
+    start = time.perf_counter()
+    searcher.search("w1 w2 w3", engine_type=engine_type, top_k=10)
+    first[engine_type] = time.perf_counter() - start
+print(json.dumps({
+    "ready": ready,
+    "rss_mib": rss_mib,
+    "first": first,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(20000)]
+    ids = [str(i) for i in range(args.docs)]
+    with tempfile.TemporaryDirectory() as directory:
+        store_path = os.path.join(directory, "corpus.emb")
+        bm25_path = os.path.join(directory, "bm25.npz")
+        EmbeddingStore.write(
+            store_path, rng.standard_normal((args.docs, args.dim), dtype=np.float32), ids
+        )
+        texts = [" ".join(rng.choice(words, 12)) for _ in range(args.docs)]
+        BM25Index.from_texts(texts, ids).save(bm25_path)
+
+        for name, prewarm in (("prewarm all", "numpy,bm25,weaviate"), ("lazy", "")):
+            env = dict(
+                os.environ,
+                EMBEDDING_STORE_PATH=store_path,
+                BM25_INDEX_PATH=bm25_path,
+                SEARCH_ENGINE_PREWARM=prewarm,
+            )
+            out = subprocess.run(
+                [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            first = "  ".join(
+                f"first {engine} {seconds * 1000:7.1f} ms"
+                for engine, seconds in result["first"].items()
+            )
+            print(
+                f"{name:<12} ready {result['ready']:6.2f}s  "
+                f"RSS when ready {result['rss_mib']:5.0f} MiB  {first}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Stand-in for a Weaviate server: answers `nearText` GraphQL queries, single and batched,
+with synthetic hits after a configurable delay, and counts the client connections it sees.
+Queries containing the word `fail` get a GraphQL error.
+
+Usage:
+    python -m benchmarks.weaviate_standin --port 8090 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+_QUERY = re.compile(r"(\w+)\(nearText: \{concepts: \[(.*?)\]\}, limit: (\d+)\)")
+
+
+def create_app(latency: float = 0.02) -> FastAPI:
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.connections = set()
+
+    def answer(graphql: str) -> dict:
+        class_name, concepts, limit = _QUERY.search(graphql).groups()
+        concept = json.loads(concepts)
+        if "fail" in concept.split():
+            return {"errors": [{"message": f"cannot vectorize {concept!r}"}]}
+        hits = [
+            {"_additional": {"id": f"doc-{rank}", "distance": rank / 100}}
+            for rank in range(int(limit))
+        ]
+        return {"data": {"Get": {class_name: hits}}}
+
+    @app.get("/v1/.well-known/ready")
+    async def ready():
+        return {}
+
+    @app.post("/v1/graphql")
+    async def graphql(request: Request):
+        app.state.connections.add(request.scope["client"])
+        body = await request.json()
+        await asyncio.sleep(app.state.latency)
+        return answer(body["query"])
+
+    @app.post("/v1/graphql/batch")
+    async def graphql_batch(request: Request):
+        app.state.connections.add(request.scope["client"])
+        body = await request.json()
+        await asyncio.sleep(app.state.latency)
+        return [answer(item["query"]) for item in body]
+
+    return app
+
+
+class BackgroundServer:
+    """Runs an app with uvicorn on a free local port in a daemon thread."""
+
+    def __init__(self, app) -> None:
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
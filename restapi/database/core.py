@@ -29,6 +29,18 @@ class DBAutomation(Base):
     code: Mapped[str]
 
 
+class DBUser(Base):
+    __tablename__ = "users"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(unique=True, index=True)
+    email: Mapped[Optional[str]]
+    full_name: Mapped[Optional[str]]
+    idm_role: Mapped[str]
+    hashed_password: Mapped[str]
+    disabled: Mapped[bool] = mapped_column(default=False)
+
+
 # engine = create_engine(DATABASE_URL)
 # session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base.metadata.create_all(bind=engine)
@@ -0,0 +1,54 @@
+"""
+Bulk-loads user accounts into the `users` table in one transaction.
+
+The input is a CSV file with a header row, or a JSON-lines file (`.jsonl`), with the columns
+`username, email, full_name, idm_role, hashed_password, disabled`. Passwords must already be
+bcrypt hashes; hashing hundreds of thousands of plain passwords here would take hours.
+
+Usage:
+    python -m database.import_users users.csv
+"""
+import argparse
+import csv
+import json
+import time
+
+from wasabi import msg
+
+from database.users import USER_FIELDS, UserStore, USERS_DATABASE_URL
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+def read_users(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+
+        for row in rows:
+            user = {field: row.get(field) or None for field in USER_FIELDS}
+            user["disabled"] = _to_bool(user["disabled"] or False)
+            yield user
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="CSV or JSON-lines file of users")
+    parser.add_argument("--database-url", default=USERS_DATABASE_URL)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    store = UserStore(url=args.database_url)
+    start = time.perf_counter()
+    count = store.import_users(read_users(args.path), batch_size=args.batch_size)
+    msg.good(f"Imported {count} users in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
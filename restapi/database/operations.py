@@ -1,9 +1,10 @@
-from typing import Optional
+from typing import Iterable, Optional
 
 # from .automation.run import run_automations
 from pydantic import BaseModel
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from database.core import DBAutomation, DBItem, NotFoundError
+from database.core import DBAutomation, DBItem, DBUser, NotFoundError
 
 
 class Item(BaseModel):
@@ -60,3 +61,32 @@ def delete_db_item(item_id: int, session: Session) -> DBItem:
     session.delete(db_item)
     session.commit()
     return db_item
+
+
+def read_db_user(username: str, session: Session) -> Optional[DBUser]:
+    # `users.username` has a unique index, so this is a single index probe.
+    return session.execute(
+        select(DBUser).where(DBUser.username == username)
+    ).scalar_one_or_none()
+
+
+def import_db_users(
+    users: Iterable[dict], session: Session, batch_size: int = 10000
+) -> int:
+    """
+    Inserts user records in a single transaction, `batch_size` rows per executemany call.
+    Either every record is imported or, on any error (e.g. a duplicate username), none is.
+    """
+    count = 0
+    batch = []
+    with session.begin():
+        for user in users:
+            batch.append(user)
+            if len(batch) >= batch_size:
+                session.execute(insert(DBUser), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            session.execute(insert(DBUser), batch)
+            count += len(batch)
+    return count
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import StaticPool, create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.core import DATABASE_URL, Base
+from database.operations import import_db_users, read_db_user
+
+USERS_DATABASE_URL = os.getenv("USERS_DATABASE_URL", DATABASE_URL)
+USER_STATUS_CACHE_SIZE = int(os.getenv("USER_STATUS_CACHE_SIZE", 65536))
+USER_STATUS_CACHE_TTL = float(os.getenv("USER_STATUS_CACHE_TTL", 60))
+# Seconds an unknown username is remembered as unknown, so tokens of deleted users, or
+# forged usernames, do not reach the database on every request.
+USER_STATUS_NEGATIVE_TTL = float(os.getenv("USER_STATUS_NEGATIVE_TTL", 5))
+
+USER_FIELDS = (
+    "username",
+    "email",
+    "full_name",
+    "idm_role",
+    "hashed_password",
+    "disabled",
+)
+
+
+class UserStore:
+    """
+    User records stored in the `users` table.
+
+    `get` looks a user up through the unique index on `users.username` and behaves like
+    `dict.get`, so it can be passed wherever a dict of users was used. `get_status` serves
+    `(idm_role, disabled)` from a bounded read-through cache, so checking that a token's user
+    is still active on every request does not hit the database. Unknown usernames are cached
+    too, for `negative_ttl` seconds. `aget_status` is the variant for the event loop: a cache
+    miss is read on a worker thread.
+
+    Args:
+        url (str): SQLAlchemy database URL.
+        cache_size (int): Maximum number of users kept in the status cache.
+        cache_ttl (float): Seconds a cached status is trusted before it is read again.
+        negative_ttl (float): Seconds an unknown username is cached as unknown.
+    """
+
+    def __init__(
+        self,
+        url: str = USERS_DATABASE_URL,
+        cache_size: int = USER_STATUS_CACHE_SIZE,
+        cache_ttl: float = USER_STATUS_CACHE_TTL,
+        negative_ttl: float = USER_STATUS_NEGATIVE_TTL,
+    ) -> None:
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # a single shared connection, otherwise every session sees an empty database
+            self.engine = create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+            )
+        else:
+            self.engine = create_engine(url)
+        self.session_local = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.engine
+        )
+        Base.metadata.create_all(bind=self.engine)
+
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        # username -> (idm_role, disabled, expires_at); idm_role is None for unknown users
+        self._status: "OrderedDict[str, Tuple[Optional[str], bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str, default=None) -> Optional[dict]:
+        with self.session_local() as session:
+            db_user = read_db_user(username, session)
+            if db_user is None:
+                return default
+            user = {field: getattr(db_user, field) for field in USER_FIELDS}
+
+        self._remember(user["username"], user["idm_role"], user["disabled"])
+        return user
+
+    def __contains__(self, username: str) -> bool:
+        return self.get_status(username) is not None
+
+    def _cached_status(self, username: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._status.get(username)
+            if entry is None or entry[2] <= time.monotonic():
+                return None
+            self._status.move_to_end(username)
+        return entry
+
+    def get_status(self, username: str) -> Optional[Tuple[str, bool]]:
+        entry = self._cached_status(username)
+        if entry is None:
+            user = self.get(username)
+            if user is None:
+                self._remember(username, None, True, ttl=self.negative_ttl)
+                return None
+            return user["idm_role"], user["disabled"]
+        if entry[0] is None:
+            return None
+        return entry[0], entry[1]
+
+    async def aget_status(self, username: str) -> Optional[Tuple[str, bool]]:
+        entry = self._cached_status(username)
+        if entry is None:
+            return await asyncio.to_thread(self.get_status, username)
+        if entry[0] is None:
+            return None
+        return entry[0], entry[1]
+
+    def invalidate(self, username: Optional[str] = None) -> None:
+        with self._lock:
+            if username is None:
+                self._status.clear()
+            else:
+                self._status.pop(username, None)
+
+    def import_users(self, users: Iterable[dict], batch_size: int = 10000) -> int:
+        with self.session_local() as session:
+            count = import_db_users(users, session, batch_size=batch_size)
+        self.invalidate()
+        return count
+
+    def _remember(
+        self,
+        username: str,
+        idm_role: Optional[str],
+        disabled: bool,
+        ttl: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            self._status[username] = (
+                idm_role,
+                bool(disabled),
+                time.monotonic() + (self.cache_ttl if ttl is None else ttl),
+            )
+            self._status.move_to_end(username)
+            while len(self._status) > self.cache_size:
+                self._status.popitem(last=False)
+
+
+user_store = UserStore()
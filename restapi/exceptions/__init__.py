@@ -1 +1,9 @@
-from .exceptions import AuthenticationFailed, ServiceError, TypingError, ProjectApiError
+from .exceptions import (
+    AuthenticationFailed,
+    ClientDisconnected,
+    DeadlineExceeded,
+    ServiceError,
+    ServiceOverloaded,
+    TypingError,
+    ProjectApiError,
+)
@@ -23,3 +23,21 @@ class AuthenticationFailed(ProjectApiError):
     """unexpected error"""
 
     pass
+
+
+class ServiceOverloaded(ProjectApiError):
+    """request shed because the service is at its concurrency limit"""
+
+    pass
+
+
+class DeadlineExceeded(ProjectApiError):
+    """request dropped because its deadline passed before the work started"""
+
+    pass
+
+
+class ClientDisconnected(ProjectApiError):
+    """work cancelled because the client closed the connection"""
+
+    pass
@@ -1,5 +1,7 @@
+import asyncio
 import os
 import sys
+import time
 from pathlib import Path
 from typing import Callable
 
@@ -10,15 +12,31 @@ from fastapi.responses import JSONResponse
 
 from starlette.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
-from slowapi import _rate_limit_exceeded_handler
 from contextlib import asynccontextmanager
 
 from api.middlewares import AuthenticationMiddleware
+from api.middlewares.password_hasher import password_hasher
+from api.routes import metrics
 from api.routes.router import router as api_router
-from api.routes import limiter
+from api.routes.limiter import limiter, rate_limit_exceeded_handler
+from api.routes.generation_cache import generation_cache
+from api.routes.search_cache import search_cache
+from modules.core import (
+    EMBEDDING_STORE_POLL_INTERVAL,
+    build_generator,
+    build_searcher,
+)
+from modules.engines.embedding_cache import QUERY_EMBEDDING_CACHE_PATH
+from modules.engines.registry import SEARCH_ENGINE_PREWARM
+from modules.engines.segments import INGEST_COMPACT_INTERVAL, SegmentedIndex
+from modules.memory import GC_FREEZE_STARTUP, MemoryGovernor
+from modules.streaming import close_stream_executor
 from exceptions import (
     AuthenticationFailed,
+    ClientDisconnected,
+    DeadlineExceeded,
     ServiceError,
+    ServiceOverloaded,
     TypingError,
     ProjectApiError,
 )
@@ -51,6 +69,60 @@ def create_exception_handler(
 app = FastAPI()
 
 
+async def watch_embedding_store(app: FastAPI) -> None:
+    # Picks up snapshots swapped in by an offline build without restarting the workers.
+    while True:
+        await asyncio.sleep(EMBEDDING_STORE_POLL_INTERVAL)
+        try:
+            if await asyncio.to_thread(app.state.search_engine.refresh):
+                search_cache.invalidate("numpy")
+                search_cache.invalidate("hybrid")
+                logger.info("Loaded a new embedding store snapshot")
+        except Exception as error:
+            logger.error(f"Failed to load the embedding store snapshot: {error}")
+
+
+async def compact_segments(app: FastAPI) -> None:
+    # Merges ingested segments into the base index off the event loop; searches keep
+    # reading the previous state until the merged one is swapped in.
+    while True:
+        await asyncio.sleep(INGEST_COMPACT_INTERVAL)
+        index = app.state.search_engine.backends.peek("numpy")
+        if not isinstance(index, SegmentedIndex) or not index.needs_compaction():
+            continue
+        try:
+            await asyncio.to_thread(index.compact)
+            logger.info(f"Compacted ingested segments: {index.stats()}")
+        except Exception as error:
+            logger.error(f"Failed to compact ingested segments: {error}")
+
+
+def register_backend_metrics(app: FastAPI) -> None:
+    backends = app.state.search_engine.backends
+
+    def loaded(name: str, collect: Callable) -> Callable[[], dict]:
+        # backends are built on first use, so their stats appear once they are
+        def collector() -> dict:
+            backend = backends.peek(name)
+            return collect(backend) if backend is not None else {}
+
+        return collector
+
+    def engines() -> dict:
+        return {"startup_seconds": getattr(app.state, "startup_seconds", None), **backends.stats()}
+
+    metrics.register("search_engines", engines)
+    metrics.register("search_backend", loaded("weaviate", lambda remote: remote.stats()))
+    metrics.register(
+        "ingest",
+        loaded("numpy", lambda index: index.stats() if isinstance(index, SegmentedIndex) else {}),
+    )
+    metrics.register(
+        "query_embedding_cache",
+        loaded("numpy", lambda index: index.query_cache.stats() if index.query_cache else {}),
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Add security scheme to OpenAPI schema
@@ -65,15 +137,81 @@ async def lifespan(app: FastAPI):
         }
         for path, methods in openapi_schema["paths"].items():
             for method, details in methods.items():
-                # Disable security for 'login_for_access_token' endpoint
-                if details.get("summary") == "Login For Access Token":
+                # Disable security for the token endpoints
+                if details.get("summary") in (
+                    "Login For Access Token",
+                    "Refresh Access Token",
+                ):
                     details.pop("security", None)
                 else:
                     details["security"] = [{"BearerAuth": []}]
         app.openapi_schema = openapi_schema
 
+        # Build the search and generation backends once and warm them up off the event
+        # loop; `/ready` only reports ready after this.
+        # Engines in SEARCH_ENGINE_PREWARM are built here, the others on first use.
+        start = time.perf_counter()
+        app.state.ready = False
+        app.state.memory_governor = MemoryGovernor()
+        app.state.memory_governor.install()
+        metrics.register("memory", app.state.memory_governor.stats)
+        app.state.search_engine = build_searcher()
+        app.state.llm_generator = build_generator()
+        register_backend_metrics(app)
+        metrics.register("generate_batching", app.state.llm_generator.batcher.stats)
+        if hasattr(app.state.llm_generator, "pool"):
+            metrics.register("generate_workers", app.state.llm_generator.pool.stats)
+        await asyncio.to_thread(app.state.search_engine.backends.prewarm, SEARCH_ENGINE_PREWARM)
+        try:
+            await app.state.search_engine.awarmup()
+        except ServiceError as error:
+            logger.error(f"Search backend warmup failed: {error.message}")
+        await app.state.llm_generator.awarmup()
+        if generation_cache.enabled:
+            purged = await asyncio.to_thread(
+                generation_cache.purge, app.state.llm_generator.fingerprint
+            )
+            if purged:
+                logger.info(f"Dropped {purged} cached answers of a previous model")
+        app.state.compactor = asyncio.create_task(compact_segments(app))
+        if EMBEDDING_STORE_POLL_INTERVAL > 0:
+            app.state.store_watcher = asyncio.create_task(watch_embedding_store(app))
+        # objects built so far live as long as the process; full collections skip them
+        if GC_FREEZE_STARTUP:
+            app.state.memory_governor.freeze()
+        app.state.memory_collector = asyncio.create_task(app.state.memory_governor.run())
+        app.state.startup_seconds = round(time.perf_counter() - start, 3)
+        app.state.ready = True
+        logger.info(
+            f"API is ready in {app.state.startup_seconds}s, "
+            f"prewarmed engines: {list(SEARCH_ENGINE_PREWARM) or 'none'}"
+        )
+
     async def shutdown_event():
         logger.info("Shutting down API...")
+        app.state.ready = False
+        for name in ("store_watcher", "compactor", "memory_collector"):
+            task = getattr(app.state, name, None)
+            if task is not None:
+                task.cancel()
+        numpy_index = app.state.search_engine.backends.peek("numpy")
+        if isinstance(numpy_index, SegmentedIndex) and numpy_index.store_path is not None:
+            # ingested documents only live in this worker until they are compacted
+            try:
+                await asyncio.to_thread(numpy_index.compact, True)
+            except Exception as error:
+                logger.error(f"Failed to compact ingested segments at shutdown: {error}")
+        query_cache = getattr(numpy_index, "query_cache", None)
+        if query_cache is not None and QUERY_EMBEDDING_CACHE_PATH:
+            try:
+                await asyncio.to_thread(query_cache.save, QUERY_EMBEDDING_CACHE_PATH)
+            except OSError as error:
+                logger.error(f"Failed to save the query embedding cache: {error}")
+        await app.state.search_engine.aclose()
+        await app.state.llm_generator.aclose()
+        password_hasher.close()
+        close_stream_executor()
+        app.state.memory_governor.uninstall()
 
     await startup_event()
     yield
@@ -102,7 +240,7 @@ def get_app() -> FastAPI:
     app.add_middleware(AuthenticationMiddleware)
 
     app.state.limiter = limiter
-    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
     app.add_exception_handler(
         exc_class_or_status_code=TypingError,
@@ -127,6 +265,28 @@ def get_app() -> FastAPI:
         ),
     )
 
+    app.add_exception_handler(
+        exc_class_or_status_code=ServiceOverloaded,
+        handler=create_exception_handler(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "The service is overloaded, try again later.",
+        ),
+    )
+
+    app.add_exception_handler(
+        exc_class_or_status_code=DeadlineExceeded,
+        handler=create_exception_handler(
+            status.HTTP_504_GATEWAY_TIMEOUT,
+            "The request deadline passed before it could be served.",
+        ),
+    )
+
+    # nobody reads the response; 499 is the status proxies log for a closed client
+    app.add_exception_handler(
+        exc_class_or_status_code=ClientDisconnected,
+        handler=create_exception_handler(499, "Client closed the request."),
+    )
+
     app.include_router(api_router)
 
     return app
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, List
+
+from exceptions import ServiceError
+from modules.histogram import Histogram
+
+# Requests answered by one batched `generate` call.
+GENERATE_BATCH_MAX_SIZE = int(os.getenv("GENERATE_BATCH_MAX_SIZE", 16))
+# Seconds the first request of a batch waits for others to join it.
+GENERATE_BATCH_MAX_WAIT = float(os.getenv("GENERATE_BATCH_MAX_WAIT", 0.005))
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches for a function that handles a list at once.
+
+    A batch is closed when it holds `max_batch_size` items or when its oldest item has
+    waited `max_wait` seconds, and is passed to `handle`, awaited if it is a coroutine
+    function and run in a worker thread otherwise. Up to `max_concurrent_batches` batches run
+    at a time, and requests arriving meanwhile form the next one. `handle` returns one result
+    per item, in order; an `Exception` in place of a result is raised to that caller only,
+    and an exception raised by `handle` fails the whole batch. Callers that were cancelled
+    before their batch closed are left out of it.
+
+    Args:
+        handle (Callable): Takes a list of items and returns a list of results.
+        max_batch_size (int): Largest batch passed to `handle`.
+        max_wait (float): Seconds a batch stays open for more items.
+        max_concurrent_batches (int): Batches handled at the same time, e.g. one per worker.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = GENERATE_BATCH_MAX_SIZE,
+        max_wait: float = GENERATE_BATCH_MAX_WAIT,
+        max_concurrent_batches: int = 1,
+    ) -> None:
+        self.handle = handle
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrent_batches = max_concurrent_batches
+        self.batches = 0
+        self.failures = 0
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 200, 500, 1000])
+        self._pending = deque()
+        self._wakeup = None
+        self._worker = None
+        self._slots = None
+        self._running = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, item: Any) -> Any:
+        """Queues `item` and returns its result once its batch has run."""
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop) -> None:
+        # The worker belongs to the loop of the first request; a new loop, e.g. a restarted
+        # app, gets a new worker.
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._pending.clear()
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            # while every slot is busy, requests keep queueing for the next batch
+            await self._slots.acquire()
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                entry = self._pending.popleft()
+                if not entry[1].done():
+                    batch.append(entry)
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _run_batch(self, batch: list) -> None:
+        now = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((now - enqueued) * 1000)
+        self.batch_sizes.observe(len(batch))
+        self.batches += 1
+
+        items = [item for item, _, _ in batch]
+        try:
+            if asyncio.iscoroutinefunction(self.handle):
+                results = await self.handle(items)
+            else:
+                results = await asyncio.to_thread(self.handle, items)
+            if len(results) != len(batch):
+                raise ServiceError(
+                    message=f"{len(results)} results for a batch of {len(batch)}",
+                    name="generate",
+                )
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as error:
+            self.failures += 1
+            results = [error] * len(batch)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        worker, self._worker = self._worker, None
+        if worker is not None and worker.get_loop() is asyncio.get_running_loop():
+            tasks = [worker, *self._running]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for _, future, _ in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "failures": self.failures,
+            "queue_depth": self.queue_depth,
+            "batch_size": self.batch_sizes.stats(),
+            "queue_wait_ms": self.queue_wait_ms.stats(),
+        }
@@ -1,13 +1,78 @@
-from typing import Any
+import asyncio
+import os
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+from loguru import logger
+
+from modules.batching import MicroBatcher
+from modules.embedding import EMBEDDING_DIM
+from modules.executor import BACKEND_EXECUTOR, ProcessPool
+from modules.engines.embedding_cache import (
+    QUERY_EMBEDDING_CACHE_PATH,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QueryEmbeddingCache,
+    embedder_model,
+)
+from modules.engines.fusion import reciprocal_rank_fusion
+from modules.engines.registry import EngineRegistry
+from modules.engines.segments import SegmentedIndex
+from modules.engines.numpy_index import (
+    EMBEDDING_STORE_PATH,
+    NUMPY_INDEX_PATH,
+    NumpyIndex,
+)
 from modules.search import UserQuery
-from modules.generate import LLMGenInput
+from modules.generate import ANSWER, LLMGenInput, generator_fingerprint
+from modules.streaming import iterate_in_thread
+
+if TYPE_CHECKING:
+    # imported by the registry when the engine is first used
+    from modules.engines.bm25 import BM25Index
+    from modules.engines.remote import RemoteSearchBackend
+
+# Seconds between checks for a new embedding store snapshot; 0 disables the check.
+EMBEDDING_STORE_POLL_INTERVAL = float(os.getenv("EMBEDDING_STORE_POLL_INTERVAL", 30))
+# Results taken from each engine before `hybrid` fuses them.
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", 100))
+# Engines answered in-process with ranked `ids` and `scores`.
+RANKED_ENGINES = ("numpy", "bm25", "hybrid")
+# Engines answered by the remote backend, when one is configured.
+REMOTE_ENGINES = ("weaviate",)
 
 class SearcherInit:
     def __init__(self, **kwargs) -> None:
         self.engine_type = kwargs.get("engine_type", "weaviate")
         self.search_configs = kwargs.get("search_configs", None)
+        # backends are built on first use; ones passed in are used as given
+        self.backends: EngineRegistry = kwargs.get("backends") or EngineRegistry()
+        for name, key in (("numpy", "numpy_index"), ("bm25", "bm25_index"), ("weaviate", "remote")):
+            if key in kwargs:
+                self.backends.put(name, kwargs[key])
+
+    @property
+    def numpy_index(self) -> Optional[NumpyIndex]:
+        # a `SegmentedIndex` when documents can be ingested at runtime
+        return self.backends.get("numpy")
+
+    @numpy_index.setter
+    def numpy_index(self, index: Optional[NumpyIndex]) -> None:
+        self.backends.put("numpy", index)
+
+    @property
+    def bm25_index(self) -> Optional["BM25Index"]:
+        return self.backends.get("bm25")
+
+    @property
+    def remote(self) -> Optional["RemoteSearchBackend"]:
+        return self.backends.get("weaviate")
+
+    def search(self, query, engine_type: Optional[str] = None, top_k: int = 10) -> Any:
+        engine_type = engine_type or self.engine_type
+        if engine_type in RANKED_ENGINES:
+            return self._search_ranked(query, engine_type, top_k)
 
-    def search(self, query) -> Any:
         related_docs = "related_docs"
         return {
             "query": query,
@@ -16,16 +81,198 @@ class SearcherInit:
             "related_docs": related_docs
         }
 
+    def search_batch(
+        self, queries: List[str], engine_type: Optional[str] = None, top_k: int = 10
+    ) -> List[dict]:
+        """
+        Returns one result per query, in order. The `numpy` engine embeds and scores the
+        whole batch as one matrix product.
+        """
+        engine_type = engine_type or self.engine_type
+        if engine_type in RANKED_ENGINES:
+            if not queries:
+                return []
+            results = self._rank(queries, engine_type, top_k)
+            return [
+                {"query": query, "ids": ids, "scores": scores}
+                for query, (ids, scores) in zip(queries, results)
+            ]
+        return [{"query": query, "related_docs": "related_docs"} for query in queries]
+
+    def is_remote(self, engine_type: Optional[str] = None) -> bool:
+        engine_type = engine_type or self.engine_type
+        return engine_type in REMOTE_ENGINES and self.remote is not None
+
+    async def asearch(
+        self, query, engine_type: Optional[str] = None, top_k: int = 10
+    ) -> Any:
+        """
+        Awaits the remote backend for remote engines; other engines run `search` in a
+        worker thread so the event loop is not blocked.
+        """
+        engine_type = engine_type or self.engine_type
+        if not self.is_remote(engine_type):
+            return await asyncio.to_thread(self.search, query, engine_type, top_k)
+
+        ids, scores = await self.remote.search(query, top_k)
+        out = {"query": query, "engine_type": engine_type, "ids": ids, "scores": scores}
+        if self.search_configs is not None:
+            out["search_configs"] = self.search_configs
+        return out
+
+    async def asearch_batch(
+        self, queries: List[str], engine_type: Optional[str] = None, top_k: int = 10
+    ) -> List[dict]:
+        engine_type = engine_type or self.engine_type
+        if not self.is_remote(engine_type):
+            return await asyncio.to_thread(self.search_batch, queries, engine_type, top_k)
+
+        results = await self.remote.search_batch(queries, top_k)
+        return [{"query": query, **result} for query, result in zip(queries, results)]
+
+    def _search_ranked(self, query, engine_type: str, top_k: int) -> Any:
+        ids, scores = self._rank([query], engine_type, top_k)[0]
+        out = {"query": query, "engine_type": engine_type, "ids": ids, "scores": scores}
+        if self.search_configs is not None:
+            out["search_configs"] = self.search_configs
+        return out
+
+    def _rank(self, queries: List[str], engine_type: str, top_k: int) -> List[tuple]:
+        if engine_type == "numpy":
+            return self.numpy_index.search(queries, k=top_k)
+        if engine_type == "bm25":
+            return self.bm25_index.search(queries, k=top_k)
+
+        # hybrid: reciprocal rank fusion of the lexical and the vector ranking
+        depth = max(top_k, HYBRID_DEPTH)
+        lexical = self.bm25_index.search(queries, k=depth)
+        semantic = self.numpy_index.search(queries, k=depth)
+        return [
+            reciprocal_rank_fusion([lexical_ids, semantic_ids], k=top_k)
+            for (lexical_ids, _), (semantic_ids, _) in zip(lexical, semantic)
+        ]
+
+    def iter_hits(
+        self, query: str, engine_type: Optional[str] = None, top_k: int = 10
+    ) -> Iterator[Tuple[str, float]]:
+        """
+        Ranks the documents for `query` and returns an iterator of `(id, score)`, best first.
+        The ranking is computed by this call, while ids are only looked up and converted
+        as the iterator is consumed, so a large top-k can be streamed out as it is read.
+        """
+        engine_type = engine_type or self.engine_type
+        if engine_type == "numpy" and isinstance(self.numpy_index, SegmentedIndex):
+            ids, scores = self.numpy_index.search([query], k=top_k)[0]
+            return zip(ids, scores)
+        elif engine_type == "numpy":
+            index = self.numpy_index
+            rows, scores = index.search_vectors(index.embed_queries([query]), top_k)
+            rows, scores = rows[0], scores[0]
+        elif engine_type == "bm25":
+            index = self.bm25_index
+            rows, scores = index.search_terms(query, top_k)
+        elif engine_type == "hybrid":
+            ids, scores = self._rank([query], engine_type, top_k)[0]
+            return zip(ids, scores)
+        else:
+            # remote engines do not return ranked hits
+            return iter(())
+        return (
+            (index.ids[row], score) for row, score in zip(rows.tolist(), scores.tolist())
+        )
+
+    def warmup(self) -> None:
+        """
+        Runs one throwaway query on each backend built so far, so the first real request
+        does not pay for cold caches. Backends not built yet are left alone.
+        """
+        self.search(query="warmup")
+        numpy_index, bm25_index = self.backends.peek("numpy"), self.backends.peek("bm25")
+        if numpy_index is not None and len(numpy_index):
+            self.search(query="warmup", engine_type="numpy", top_k=1)
+        if bm25_index is not None and len(bm25_index):
+            self.search(query="warmup", engine_type="bm25", top_k=1)
+
+    def refresh(self) -> bool:
+        """
+        Swaps in the latest embedding store snapshot if it has been replaced on disk.
+        Requests already searching keep the old mapping until they finish.
+        Returns:
+            bool: True if a new snapshot was loaded.
+        """
+        index = self.backends.peek("numpy")
+        if isinstance(index, SegmentedIndex):
+            return index.refresh()
+        if index is None or not index.is_stale():
+            return False
+        self.numpy_index = NumpyIndex.open(index.store.path, query_cache=index.query_cache)
+        return True
+
+    async def awarmup(self) -> None:
+        await asyncio.to_thread(self.warmup)
+        remote = self.backends.peek("weaviate")
+        if remote is not None:
+            await remote.warmup()
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        self.close()
+        remote = self.backends.peek("weaviate")
+        if remote is not None:
+            await remote.aclose()
+
+
+def build_numpy_index() -> SegmentedIndex:
+    """
+    Opens the configured corpus for the `numpy` engine, wrapped so documents can be ingested
+    at runtime, with a query embedding cache filled from `QUERY_EMBEDDING_CACHE_PATH`.
+    """
+    if EMBEDDING_STORE_PATH:
+        index = NumpyIndex.open(EMBEDDING_STORE_PATH)
+    elif NUMPY_INDEX_PATH:
+        index = NumpyIndex.load(NUMPY_INDEX_PATH)
+    else:
+        index = NumpyIndex(np.zeros((0, EMBEDDING_DIM), dtype=np.float32), [])
+
+    if QUERY_EMBEDDING_CACHE_SIZE > 0:
+        index.query_cache = QueryEmbeddingCache(index.dim, model=embedder_model(index.embedder))
+        if QUERY_EMBEDDING_CACHE_PATH and os.path.exists(QUERY_EMBEDDING_CACHE_PATH):
+            # a restart starts with the previous process's hot queries
+            try:
+                loaded = index.query_cache.load(QUERY_EMBEDDING_CACHE_PATH)
+                logger.info(f"Loaded {loaded} cached query embeddings")
+            except (OSError, ValueError, KeyError) as error:
+                logger.error(f"Failed to load the query embedding cache: {error}")
+    return SegmentedIndex(index)
 
-def init_searcher():
+
+def build_searcher() -> SearcherInit:
     user_query = UserQuery(engine_type="engine_type", search_configs="search_configs")
     search_engine = SearcherInit(**user_query.__dict__)
     return search_engine
 
 
+def init_searcher(request: Request) -> SearcherInit:
+    """
+    Returns the searcher built once by the app's lifespan and kept on `app.state`.
+    Apps started without that lifespan build it on first use.
+    """
+    search_engine = getattr(request.app.state, "search_engine", None)
+    if search_engine is None:
+        search_engine = request.app.state.search_engine = build_searcher()
+    return search_engine
+
+
 class LLMGeneratorInit:
     def __init__(self, **kwargs) -> None:
         self.generator_configs = kwargs.get("generator_configs", None)
+        self.model_version = kwargs.get("model_version", None)
+        # identifies the answers of this model, e.g. in the generation cache
+        self.fingerprint = generator_fingerprint(kwargs)
+        # concurrent requests are answered by one `generate_batch` call
+        self.batcher = MicroBatcher(self.generate_batch)
 
         print(f"***** Init generator *****")
 
@@ -34,8 +281,101 @@ class LLMGeneratorInit:
             f"***** Init generator from query {query} and the configs: {self.generator_configs} *****"
         )
 
+    def generate_stream(self, query) -> Iterator[str]:
+        """
+        Yields the generation in chunks as they are decoded. A model decoding token by token
+        overrides this; closing the iterator must stop decoding.
+        """
+        self.generate(query=query)
+        for word in ANSWER.split(" "):
+            yield word + " "
+
+    def generate_batch(self, queries: List[Any]) -> List[Any]:
+        """
+        Returns one generation per query, in order. A model that can run several prompts
+        in one forward pass overrides this.
+        """
+        return [self.generate(query=query) for query in queries]
+
+    def astream(self, query) -> AsyncIterator[str]:
+        """`generate_stream` decoded in a worker thread, as an async iterator."""
+        return iterate_in_thread(lambda: self.generate_stream(query))
+
+    def warmup(self) -> None:
+        """Runs one throwaway generation so weights and kernels are loaded before readiness."""
+        self.generate(query="warmup")
+
+    async def awarmup(self) -> None:
+        await asyncio.to_thread(self.warmup)
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        await self.batcher.aclose()
+        self.close()
+
+
+class PooledGenerator:
+    """
+    The generator of `build_local_generator` run in a pool of worker processes, each loading
+    the model once, so decoding never holds the server's GIL. Batches from the micro-batcher
+    run on different workers at the same time.
+
+    Args:
+        pool (ProcessPool): Workers whose backend is an `LLMGeneratorInit`.
+        fingerprint (str): `generator_fingerprint` of the workers' generator.
+    """
+
+    def __init__(self, pool: ProcessPool, fingerprint: str) -> None:
+        self.pool = pool
+        self.fingerprint = fingerprint
+        self.batcher = MicroBatcher(self.generate_batch, max_concurrent_batches=pool.size)
 
-def init_generator():
-    llm_inpt = LLMGenInput(generator_configs="generator_configs")
+    async def generate_batch(self, queries: List[Any]) -> List[Any]:
+        return await self.pool.call("generate_batch", queries)
+
+    def astream(self, query) -> AsyncIterator[str]:
+        return self.pool.stream("generate_stream", query)
+
+    async def awarmup(self) -> None:
+        # workers warm their model up before reporting ready
+        await self.pool.start()
+
+    async def aclose(self) -> None:
+        await self.batcher.aclose()
+        await self.pool.aclose()
+
+
+def _generator_input() -> LLMGenInput:
+    return LLMGenInput(generator_configs="generator_configs")
+
+
+def build_local_generator() -> LLMGeneratorInit:
+    llm_inpt = _generator_input()
     llm_generator = LLMGeneratorInit(**llm_inpt.__dict__)
     return llm_generator
+
+
+def build_generator():
+    """
+    Returns the generator selected by `BACKEND_EXECUTOR`: in this process, or a
+    `PooledGenerator` whose workers each run `build_local_generator`.
+    """
+    if BACKEND_EXECUTOR == "process":
+        return PooledGenerator(
+            ProcessPool("modules.core:build_local_generator"),
+            fingerprint=generator_fingerprint(_generator_input().__dict__),
+        )
+    return build_local_generator()
+
+
+def init_generator(request: Request) -> LLMGeneratorInit:
+    """
+    Returns the generator built once by the app's lifespan and kept on `app.state`.
+    Apps started without that lifespan build it on first use.
+    """
+    llm_generator = getattr(request.app.state, "llm_generator", None)
+    if llm_generator is None:
+        llm_generator = request.app.state.llm_generator = build_generator()
+    return llm_generator
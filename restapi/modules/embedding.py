@@ -0,0 +1,53 @@
+import os
+import re
+import zlib
+from typing import List, Union
+
+import numpy as np
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 384))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens, shared by the embedder and the BM25 index."""
+    return _TOKEN.findall(text.lower())
+
+
+class HashingEmbedder:
+    """
+    Dependency-free text embedder based on signed feature hashing.
+
+    Each lower-cased word and word bigram is hashed into one of `dim` buckets with a
+    hash-derived sign, and the vector is L2-normalised, so texts sharing words get a high
+    cosine similarity. It stands in for a real sentence encoder in local engines; any
+    encoder returning normalised float32 rows can replace it.
+
+    Args:
+        dim (int): Embedding dimension.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        Returns a `(len(texts), dim)` float32 matrix of L2-normalised embeddings.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
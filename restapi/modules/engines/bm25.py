@@ -0,0 +1,374 @@
+"""
+Compact inverted index with BM25 scoring and MaxScore top-k.
+
+Usage:
+    python -m modules.engines.bm25 corpus.jsonl bm25.npz
+where every line of `corpus.jsonl` is an object with `id` and `text` fields.
+"""
+import argparse
+import json
+import os
+from array import array
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+from wasabi import msg
+
+from modules.embedding import tokenize
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH")
+# Postings per block; a block is the unit decoded when scoring only some candidates.
+BM25_BLOCK_SIZE = int(os.getenv("BM25_BLOCK_SIZE", 128))
+# Relative margin under the k-th score within which documents are never pruned; covers the
+# rounding of float32 score sums.
+PRUNE_EPSILON = 1e-5
+
+
+def _to_array(values: np.ndarray) -> array:
+    packed = array("I")
+    packed.frombytes(np.ascontiguousarray(values, dtype=np.uint32).tobytes())
+    return packed
+
+
+class BM25Index:
+    """
+    Inverted index scored with Okapi BM25.
+
+    The postings of all terms live in two flat `array('I')` buffers: document id gaps and
+    term frequencies, 8 bytes per posting. Gaps are taken from the previous posting of the
+    same term, so a posting list decodes with one `cumsum`. Each list is cut into blocks of
+    `block_size` postings and the last document id of every block is kept as a skip list,
+    so a lookup of a few candidates decodes only the blocks holding them. IDF per term,
+    the length norm per document and the highest score per term are computed at build time.
+
+    Top-k uses MaxScore: terms are scored in decreasing order of their highest score, and
+    once the highest scores of the remaining terms add up to less than the current k-th
+    score, those terms can no longer bring a new document into the top k. From then on they
+    are only looked up for the documents already found, and documents that cannot reach
+    the k-th score are dropped. Results are the same as exhaustive scoring.
+
+    Args:
+        vocab (dict): Term to term id.
+        offsets (np.ndarray): `(n_terms + 1,)` start of each term's postings.
+        gaps (array): Document id gaps of all postings.
+        tfs (array): Term frequency of all postings.
+        block_offsets (np.ndarray): `(n_terms + 1,)` start of each term's blocks.
+        block_last (array): Last document id of every block.
+        idf (np.ndarray): `(n_terms,)` inverse document frequency.
+        max_scores (np.ndarray): `(n_terms,)` highest score of any posting of the term.
+        norms (np.ndarray): `(n_docs,)` BM25 length norm `k1 * (1 - b + b * len / avg_len)`.
+        ids (Sequence[str]): Document ids.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalisation.
+        block_size (int): Postings per block.
+    """
+
+    def __init__(
+        self,
+        vocab: dict,
+        offsets: np.ndarray,
+        gaps: array,
+        tfs: array,
+        block_offsets: np.ndarray,
+        block_last: array,
+        idf: np.ndarray,
+        max_scores: np.ndarray,
+        norms: np.ndarray,
+        ids: Sequence[str],
+        k1: float = 1.2,
+        b: float = 0.75,
+        block_size: int = BM25_BLOCK_SIZE,
+    ) -> None:
+        self.vocab = vocab
+        self.offsets = offsets
+        self.gaps = gaps
+        self.tfs = tfs
+        self.block_offsets = block_offsets
+        self.block_last = block_last
+        self.idf = idf
+        self.max_scores = max_scores
+        self.norms = norms
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self.block_size = block_size
+        # zero-copy views used while scoring
+        self._gaps = np.frombuffer(gaps, dtype=np.uint32)
+        self._tfs = np.frombuffer(tfs, dtype=np.uint32)
+        self._block_last = np.frombuffer(block_last, dtype=np.uint32)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: Iterable[str],
+        ids: Sequence[str],
+        k1: float = 1.2,
+        b: float = 0.75,
+        block_size: int = BM25_BLOCK_SIZE,
+    ):
+        vocab = {}
+        term_col, doc_col, tf_col, lengths = array("I"), array("I"), array("I"), array("I")
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_col.append(vocab.setdefault(term, len(vocab)))
+                doc_col.append(doc)
+                tf_col.append(tf)
+        if len(lengths) != len(ids):
+            raise ValueError("texts and ids must have the same length")
+
+        terms = np.frombuffer(term_col, dtype=np.uint32)
+        # documents were added in order, so a stable sort by term keeps each list sorted
+        order = np.argsort(terms, kind="stable")
+        docs = np.frombuffer(doc_col, dtype=np.uint32)[order].astype(np.int64)
+        tf = np.frombuffer(tf_col, dtype=np.uint32)[order]
+        del term_col, doc_col, tf_col
+
+        n_terms = len(vocab)
+        df = np.bincount(terms, minlength=n_terms)
+        del terms, order
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        starts = offsets[:-1]
+
+        gaps = np.diff(docs, prepend=0)
+        gaps[starts[df > 0]] = docs[starts[df > 0]]
+
+        n_blocks = (df + block_size - 1) // block_size
+        block_offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(n_blocks, out=block_offsets[1:])
+        in_term = np.arange(block_offsets[-1]) - np.repeat(block_offsets[:-1], n_blocks)
+        last = np.repeat(starts, n_blocks) + np.minimum(
+            (in_term + 1) * block_size, np.repeat(df, n_blocks)
+        ) - 1
+        block_last = docs[last]
+
+        n_docs = len(lengths)
+        doc_lengths = np.frombuffer(lengths, dtype=np.uint32).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        norms = k1 * (1 - b + b * doc_lengths / max(avg_length, 1e-9))
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        scores = cls._score(np.repeat(idf, df), tf, norms[docs], k1)
+        max_scores = (
+            np.maximum.reduceat(scores, starts) if len(scores) else np.zeros(0, np.float32)
+        )
+
+        return cls(
+            vocab,
+            offsets,
+            _to_array(gaps),
+            _to_array(tf),
+            block_offsets,
+            _to_array(block_last),
+            idf,
+            max_scores.astype(np.float32),
+            norms.astype(np.float32),
+            list(ids),
+            k1=k1,
+            b=b,
+            block_size=block_size,
+        )
+
+    @staticmethod
+    def _score(idf, tf, norms, k1: float) -> np.ndarray:
+        tf = tf.astype(np.float32)
+        return idf * tf * (k1 + 1) / (tf + norms)
+
+    def __len__(self) -> int:
+        return len(self.norms)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the index arrays, without the vocabulary and id strings."""
+        arrays = (self.offsets, self.block_offsets, self.idf, self.max_scores, self.norms)
+        buffers = (self.gaps, self.tfs, self.block_last)
+        return sum(a.nbytes for a in arrays) + sum(
+            len(buffer) * buffer.itemsize for buffer in buffers
+        )
+
+    def _postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[term], self.offsets[term + 1]
+        return np.cumsum(self._gaps[start:end], dtype=np.int64), self._tfs[start:end]
+
+    def _lookup(self, term: int, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns `(positions, tfs)` of the sorted `candidates` found in the term's postings,
+        decoding only the blocks that may hold them.
+        """
+        first_block, end_block = self.block_offsets[term], self.block_offsets[term + 1]
+        block_last = self._block_last[first_block:end_block]
+        blocks = np.searchsorted(block_last, candidates)
+        needed = np.unique(blocks[blocks < len(block_last)])
+        if not len(needed):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32)
+
+        # gather the needed blocks and decode them together: a cumulative sum restarted at
+        # each block's base, which is the last document id of the block before it
+        lo = self.offsets[term] + needed * self.block_size
+        lengths = np.minimum(lo + self.block_size, self.offsets[term + 1]) - lo
+        block_starts = np.zeros(len(needed), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=block_starts[1:])
+        positions = np.arange(lengths.sum()) + np.repeat(lo - block_starts, lengths)
+        gaps = self._gaps[positions].astype(np.int64)
+        sums = np.cumsum(gaps)
+        bases = np.where(needed > 0, block_last[needed - 1].astype(np.int64), 0)
+        restart = sums[block_starts] - gaps[block_starts] - bases
+        docs = sums - np.repeat(restart, lengths)
+
+        found = np.searchsorted(docs, candidates)
+        hit = docs[np.minimum(found, len(docs) - 1)] == candidates
+        return np.flatnonzero(hit), self._tfs[positions[found[hit]]]
+
+    def search_terms(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns `(rows, scores)` of the k best documents for `query`, best first.
+        """
+        terms = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        terms = sorted(terms, key=lambda term: -self.max_scores[term])
+        if not terms or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        accumulator = np.zeros(len(self), dtype=np.float32)
+        threshold = 0.0
+        # remaining[i]: the most terms[i:] can still add to a document. Suffix sums of the
+        # bounds, instead of subtracting from the total, so no rounding error builds up.
+        bounds = self.max_scores[terms].astype(np.float64)
+        remaining = np.maximum(np.append(np.cumsum(bounds[::-1])[::-1], 0.0), 0.0)
+
+        # essential terms: any of their documents may still enter the top k
+        position = 0
+        for position, term in enumerate(terms):
+            if remaining[position] < self._prune_below(threshold):
+                break
+            docs, tfs = self._postings(term)
+            accumulator[docs] += self._score(self.idf[term], tfs, self.norms[docs], self.k1)
+            # the k-th score among this term's documents is a lower bound of the k-th score
+            # overall, cheap to get and safe to prune with
+            threshold = max(threshold, self._kth_score(accumulator, docs, k))
+        else:
+            position = len(terms)
+
+        # every score is positive, so the documents found so far are the non-zero entries;
+        # keep only those that can still reach the k-th score
+        candidates = np.flatnonzero(
+            accumulator >= max(self._prune_below(threshold) - remaining[position], 1e-9)
+        )
+        # non-essential terms: only add to documents that can still reach the top k
+        for position in range(position, len(terms)):
+            term = terms[position]
+            candidates = candidates[
+                accumulator[candidates] + remaining[position] >= self._prune_below(threshold)
+            ]
+            if len(candidates) * 8 < self.offsets[term + 1] - self.offsets[term]:
+                found, tfs = self._lookup(term, candidates)
+                docs = candidates[found]
+            else:
+                # most blocks would be decoded anyway: decode the whole list and filter it
+                alive = np.zeros(len(self), dtype=bool)
+                alive[candidates] = True
+                docs, tfs = self._postings(term)
+                keep = alive[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            accumulator[docs] += self._score(self.idf[term], tfs, self.norms[docs], self.k1)
+            threshold = max(threshold, self._kth_score(accumulator, candidates, k))
+
+        scores = accumulator[candidates]
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return candidates[best], scores[best]
+
+    @staticmethod
+    def _prune_below(threshold: float) -> float:
+        # Scores are float32 sums, so a document's score may come out a few ulps below the
+        # bound it was checked against; only prune what is below it by a relative margin.
+        return threshold * (1 - PRUNE_EPSILON)
+
+    @staticmethod
+    def _kth_score(accumulator: np.ndarray, docs: np.ndarray, k: int) -> float:
+        if len(docs) < k:
+            return 0.0
+        scores = accumulator[docs]
+        return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+    def search(self, queries: List[str], k: int) -> List[Tuple[List[str], List[float]]]:
+        """
+        Returns `(ids, scores)` for each query, best first.
+        """
+        results = []
+        for query in queries:
+            rows, scores = self.search_terms(query, k)
+            results.append(([self.ids[row] for row in rows], scores.tolist()))
+        return results
+
+    def save(self, path: str) -> None:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        np.savez(
+            path,
+            terms=np.array(terms),
+            offsets=self.offsets,
+            gaps=self._gaps,
+            tfs=self._tfs,
+            block_offsets=self.block_offsets,
+            block_last=self._block_last,
+            idf=self.idf,
+            max_scores=self.max_scores,
+            norms=self.norms,
+            ids=np.array(self.ids),
+            params=np.array([self.k1, self.b, self.block_size]),
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            k1, b, block_size = data["params"].tolist()
+            return cls(
+                {term: i for i, term in enumerate(data["terms"].tolist())},
+                data["offsets"],
+                _to_array(data["gaps"]),
+                _to_array(data["tfs"]),
+                data["block_offsets"],
+                _to_array(data["block_last"]),
+                data["idf"],
+                data["max_scores"],
+                data["norms"],
+                data["ids"].tolist(),
+                k1=k1,
+                b=b,
+                block_size=int(block_size),
+            )
+
+
+def build_bm25_index() -> BM25Index:
+    if BM25_INDEX_PATH:
+        return BM25Index.load(BM25_INDEX_PATH)
+    return BM25Index.from_texts([], [])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", help="JSON-lines file of `id` and `text` objects")
+    parser.add_argument("path", help="`.npz` file to write the index to")
+    args = parser.parse_args()
+
+    ids, texts = [], []
+    with open(args.corpus, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                doc = json.loads(line)
+                ids.append(str(doc["id"]))
+                texts.append(doc["text"])
+
+    index = BM25Index.from_texts(texts, ids)
+    index.save(args.path)
+    msg.good(
+        f"Indexed {len(index)} documents, {len(index.vocab)} terms, "
+        f"{index.nbytes / 2**20:.1f} MiB to {args.path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Query embeddings kept in memory; 0 disables the cache.
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 16384))
+# `.npz` file the cache is saved to at shutdown and reloaded from at startup.
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH")
+
+
+# Version of `text_key`; a saved cache with keys of another version is not loaded.
+KEY_VERSION = 2
+
+
+def normalize_text(text: str) -> str:
+    """
+    Runs of whitespace collapsed, so spacing variants share an entry. Only normalisation the
+    embedder also ignores may be applied here: e.g. the NFC and NFD spellings of a word
+    embed differently, so they must not share an entry.
+    """
+    return " ".join(text.split())
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(normalize_text(text).encode(), digest_size=16).digest()
+
+
+class QueryEmbeddingCache:
+    """
+    Content-addressed cache of query embeddings in one preallocated float32 slab.
+
+    Entries are keyed by a 16-byte hash of the normalised text and live in rows of a
+    `(capacity, dim)` array, so the cache costs one dict slot per entry instead of one array
+    object. Rows are evicted with the CLOCK algorithm: a hit sets the row's reference bit,
+    and the eviction hand clears set bits until it finds a row that was not used since its
+    last pass, which approximates LRU without reordering anything on a hit.
+
+    Texts missing from the cache are embedded in one call to the embedder, and a text
+    repeated within a call is embedded once.
+
+    Args:
+        dim (int): Embedding dimension.
+        capacity (int): Number of embeddings kept.
+        model (str): Identifies the embedder; a saved cache of another model is not loaded.
+    """
+
+    def __init__(
+        self, dim: int, capacity: int = QUERY_EMBEDDING_CACHE_SIZE, model: str = ""
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.dim = dim
+        self.capacity = capacity
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._referenced = np.zeros(capacity, dtype=bool)
+        self._keys: List[Optional[bytes]] = [None] * capacity
+        self._slots: Dict[bytes, int] = {}
+        self._hand = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def embed(self, texts: Sequence[str], embedder) -> np.ndarray:
+        """
+        Returns a `(len(texts), dim)` float32 matrix like `embedder.embed`, computing only the
+        rows that are not cached.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        keys = [text_key(text) for text in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for row, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.setdefault(key, []).append(row)
+                    continue
+                out[row] = self._vectors[slot]
+                self._referenced[slot] = True
+            self.hits += len(texts) - sum(len(rows) for rows in missing.values())
+            self.misses += len(missing)
+        if not missing:
+            return out
+
+        computed = embedder.embed([texts[rows[0]] for rows in missing.values()])
+        with self._lock:
+            for (key, rows), vector in zip(missing.items(), computed):
+                out[rows] = vector
+                if key not in self._slots:
+                    self._vectors[self._claim(key)] = vector
+        return out
+
+    def _claim(self, key: bytes) -> int:
+        # Advances the CLOCK hand to a row that is free or was not referenced since the
+        # hand last passed it, and assigns it to `key`.
+        while self._referenced[self._hand]:
+            self._referenced[self._hand] = False
+            self._hand = (self._hand + 1) % self.capacity
+        slot = self._hand
+        self._hand = (self._hand + 1) % self.capacity
+        old = self._keys[slot]
+        if old is not None:
+            del self._slots[old]
+            self.evictions += 1
+        self._keys[slot] = key
+        self._slots[key] = slot
+        return slot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots.clear()
+            self._keys = [None] * self.capacity
+            self._referenced[:] = False
+            self._hand = 0
+
+    def save(self, path: str) -> None:
+        """Writes the cached entries to an `.npz` file, replacing `path` atomically."""
+        with self._lock:
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            keys = np.frombuffer(b"".join(self._slots), dtype=np.uint8).reshape(-1, 16)
+            vectors = self._vectors[slots]
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    keys=keys,
+                    vectors=vectors,
+                    model=np.array(self.model),
+                    dim=self.dim,
+                    key_version=KEY_VERSION,
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, path: str) -> int:
+        """
+        Fills the cache from a file written by `save`. A file for another model, dimension or
+        key version is ignored.
+        Returns:
+            int: The number of entries loaded.
+        """
+        with np.load(path) as data:
+            if str(data["model"]) != self.model or int(data["dim"]) != self.dim:
+                return 0
+            if "key_version" not in data or int(data["key_version"]) != KEY_VERSION:
+                return 0
+            keys, vectors = data["keys"][: self.capacity], data["vectors"][: self.capacity]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                key = key.tobytes()
+                if key not in self._slots:
+                    self._vectors[self._claim(key)] = vector
+        return len(keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "bytes": self._vectors.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+def embedder_model(embedder) -> str:
+    return getattr(embedder, "model", f"{type(embedder).__name__}-{embedder.dim}")
@@ -0,0 +1,182 @@
+"""
+Fixed-layout on-disk store of document embeddings and ids, opened with `np.memmap`.
+
+Layout (little endian):
+    0    header, 64 bytes: magic, format version, dim, count, snapshot id, ids offset
+    64   embeddings, `count x dim` float32, L2-normalised
+    ...  id offsets, `count + 1` uint64, relative to the start of the id bytes
+    ...  id bytes, UTF-8
+
+Opening a store only maps the file, so a worker is ready in milliseconds whatever the
+corpus size, and every worker on the host shares the same pages through the OS page cache.
+New snapshots are written next to the live file and renamed over it, so readers either see
+the old snapshot or the new one, never a partial file.
+
+Usage:
+    python -m modules.engines.embedding_store index.npz corpus.emb
+"""
+import argparse
+import os
+import struct
+import time
+from typing import Iterable, Sequence
+
+import numpy as np
+from wasabi import msg
+
+MAGIC = b"EMBSTORE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+HEADER_SIZE = 64
+WRITE_CHUNK_ROWS = 65536
+
+
+class StoreFormatError(ValueError):
+    pass
+
+
+class _Ids(Sequence):
+    """Read-only view decoding ids from the mapped id bytes on access."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+
+class EmbeddingStore:
+    """
+    A memory-mapped snapshot of the store file at `path`.
+
+    Args:
+        path (str): Path of the store file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise StoreFormatError(f"{path} is too small to be an embedding store")
+
+        magic, version, dim, count, snapshot, ids_offset = HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise StoreFormatError(f"{path} is not an embedding store")
+        if version != FORMAT_VERSION:
+            raise StoreFormatError(f"unsupported embedding store version {version}")
+
+        self.version = version
+        self.dim = dim
+        self.count = count
+        self.snapshot = snapshot
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+
+        self.embeddings = np.memmap(
+            path, dtype=np.float32, mode="r", offset=HEADER_SIZE, shape=(count, dim)
+        ) if count else np.zeros((0, dim), dtype=np.float32)
+        offsets = np.memmap(
+            path, dtype=np.uint64, mode="r", offset=ids_offset, shape=(count + 1,)
+        )
+        blob_offset = ids_offset + 8 * (count + 1)
+        blob_size = int(offsets[-1])
+        blob = (
+            np.memmap(path, dtype=np.uint8, mode="r", offset=blob_offset, shape=(blob_size,))
+            if blob_size
+            else np.zeros(0, dtype=np.uint8)
+        )
+        self.ids = _Ids(offsets, blob)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def is_stale(self) -> bool:
+        """True when a newer snapshot has been swapped in at `path`."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._file_id
+
+    @staticmethod
+    def write(path: str, embeddings: np.ndarray, ids: Iterable[str]) -> None:
+        """
+        Writes a new snapshot and atomically replaces the file at `path` with it.
+        Args:
+            path (str): Path of the store file.
+            embeddings (np.ndarray): `(count, dim)` embeddings; rows are L2-normalised on write.
+            ids (Iterable[str]): One id per row.
+        """
+        chunks = (
+            embeddings[start : start + WRITE_CHUNK_ROWS]
+            for start in range(0, len(embeddings), WRITE_CHUNK_ROWS)
+        )
+        EmbeddingStore.write_chunks(path, chunks, embeddings.shape[1], ids)
+
+    @staticmethod
+    def write_chunks(
+        path: str, chunks: Iterable[np.ndarray], dim: int, ids: Iterable[str]
+    ) -> None:
+        """
+        Like `write`, with the rows given as consecutive `(rows, dim)` chunks, so a snapshot
+        can be assembled from several sources without holding it in memory.
+        """
+        encoded = [str(i).encode("utf-8") for i in ids]
+        count = len(encoded)
+
+        offsets = np.zeros(count + 1, dtype=np.uint64)
+        np.cumsum([len(i) for i in encoded], out=offsets[1:])
+        ids_offset = HEADER_SIZE + count * dim * 4
+        header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, dim, count, time.time_ns(), ids_offset
+        )
+
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+                rows = 0
+                for chunk in chunks:
+                    chunk = np.asarray(chunk, dtype=np.float32)
+                    norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+                    chunk = np.divide(
+                        chunk, norms, out=np.zeros_like(chunk), where=norms > 0
+                    )
+                    f.write(chunk.astype("<f4", copy=False).tobytes())
+                    rows += len(chunk)
+                if rows != count:
+                    raise ValueError("embeddings and ids must have the same length")
+                f.write(offsets.astype("<u8", copy=False).tobytes())
+                f.write(b"".join(encoded))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="`.npz` file with `embeddings` and `ids` arrays")
+    parser.add_argument("path", help="store file to create or replace")
+    args = parser.parse_args()
+
+    with np.load(args.source) as data:
+        EmbeddingStore.write(args.path, data["embeddings"], data["ids"].tolist())
+    store = EmbeddingStore(args.path)
+    msg.good(f"Wrote {store.count} x {store.dim} embeddings to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+from typing import Dict, List, Sequence, Tuple
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original paper.
+RRF_K = int(os.getenv("RRF_K", 60))
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int, rrf_k: int = RRF_K
+) -> Tuple[List[str], List[float]]:
+    """
+    Merges ranked id lists by summing `1 / (rrf_k + rank)` over the lists each id is in.
+    Only ranks are used, so engines with incomparable scores, such as BM25 and cosine
+    similarity, can be merged without calibration.
+    Returns:
+        tuple: `(ids, fused_scores)` of the k best ids, best first.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return [doc_id for doc_id, _ in best], [score for _, score in best]
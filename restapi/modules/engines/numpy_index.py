@@ -0,0 +1,161 @@
+import os
+from collections import abc
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from modules.embedding import HashingEmbedder
+from modules.engines.embedding_cache import QueryEmbeddingCache
+from modules.engines.embedding_store import EmbeddingStore
+
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH")
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH")
+# Rows scored per matrix product, which bounds the temporary score matrix for big corpora.
+NUMPY_INDEX_CHUNK_ROWS = int(os.getenv("NUMPY_INDEX_CHUNK_ROWS", 262144))
+# Scores (queries x rows) computed per matrix product. A batch of many queries gets fewer rows
+# per chunk, so the score matrix and its int64 `argpartition` indices stay within
+# 12 bytes x this many elements (192 MiB by default) whatever the batch size.
+NUMPY_INDEX_CHUNK_SCORES = int(os.getenv("NUMPY_INDEX_CHUNK_SCORES", 16 * 1024 * 1024))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k along the last axis of a `(n_queries, n_docs)` score matrix.
+    `argpartition` selects the k best in O(n), then only those k are sorted.
+    """
+    n_docs = scores.shape[-1]
+    k = min(k, n_docs)
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    if k < n_docs:
+        candidates = np.argpartition(scores, n_docs - k, axis=-1)[:, n_docs - k :]
+    else:
+        candidates = np.broadcast_to(np.arange(n_docs), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return (
+        np.take_along_axis(candidates, order, axis=-1),
+        np.take_along_axis(candidate_scores, order, axis=-1),
+    )
+
+
+class NumpyIndex:
+    """
+    In-process exact vector index over L2-normalised float32 embeddings.
+
+    Scores are cosine similarities computed as one matrix product per chunk of at most
+    `chunk_rows` documents, and at most `chunk_scores` scores over all the queries of a
+    batch; each chunk's top-k is merged into the running top-k, so results are identical
+    to sorting all scores.
+
+    Args:
+        embeddings (np.ndarray): `(n_docs, dim)` document embeddings.
+        ids (Sequence[str]): Document ids, one per row.
+        embedder (HashingEmbedder): Turns query text into vectors of the same dimension.
+        chunk_rows (int): Documents scored per matrix product.
+        chunk_scores (int): Scores computed per matrix product, over all queries.
+        normalized (bool): Set when `embeddings` are already L2-normalised float32, so they
+            are used as given instead of copied, e.g. a memory-mapped store.
+        store (EmbeddingStore): The store the embeddings were mapped from, if any.
+        query_cache (QueryEmbeddingCache): Reuses the embeddings of repeated query texts.
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        ids: Sequence[str],
+        embedder: Optional[HashingEmbedder] = None,
+        chunk_rows: int = NUMPY_INDEX_CHUNK_ROWS,
+        chunk_scores: int = NUMPY_INDEX_CHUNK_SCORES,
+        normalized: bool = False,
+        store: Optional[EmbeddingStore] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ) -> None:
+        if len(embeddings) != len(ids):
+            raise ValueError("embeddings and ids must have the same length")
+        self.embeddings = embeddings if normalized else normalize(embeddings)
+        self.ids = ids if isinstance(ids, abc.Sequence) else list(ids)
+        self.store = store
+        self.dim = self.embeddings.shape[1]
+        self.embedder = embedder or HashingEmbedder(dim=self.dim)
+        self.chunk_rows = chunk_rows
+        self.chunk_scores = chunk_scores
+        self.query_cache = query_cache
+
+    @classmethod
+    def from_texts(cls, texts: Sequence[str], ids: Sequence[str], **kwargs):
+        embedder = kwargs.pop("embedder", None) or HashingEmbedder()
+        return cls(embedder.embed(list(texts)), ids, embedder=embedder, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, **kwargs):
+        """Loads an `.npz` file holding `embeddings` and `ids` arrays."""
+        with np.load(path) as data:
+            return cls(data["embeddings"], data["ids"].tolist(), **kwargs)
+
+    @classmethod
+    def open(cls, path: str, **kwargs):
+        """Maps an `EmbeddingStore` file; nothing is read until it is searched."""
+        store = EmbeddingStore(path)
+        return cls(store.embeddings, store.ids, normalized=True, store=store, **kwargs)
+
+    def save(self, path: str) -> None:
+        np.savez(path, embeddings=self.embeddings, ids=np.array(list(self.ids)))
+
+    def save_store(self, path: str) -> None:
+        """Writes the index as an `EmbeddingStore` snapshot, replacing `path` atomically."""
+        EmbeddingStore.write(path, self.embeddings, self.ids)
+
+    def is_stale(self) -> bool:
+        """True when the store this index was mapped from has been replaced by a newer snapshot."""
+        return self.store is not None and self.store.is_stale()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        if self.query_cache is None:
+            return self.embedder.embed(queries)
+        return self.query_cache.embed(queries, self.embedder)
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns `(rows, scores)`, both `(n_queries, min(k, n_docs))`, best first.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        chunk_rows = max(1, min(self.chunk_rows, self.chunk_scores // max(len(queries), 1)))
+        best_rows, best_scores = None, None
+        for start in range(0, max(len(self), 1), chunk_rows):
+            chunk = self.embeddings[start : start + chunk_rows]
+            rows, scores = top_k(queries @ chunk.T, k)
+            rows = rows + start
+            if best_rows is None:
+                best_rows, best_scores = rows, scores
+                continue
+            merged_rows = np.concatenate([best_rows, rows], axis=1)
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            keep, best_scores = top_k(merged_scores, k)
+            best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+        return best_rows, best_scores
+
+    def search(
+        self, queries: List[str], k: int
+    ) -> List[Tuple[List[str], List[float]]]:
+        """
+        Embeds the query texts and returns `(ids, scores)` for each, best first.
+        """
+        rows, scores = self.search_vectors(self.embed_queries(queries), k)
+        return [
+            ([self.ids[row] for row in query_rows], query_scores.tolist())
+            for query_rows, query_scores in zip(rows, scores)
+        ]
@@ -0,0 +1,100 @@
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# Backends each `engine_type` searches with.
+ENGINE_BACKENDS: Dict[str, Tuple[str, ...]] = {
+    "numpy": ("numpy",),
+    "bm25": ("bm25",),
+    "hybrid": ("bm25", "numpy"),
+    "weaviate": ("weaviate",),
+}
+ENGINE_TYPES = tuple(ENGINE_BACKENDS)
+# Factory of each backend as "module:function"; the module is imported on first use.
+BACKEND_FACTORIES: Dict[str, str] = {
+    "numpy": "modules.core:build_numpy_index",
+    "bm25": "modules.engines.bm25:build_bm25_index",
+    "weaviate": "modules.engines.remote:build_remote_backend",
+}
+# Comma-separated engine types whose backends are built at startup instead of on first use.
+SEARCH_ENGINE_PREWARM = tuple(
+    engine_type.strip()
+    for engine_type in os.getenv("SEARCH_ENGINE_PREWARM", "").split(",")
+    if engine_type.strip()
+)
+
+
+def _import_factory(path: str) -> Callable[[], Any]:
+    module, name = path.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+class EngineRegistry:
+    """
+    Builds search backends the first time an engine needs them.
+
+    Each backend's factory module is imported and the factory called on the first `get`, so
+    engines nobody queries cost neither import time nor memory. Concurrent first requests
+    for the same backend wait for one build; a failed build is raised to the caller and
+    retried by the next one.
+
+    Args:
+        factories (dict): Backend name to a `"module:function"` factory path, or a callable.
+    """
+
+    def __init__(self, factories: Optional[Dict[str, Any]] = None) -> None:
+        self.factories = dict(BACKEND_FACTORIES if factories is None else factories)
+        self.load_seconds: Dict[str, float] = {}
+        self._backends: Dict[str, Any] = {}
+        self._locks = {name: threading.Lock() for name in self.factories}
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the backend, building it if this is its first use.
+        Raises:
+            KeyError: If no factory is registered under `name`.
+        """
+        try:
+            return self._backends[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name not in self._backends:
+                start = time.perf_counter()
+                factory = self.factories[name]
+                if isinstance(factory, str):
+                    factory = _import_factory(factory)
+                self._backends[name] = factory()
+                self.load_seconds[name] = round(time.perf_counter() - start, 4)
+        return self._backends[name]
+
+    def peek(self, name: str) -> Any:
+        """Returns the backend if it has been built, without building it."""
+        return self._backends.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._backends
+
+    def put(self, name: str, backend: Any) -> None:
+        """Uses `backend` as is, e.g. an index built by the caller or a test."""
+        self._backends[name] = backend
+        self._locks.setdefault(name, threading.Lock())
+
+    def prewarm(self, engine_types: Iterable[str] = SEARCH_ENGINE_PREWARM) -> None:
+        """Builds the backends of `engine_types` now rather than on their first request."""
+        for engine_type in engine_types:
+            if engine_type not in ENGINE_BACKENDS:
+                raise ValueError(f"unknown engine_type {engine_type!r}")
+            for name in ENGINE_BACKENDS[engine_type]:
+                self.get(name)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "loaded": name in self._backends,
+                "load_seconds": self.load_seconds.get(name),
+            }
+            for name in self._locks
+        }
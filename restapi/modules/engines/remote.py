@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+from typing import List, Optional, Tuple
+
+import httpx
+
+from exceptions import ServiceError
+
+WEAVIATE_URL = os.getenv("WEAVIATE_URL")
+WEAVIATE_CLASS = os.getenv("WEAVIATE_CLASS", "Document")
+WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
+REMOTE_MAX_CONNECTIONS = int(os.getenv("REMOTE_MAX_CONNECTIONS", 100))
+REMOTE_MAX_KEEPALIVE = int(os.getenv("REMOTE_MAX_KEEPALIVE", 100))
+REMOTE_KEEPALIVE_EXPIRY = float(os.getenv("REMOTE_KEEPALIVE_EXPIRY", 30))
+REMOTE_TIMEOUT = float(os.getenv("REMOTE_TIMEOUT", 2.0))
+# Time a call may wait for a free pooled connection before failing.
+REMOTE_POOL_TIMEOUT = float(os.getenv("REMOTE_POOL_TIMEOUT", 5.0))
+# Queries sent per `/v1/graphql/batch` request.
+REMOTE_BATCH_SIZE = int(os.getenv("REMOTE_BATCH_SIZE", 64))
+
+
+class RemoteSearchBackend:
+    """
+    Async adapter for a Weaviate-style vector database, queried over its GraphQL API.
+
+    One `httpx.AsyncClient` is shared by every request, so TCP (and TLS) connections are
+    opened once and kept alive; the pool is bounded by `max_connections` and calls beyond
+    it wait up to `pool_timeout` for a free connection. Every call is bounded by `timeout`,
+    and timeouts, HTTP errors and malformed responses surface as `ServiceError`.
+
+    Args:
+        base_url (str): Backend URL, e.g. `http://weaviate:8080`.
+        class_name (str): Collection the queries run against.
+        api_key (str): Bearer token sent to the backend, if any.
+        max_connections (int): Upper bound on open connections.
+        max_keepalive (int): Idle connections kept open for reuse.
+        keepalive_expiry (float): Seconds an idle connection is kept.
+        timeout (float): Seconds allowed for connecting, writing and reading a call.
+        pool_timeout (float): Seconds a call may wait for a pooled connection.
+        batch_size (int): Queries per batch request.
+        transport (httpx.AsyncBaseTransport): Replaces the network transport, for tests.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        class_name: str = WEAVIATE_CLASS,
+        api_key: Optional[str] = WEAVIATE_API_KEY,
+        max_connections: int = REMOTE_MAX_CONNECTIONS,
+        max_keepalive: int = REMOTE_MAX_KEEPALIVE,
+        keepalive_expiry: float = REMOTE_KEEPALIVE_EXPIRY,
+        timeout: float = REMOTE_TIMEOUT,
+        pool_timeout: float = REMOTE_POOL_TIMEOUT,
+        batch_size: int = REMOTE_BATCH_SIZE,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.class_name = class_name
+        self.batch_size = batch_size
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else None
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, pool=pool_timeout),
+            transport=transport,
+        )
+
+    def _graphql(self, query: str, top_k: int) -> str:
+        return (
+            f"{{ Get {{ {self.class_name}("
+            f"nearText: {{concepts: [{json.dumps(query)}]}}, limit: {int(top_k)}) "
+            f"{{ _additional {{ id distance }} }} }} }}"
+        )
+
+    def _hits(self, payload: dict) -> Tuple[List[str], List[float]]:
+        if payload.get("errors"):
+            raise ServiceError(message=payload["errors"][0].get("message", "query failed"), name="weaviate")
+        try:
+            objects = (payload.get("data") or {}).get("Get", {}).get(self.class_name) or []
+            ids = [obj["_additional"]["id"] for obj in objects]
+            scores = [1.0 - float(obj["_additional"]["distance"]) for obj in objects]
+        except (AttributeError, KeyError, TypeError, ValueError) as error:
+            raise ServiceError(message=f"Malformed search result: {error!r}", name="weaviate") from error
+        return ids, scores
+
+    async def _post(self, path: str, body, expected: type):
+        """
+        Sends `body` as JSON and returns the decoded response, which must be an `expected`.
+        Raises:
+            ServiceError: If the backend times out, fails or answers with anything else.
+        """
+        self.requests += 1
+        try:
+            response = await self.client.post(path, json=body)
+            response.raise_for_status()
+            payload = response.json()
+        except httpx.TimeoutException as error:
+            self.timeouts += 1
+            raise ServiceError(message="Search backend timed out", name="weaviate") from error
+        except httpx.HTTPError as error:
+            self.failures += 1
+            raise ServiceError(message=f"Search backend failed: {error}", name="weaviate") from error
+        except ValueError as error:
+            self.failures += 1
+            raise ServiceError(message="Search backend sent invalid JSON", name="weaviate") from error
+        if not isinstance(payload, expected):
+            self.failures += 1
+            raise ServiceError(
+                message=f"Search backend sent a {type(payload).__name__}, expected a {expected.__name__}",
+                name="weaviate",
+            )
+        return payload
+
+    async def search(self, query: str, top_k: int = 10) -> Tuple[List[str], List[float]]:
+        """
+        Returns `(ids, scores)` of the nearest objects, best first; scores are `1 - distance`.
+        Raises:
+            ServiceError: If the backend times out, fails or reports a query error.
+        """
+        payload = await self._post("/v1/graphql", {"query": self._graphql(query, top_k)}, dict)
+        return self._hits(payload)
+
+    async def search_batch(self, queries: List[str], top_k: int = 10) -> List[dict]:
+        """
+        Sends the queries in batches of `batch_size`, concurrently, and returns one
+        `{"ids", "scores"}` or `{"error"}` dict per query, in order.
+        Raises:
+            ServiceError: If a batch request itself fails, or does not answer every query.
+        """
+        chunks = [
+            queries[start : start + self.batch_size]
+            for start in range(0, len(queries), self.batch_size)
+        ]
+        responses = await asyncio.gather(
+            *(
+                self._post(
+                    "/v1/graphql/batch",
+                    [{"query": self._graphql(query, top_k)} for query in chunk],
+                    list,
+                )
+                for chunk in chunks
+            )
+        )
+        results = []
+        for chunk, payloads in zip(chunks, responses):
+            # results are matched to queries by position, so a short answer would shift them
+            if len(payloads) != len(chunk):
+                self.failures += 1
+                raise ServiceError(
+                    message=f"Search backend answered {len(payloads)} of {len(chunk)} queries",
+                    name="weaviate",
+                )
+            for payload in payloads:
+                try:
+                    if not isinstance(payload, dict):
+                        raise ServiceError(message="Malformed search result", name="weaviate")
+                    ids, scores = self._hits(payload)
+                except ServiceError as error:
+                    results.append({"error": f"{error.message} [{error.name}]"})
+                else:
+                    results.append({"ids": ids, "scores": scores})
+        return results
+
+    async def warmup(self) -> None:
+        """Checks the backend is up, which also opens the first pooled connection."""
+        try:
+            response = await self.client.get("/v1/.well-known/ready")
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            raise ServiceError(message=f"Search backend is not ready: {error}", name="weaviate") from error
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+        }
+
+
+def build_remote_backend() -> Optional[RemoteSearchBackend]:
+    """Returns the backend for `WEAVIATE_URL`, or None when no remote backend is configured."""
+    return RemoteSearchBackend(WEAVIATE_URL) if WEAVIATE_URL else None
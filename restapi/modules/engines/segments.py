@@ -0,0 +1,353 @@
+import contextlib
+import fcntl
+import heapq
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from modules.engines.embedding_store import WRITE_CHUNK_ROWS, EmbeddingStore
+from modules.engines.numpy_index import NumpyIndex
+
+# Compaction starts once this many segments, or ingested or deleted documents, are waiting
+# to be merged, or once the oldest of those writes is INGEST_COMPACT_MAX_AGE seconds old.
+INGEST_COMPACT_SEGMENTS = int(os.getenv("INGEST_COMPACT_SEGMENTS", 16))
+INGEST_COMPACT_DOCS = int(os.getenv("INGEST_COMPACT_DOCS", 50000))
+INGEST_COMPACT_MAX_AGE = float(os.getenv("INGEST_COMPACT_MAX_AGE", 60))
+# Seconds between checks of the compaction thresholds.
+INGEST_COMPACT_INTERVAL = float(os.getenv("INGEST_COMPACT_INTERVAL", 5))
+# New documents are appended to the last segment until it holds this many rows, so small
+# ingest calls do not pile up one tiny segment each.
+INGEST_SEGMENT_ROWS = int(os.getenv("INGEST_SEGMENT_ROWS", 8192))
+
+
+class Segment(NamedTuple):
+    index: NumpyIndex
+    # sequence number of the ingest call that added each row
+    seqs: np.ndarray
+
+
+class _State(NamedTuple):
+    base: NumpyIndex
+    base_seq: int
+    segments: Tuple[Segment, ...]
+    # document id -> sequence number of its last ingest or delete; never mutated in place
+    tombstones: Dict[str, int]
+    # `time.monotonic()` of the oldest write no compaction has taken yet, None without one
+    pending_since: Optional[float] = None
+
+
+@contextlib.contextmanager
+def _store_lock(store_path: Optional[str]) -> Iterator[None]:
+    # Every worker of the host compacts into the same store file, so compactions take an
+    # exclusive lock on a file next to it.
+    if store_path is None:
+        yield
+        return
+    with open(f"{store_path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SegmentedIndex:
+    """
+    A base `NumpyIndex` plus small in-memory segments of recently ingested documents.
+
+    Ingested documents are embedded into an immutable segment that is searchable as soon as
+    the call returns; small calls are appended to the last segment, copied into a new one,
+    until it holds `INGEST_SEGMENT_ROWS` rows. Every ingest and delete takes the next sequence
+    number, and `tombstones` maps a document id to the sequence number of its last ingest or
+    delete; a row added before that is dead and filtered out at query time. So a re-ingested
+    id replaces the old version, and a deleted id disappears, without touching the base.
+
+    `compact` merges the base and the segments, minus dead rows, into a new base, written to
+    `store_path` as a new embedding store snapshot when there is one. Searches read one
+    immutable `_State`, tombstones included, and are never blocked: the merge runs against a
+    snapshot of the state, and the new base is swapped in with a single assignment. Segments
+    and deletes that arrived during the merge are kept.
+
+    Segments live in the worker that ingested them. Workers sharing a store file compact one
+    at a time under a file lock, and each first reopens the snapshot the previous one wrote,
+    so no worker's documents are lost; other workers see them after their next `refresh`.
+
+    Args:
+        base (NumpyIndex): Index of the compacted corpus.
+        store_path (str): Embedding store file that compactions write; in memory when None.
+    """
+
+    def __init__(self, base: NumpyIndex, store_path: Optional[str] = None) -> None:
+        self.store_path = store_path if store_path is not None else (
+            base.store.path if base.store is not None else None
+        )
+        self.embedder = base.embedder
+        self.query_cache = base.query_cache
+        self.dim = base.dim
+        self.compactions = 0
+        self.last_compaction_seconds = None
+        self._state = _State(base, 0, (), {})
+        self._next_seq = 1
+        # leading segments being merged by a running compaction, which must not change
+        self._frozen = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+
+    @property
+    def base(self) -> NumpyIndex:
+        return self._state.base
+
+    @property
+    def store(self) -> Optional[EmbeddingStore]:
+        return self._state.base.store
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state.base) + sum(len(segment.index) for segment in state.segments)
+
+    @property
+    def pending_docs(self) -> int:
+        return sum(len(segment.index) for segment in self._state.segments)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> int:
+        """
+        Embeds and adds documents; ids already in the index are replaced.
+        Returns:
+            int: The sequence number of the ingest.
+        """
+        if len(ids) != len(texts):
+            raise ValueError("ids and texts must have the same length")
+        # the last copy of an id repeated within the call wins
+        latest = dict(zip(ids, texts))
+        embeddings = self.embedder.embed(list(latest.values()))
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            tombstones = {**self._state.tombstones, **dict.fromkeys(latest, seq)}
+
+            segments = self._state.segments
+            new_ids, seqs = list(latest), np.full(len(latest), seq, dtype=np.int64)
+            if len(segments) > self._frozen and len(segments[-1].index) < INGEST_SEGMENT_ROWS:
+                last = segments[-1]
+                embeddings = np.concatenate([last.index.embeddings, embeddings])
+                new_ids = list(last.index.ids) + new_ids
+                seqs = np.concatenate([last.seqs, seqs])
+                segments = segments[:-1]
+            index = NumpyIndex(embeddings, new_ids, embedder=self.embedder, normalized=True)
+            self._state = self._state._replace(
+                segments=segments + (Segment(index, seqs),),
+                tombstones=tombstones,
+                pending_since=self._pending_since(),
+            )
+        return seq
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """
+        Tombstones the ids, whichever source holds them.
+        Returns:
+            int: The sequence number of the delete.
+        """
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._state = self._state._replace(
+                tombstones={**self._state.tombstones, **dict.fromkeys(ids, seq)},
+                pending_since=self._pending_since(),
+            )
+        return seq
+
+    def _pending_since(self) -> float:
+        pending_since = self._state.pending_since
+        return time.monotonic() if pending_since is None else pending_since
+
+    def search(self, queries: List[str], k: int) -> List[Tuple[List[str], List[float]]]:
+        """
+        Returns `(ids, scores)` for each query, best first, over the base and every segment.
+        """
+        state = self._state
+        tombstones = state.tombstones
+        vectors = state.base.embed_queries(queries)
+
+        candidates = [[] for _ in queries]
+        sources = [(state.base, None)] + list(state.segments)
+        for index, seqs in sources:
+            hits = self._alive_hits(index, seqs, state.base_seq, tombstones, vectors, k)
+            for query_candidates, query_hits in zip(candidates, hits):
+                query_candidates.extend(query_hits)
+
+        results = []
+        for query_candidates in candidates:
+            best = heapq.nlargest(k, query_candidates, key=lambda hit: hit[0])
+            results.append(([doc_id for _, doc_id in best], [score for score, _ in best]))
+        return results
+
+    @staticmethod
+    def _alive_hits(index, seqs, base_seq, tombstones, vectors, k) -> List[list]:
+        # Fetches k rows per query, and more only while tombstones leave a query short.
+        fetch = k
+        while True:
+            rows, scores = index.search_vectors(vectors, fetch)
+            hits = []
+            for query_rows, query_scores in zip(rows.tolist(), scores.tolist()):
+                query_hits = []
+                for row, score in zip(query_rows, query_scores):
+                    doc_id = index.ids[row]
+                    seq = base_seq if seqs is None else seqs[row]
+                    if tombstones.get(doc_id, 0) <= seq:
+                        query_hits.append((score, doc_id))
+                hits.append(query_hits)
+            if fetch >= len(index) or all(len(query_hits) >= k for query_hits in hits):
+                return hits
+            fetch *= 2
+
+    def needs_compaction(self) -> bool:
+        state = self._state
+        # every ingested or deleted id has a tombstone, so they count the pending writes
+        return (
+            len(state.segments) >= INGEST_COMPACT_SEGMENTS
+            or max(self.pending_docs, len(state.tombstones)) >= INGEST_COMPACT_DOCS
+            or (
+                state.pending_since is not None
+                and time.monotonic() - state.pending_since >= INGEST_COMPACT_MAX_AGE
+            )
+        )
+
+    def compact(self, wait: bool = False) -> bool:
+        """
+        Merges the segments and applies the tombstones into a new base.
+        Args:
+            wait (bool): Waits for a running merge to finish, then merges what is left,
+                instead of returning.
+        Returns:
+            bool: False if there was nothing to merge or a merge is already running.
+        """
+        if not self._compact_lock.acquire(blocking=wait):
+            return False
+        try:
+            with _store_lock(self.store_path):
+                return self._compact()
+        finally:
+            self._frozen = 0
+            self._compact_lock.release()
+
+    def _compact(self) -> bool:
+        start = time.perf_counter()
+        if self.store_path is not None and self.is_stale():
+            # another worker compacted into the store since this one opened it
+            self._reopen_base()
+        with self._lock:
+            state = self._state
+            tombstones = state.tombstones
+            merged_seq = self._next_seq - 1
+            if not state.segments and not tombstones:
+                return False
+            self._frozen = len(state.segments)
+            # writes from now on are the next compaction's
+            self._state = state._replace(pending_since=None)
+
+        try:
+            new_base = self._merge(state)
+        except BaseException:
+            # the writes of the snapshot are still pending, and the oldest again
+            with self._lock:
+                self._state = self._state._replace(pending_since=state.pending_since)
+            raise
+
+        with self._lock:
+            # segments and deletes added since the snapshot are kept
+            self._state = _State(
+                new_base,
+                merged_seq,
+                self._state.segments[len(state.segments) :],
+                {
+                    doc_id: seq
+                    for doc_id, seq in self._state.tombstones.items()
+                    if seq > merged_seq
+                },
+                self._state.pending_since,
+            )
+        self.compactions += 1
+        self.last_compaction_seconds = round(time.perf_counter() - start, 3)
+        return True
+
+    def _merge(self, state: _State) -> NumpyIndex:
+        """Writes the base and segments of `state`, minus dead rows, into a new base."""
+        tombstones = state.tombstones
+        parts, ids = [], []
+        base = state.base
+        dead = {doc_id for doc_id, seq in tombstones.items() if seq > state.base_seq}
+        for offset in range(0, len(base), WRITE_CHUNK_ROWS):
+            chunk_ids = base.ids[offset : offset + WRITE_CHUNK_ROWS]
+            keep = np.array([doc_id not in dead for doc_id in chunk_ids], dtype=bool)
+            parts.append((base.embeddings, offset, offset + len(chunk_ids), keep))
+            ids.extend(doc_id for doc_id, alive in zip(chunk_ids, keep) if alive)
+        for segment in state.segments:
+            index = segment.index
+            keep = np.array(
+                [
+                    tombstones.get(doc_id, 0) <= seq
+                    for doc_id, seq in zip(index.ids, segment.seqs.tolist())
+                ],
+                dtype=bool,
+            )
+            parts.append((index.embeddings, 0, len(index), keep))
+            ids.extend(doc_id for doc_id, alive in zip(index.ids, keep) if alive)
+
+        chunks = (
+            embeddings[lo:hi][keep] if not keep.all() else embeddings[lo:hi]
+            for embeddings, lo, hi, keep in parts
+        )
+        if self.store_path is not None:
+            EmbeddingStore.write_chunks(self.store_path, chunks, self.dim, ids)
+            new_base = NumpyIndex.open(
+                self.store_path, embedder=self.embedder, query_cache=self.query_cache
+            )
+        else:
+            matrix = np.concatenate(list(chunks) or [np.zeros((0, self.dim), np.float32)])
+            new_base = NumpyIndex(
+                matrix,
+                ids,
+                embedder=self.embedder,
+                normalized=True,
+                query_cache=self.query_cache,
+            )
+        return new_base
+
+    def is_stale(self) -> bool:
+        return self._state.base.is_stale()
+
+    def refresh(self) -> bool:
+        """
+        Reopens the base when another process swapped in a new store snapshot. Segments and
+        tombstones are newer than any snapshot and stay in place.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self.is_stale():
+                return False
+            self._reopen_base()
+            return True
+        finally:
+            self._compact_lock.release()
+
+    def _reopen_base(self) -> None:
+        base = NumpyIndex.open(
+            self.store_path, embedder=self.embedder, query_cache=self.query_cache
+        )
+        with self._lock:
+            self._state = self._state._replace(base=base)
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "base_docs": len(state.base),
+            "segments": len(state.segments),
+            "pending_docs": self.pending_docs,
+            "tombstones": len(state.tombstones),
+            "compactions": self.compactions,
+            "last_compaction_seconds": self.last_compaction_seconds,
+        }
@@ -0,0 +1,450 @@
+"""
+Pool of long-lived worker processes that each build a backend once and run its methods.
+
+Arguments and results are pickled with protocol 5; array buffers of at least
+`EXECUTOR_SHM_MIN_BYTES` travel out of band through shared memory instead of the pipe.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import pickle
+import signal
+from multiprocessing import shared_memory
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from exceptions import ServiceError, ServiceOverloaded
+
+# `thread` runs backends in the server process, `process` in a pool of worker processes.
+BACKEND_EXECUTOR = os.getenv("BACKEND_EXECUTOR", "thread")
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", 2))
+# Seconds a task may run before its worker is killed and replaced.
+EXECUTOR_TASK_TIMEOUT = float(os.getenv("EXECUTOR_TASK_TIMEOUT", 60))
+# Seconds a task may wait for an idle worker before it is shed.
+EXECUTOR_ACQUIRE_TIMEOUT = float(os.getenv("EXECUTOR_ACQUIRE_TIMEOUT", 30))
+# Items of a stream buffered in the server, so a slow reader does not pace the worker.
+EXECUTOR_STREAM_BUFFER = int(os.getenv("EXECUTOR_STREAM_BUFFER", 256))
+# Seconds a new worker may take to build its backend.
+EXECUTOR_START_TIMEOUT = float(os.getenv("EXECUTOR_START_TIMEOUT", 120))
+# Tasks after which a worker is replaced, which bounds memory growth; 0 never recycles.
+EXECUTOR_MAX_TASKS_PER_WORKER = int(os.getenv("EXECUTOR_MAX_TASKS_PER_WORKER", 1000))
+EXECUTOR_SHM_MIN_BYTES = int(os.getenv("EXECUTOR_SHM_MIN_BYTES", 1 << 20))
+EXECUTOR_START_METHOD = os.getenv("EXECUTOR_START_METHOD", "spawn")
+
+_CANCEL = "cancel"
+
+
+def dumps(obj: Any) -> Tuple[bytes, List[Tuple[str, int]]]:
+    """
+    Pickles `obj`, moving large out-of-band buffers, e.g. numpy arrays, into shared memory
+    segments. The receiver of the segments unlinks them in `loads`.
+    """
+    segments = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        view = buffer.raw()
+        if view.nbytes < EXECUTOR_SHM_MIN_BYTES:
+            return True
+        segment = shared_memory.SharedMemory(create=True, size=max(view.nbytes, 1))
+        segment.buf[: view.nbytes] = view
+        segments.append((segment.name, view.nbytes))
+        segment.close()
+        return False
+
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+    return data, segments
+
+
+def loads(payload: Tuple[bytes, List[Tuple[str, int]]]) -> Any:
+    data, segments = payload
+    buffers = []
+    for name, size in segments:
+        segment = shared_memory.SharedMemory(name=name)
+        try:
+            buffers.append(bytearray(segment.buf[:size]))
+        finally:
+            segment.close()
+            segment.unlink()
+    return pickle.loads(data, buffers=buffers)
+
+
+def discard(payload: Tuple[bytes, List[Tuple[str, int]]]) -> None:
+    # Frees the segments of a payload that will never be read.
+    for name, _ in payload[1]:
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        segment.close()
+        segment.unlink()
+
+
+def import_factory(path: str) -> Callable[[], Any]:
+    module, name = path.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _worker_main(conn, factory_path: str) -> None:
+    # Ctrl-C is handled by the server, which stops the workers itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        backend = import_factory(factory_path)()
+        if hasattr(backend, "warmup"):
+            backend.warmup()
+    except BaseException as error:
+        conn.send(("error", _dump_error(error)))
+        return
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        if message == _CANCEL:
+            # arrived after the stream it was meant for had already ended
+            continue
+        kind, method, payload = message
+        try:
+            args = loads(payload)
+            if kind == "call":
+                conn.send(("result", dumps(getattr(backend, method)(*args))))
+                continue
+            iterator = iter(getattr(backend, method)(*args))
+            try:
+                for chunk in iterator:
+                    conn.send(("chunk", dumps(chunk)))
+                    # the server sends a cancel when its client is gone
+                    if conn.poll() and conn.recv() == _CANCEL:
+                        break
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+            conn.send(("end", None))
+        except Exception as error:
+            conn.send(("error", _dump_error(error)))
+
+
+def _dump_error(error: BaseException) -> bytes:
+    try:
+        return pickle.dumps(error)
+    except Exception:
+        error = ServiceError(message=f"{type(error).__name__}: {error}", name="executor")
+        return pickle.dumps(error)
+
+
+class _Worker:
+    def __init__(self, context, factory_path: str) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, factory_path), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    async def receive(self, timeout: Optional[float]) -> tuple:
+        """Waits for the next message without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        if not self.conn.poll():
+            readable = loop.create_future()
+            fd = self.conn.fileno()
+            loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+            try:
+                await asyncio.wait_for(readable, timeout)
+            finally:
+                loop.remove_reader(fd)
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ProcessPool:
+    """
+    Runs methods of a backend in `workers` long-lived processes.
+
+    Every worker builds its own backend by calling the factory at `factory_path` once, so
+    a model is loaded per process and not per task. A task waits for an idle worker and
+    runs on it alone; the event loop only waits on the worker's pipe. A task running longer
+    than `task_timeout` fails with `ServiceError`, and its worker is killed and replaced so
+    the runaway work stops. A worker is also replaced, after finishing its task, once it
+    has run `max_tasks_per_worker` tasks.
+
+    A task waiting longer than `acquire_timeout` for an idle worker is shed with
+    `ServiceOverloaded`, as is a stream started while every worker already runs one. A
+    stream's items are read from its worker into a buffer of `stream_buffer` items; a
+    reader leaving it full for `task_timeout` gets `ServiceError`, and the worker is told to
+    stop, so a slow client never holds a worker.
+
+    Args:
+        factory_path (str): `"module:function"` returning the backend.
+        workers (int): Number of worker processes.
+        task_timeout (float): Seconds a task may run.
+        acquire_timeout (float): Seconds a task may wait for an idle worker.
+        stream_buffer (int): Items of a stream buffered in the server.
+        max_tasks_per_worker (int): Tasks before a worker is recycled; 0 never recycles.
+        start_method (str): `multiprocessing` start method of the workers.
+    """
+
+    def __init__(
+        self,
+        factory_path: str,
+        workers: int = EXECUTOR_WORKERS,
+        task_timeout: float = EXECUTOR_TASK_TIMEOUT,
+        acquire_timeout: float = EXECUTOR_ACQUIRE_TIMEOUT,
+        stream_buffer: int = EXECUTOR_STREAM_BUFFER,
+        max_tasks_per_worker: int = EXECUTOR_MAX_TASKS_PER_WORKER,
+        start_method: str = EXECUTOR_START_METHOD,
+    ) -> None:
+        self.factory_path = factory_path
+        self.size = workers
+        self.task_timeout = task_timeout
+        self.acquire_timeout = acquire_timeout
+        self.stream_buffer = stream_buffer
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.context = multiprocessing.get_context(start_method)
+        self.tasks = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.recycled = 0
+        self.shed = 0
+        self.stalled = 0
+        self.streams = 0
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_Worker] = []
+        self._background = set()
+
+    async def start(self) -> None:
+        """Starts the workers and waits until each has built its backend."""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        await asyncio.gather(*(self._spawn() for _ in range(self.size)))
+
+    async def _spawn(self) -> None:
+        worker = await asyncio.to_thread(_Worker, self.context, self.factory_path)
+        self._workers.append(worker)
+        try:
+            kind, value = await worker.receive(EXECUTOR_START_TIMEOUT)
+        except (asyncio.TimeoutError, EOFError, OSError) as error:
+            kind, value = "error", pickle.dumps(
+                ServiceError(message=f"worker failed to start: {error!r}", name="executor")
+            )
+        if kind != "ready":
+            await asyncio.to_thread(self._retire, worker, True)
+            raise pickle.loads(value)
+        if self._idle is None:
+            # the pool was closed while this worker started
+            await asyncio.to_thread(self._retire, worker, False)
+            return
+        self._idle.put_nowait(worker)
+
+    def _retire(self, worker: _Worker, kill: bool) -> None:
+        if worker in self._workers:
+            self._workers.remove(worker)
+        worker.kill() if kill else worker.stop()
+
+    def _replace(self, worker: _Worker, kill: bool) -> None:
+        # Swaps in a new worker in the background; the old one's task is not waited for.
+        async def replace() -> None:
+            await asyncio.to_thread(self._retire, worker, kill)
+            while self._idle is not None:
+                try:
+                    await self._spawn()
+                    return
+                except Exception:
+                    self.failures += 1
+                    await asyncio.sleep(1)
+
+        task = asyncio.ensure_future(replace())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _acquire(self) -> _Worker:
+        await self.start()
+        try:
+            return await asyncio.wait_for(self._idle.get(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise ServiceOverloaded(message="No idle backend worker", name="executor") from None
+
+    def _release(self, worker: _Worker) -> None:
+        worker.tasks += 1
+        self.tasks += 1
+        if self.max_tasks_per_worker and worker.tasks >= self.max_tasks_per_worker:
+            self.recycled += 1
+            self._replace(worker, kill=False)
+        else:
+            self._idle.put_nowait(worker)
+
+    def _fail(self, worker: _Worker, error: BaseException) -> ServiceError:
+        self._replace(worker, kill=True)
+        if isinstance(error, asyncio.TimeoutError):
+            self.timeouts += 1
+            return ServiceError(message="Backend task timed out", name="executor")
+        self.failures += 1
+        return ServiceError(message=f"Backend worker failed: {error!r}", name="executor")
+
+    async def call(self, method: str, *args) -> Any:
+        """
+        Runs `backend.method(*args)` on an idle worker and returns its result.
+        Raises:
+            ServiceError: If the task times out or its worker dies.
+        """
+        worker = await self._acquire()
+        payload = dumps(args)
+        try:
+            worker.conn.send(("call", method, payload))
+            kind, value = await worker.receive(self.task_timeout)
+        except asyncio.CancelledError:
+            # the worker may still be busy with the task, so it cannot be reused
+            discard(payload)
+            self._replace(worker, kill=True)
+            raise
+        except (asyncio.TimeoutError, EOFError, OSError) as error:
+            discard(payload)
+            raise self._fail(worker, error) from error
+        self._release(worker)
+        if kind == "error":
+            raise pickle.loads(value)
+        return loads(value)
+
+    async def stream(self, method: str, *args) -> AsyncIterator[Any]:
+        """
+        Yields the items of the iterator `backend.method(*args)` returns as the worker
+        produces them. The task timeout applies to the wait for each item. Closing this
+        iterator early tells the worker to stop after its current item.
+        Raises:
+            ServiceOverloaded: If every worker already runs a stream, or none gets idle in
+                time.
+            ServiceError: If the task times out, its worker dies or the reader falls behind.
+        """
+        if self.streams >= self.size:
+            self.shed += 1
+            raise ServiceOverloaded(message="Too many backend streams", name="executor")
+        self.streams += 1
+        buffer = asyncio.Queue(self.stream_buffer)
+        # set once the reader is gone; a cancel alone can be lost in `wait_for`
+        abandoned = asyncio.Event()
+        pump = None
+        try:
+            worker = await self._acquire()
+            pump = asyncio.ensure_future(self._pump(worker, method, args, buffer, abandoned))
+            while True:
+                kind, value = await buffer.get()
+                if kind == "chunk":
+                    yield loads(value)
+                    continue
+                if value is not None:
+                    raise value
+                return
+        finally:
+            abandoned.set()
+            if pump is not None and not pump.done():
+                pump.cancel()
+                await asyncio.wait((pump,))
+            while not buffer.empty():
+                kind, value = buffer.get_nowait()
+                if kind == "chunk":
+                    discard(value)
+            self.streams -= 1
+
+    async def _pump(
+        self,
+        worker: _Worker,
+        method: str,
+        args: tuple,
+        buffer: asyncio.Queue,
+        abandoned: asyncio.Event,
+    ) -> None:
+        # Moves a stream's items from its worker into `buffer` and ends it with an `end`
+        # carrying the error, if any; the worker is released before the reader gets `end`.
+        payload = dumps(args)
+        # "idle" once the worker is done with the task, "failed" once it is being replaced
+        state = "running"
+        try:
+            worker.conn.send(("stream", method, payload))
+            while True:
+                if abandoned.is_set():
+                    # the reader is gone; the worker is told to stop below
+                    return
+                try:
+                    kind, value = await worker.receive(self.task_timeout)
+                except (asyncio.TimeoutError, EOFError, OSError) as error:
+                    discard(payload)
+                    state = "failed"
+                    raise self._fail(worker, error) from error
+                if kind != "chunk":
+                    break
+                try:
+                    await asyncio.wait_for(buffer.put(("chunk", value)), self.task_timeout)
+                except asyncio.TimeoutError:
+                    discard(value)
+                    self.stalled += 1
+                    raise ServiceError(message="Stream reader too slow", name="executor")
+            state = "idle"
+            error = pickle.loads(value) if kind == "error" else None
+        except Exception as failure:
+            error = failure
+        finally:
+            if state == "running":
+                await self._cancel_stream(worker)
+            elif state == "idle":
+                self._release(worker)
+        await buffer.put(("end", error))
+
+    async def _cancel_stream(self, worker: _Worker) -> None:
+        # Asks the worker to stop and drains what it sent meanwhile; a worker that does not
+        # stop in time is replaced.
+        try:
+            worker.conn.send(_CANCEL)
+            while True:
+                kind, value = await worker.receive(self.task_timeout)
+                if kind != "chunk":
+                    break
+                discard(value)
+        except (asyncio.TimeoutError, EOFError, OSError) as error:
+            self._fail(worker, error)
+            return
+        except asyncio.CancelledError:
+            self._replace(worker, kill=True)
+            raise
+        self._release(worker)
+
+    async def aclose(self) -> None:
+        workers, self._workers = self._workers, []
+        self._idle = None
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker in workers))
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "tasks": self.tasks,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "recycled": self.recycled,
+            "shed": self.shed,
+            "stalled": self.stalled,
+            "streams": self.streams,
+            "pids": [worker.process.pid for worker in self._workers],
+        }
@@ -1,13 +1,39 @@
+import hashlib
+import json
+import os
+from typing import AsyncIterator
+
 from pydantic import BaseModel, Field
 
 from exceptions import TypingError, ServiceError
 
+ANSWER = "This is a api testing for generator module"
+# Version of the deployed model; bump it when the weights change so cached answers are dropped.
+GENERATOR_MODEL_VERSION = os.getenv("GENERATOR_MODEL_VERSION", "0")
+
 
 class LLMGenInput(BaseModel):
     generator_configs: str = Field(
         default="generator_configs",
         description="description",
     )
+    model_version: str = Field(
+        default=GENERATOR_MODEL_VERSION,
+        description="Version of the model weights",
+    )
+
+
+def generator_fingerprint(configs: dict) -> str:
+    """Hash of a generator's configs and model version; it changes when either does."""
+    canonical = json.dumps(configs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def check_context(context_text) -> None:
+    if context_text is None:
+        raise ServiceError(message="unexpected error", name="unexpected error")
+    if len(context_text) < 5:
+        raise TypingError(message="Invalid input", name="input")
 
 
 def generator(GenerateQuery, llm_generator) -> str:
@@ -22,4 +48,41 @@ def generator(GenerateQuery, llm_generator) -> str:
         raise ServiceError(message="unexpected error", name="unexpected error")
 
     else:
-        return "This is a api testing for generator module"
+        return ANSWER
+
+
+async def agenerator(GenerateQuery, llm_generator) -> str:
+    """
+    `generator` for the event loop: the context joins the generator's next batch, so
+    concurrent requests share one `generate_batch` call.
+    """
+    context_text = GenerateQuery.context
+    check_context(context_text)
+    await llm_generator.batcher.submit(context_text)
+    return ANSWER
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def stream_generator(GenerateQuery, llm_generator) -> AsyncIterator[bytes]:
+    """
+    Yields the generation as Server-Sent Events: one `token` event per chunk as it is
+    decoded, then a `done` event, or an `error` event if generation fails midway. Decoding
+    pauses while the client is not reading and stops when this iterator is closed. The
+    context must have passed `check_context`.
+    """
+    chunks = llm_generator.astream(GenerateQuery.context)
+    count = 0
+    try:
+        async for chunk in chunks:
+            count += 1
+            yield sse_event("token", {"text": chunk})
+    except Exception as error:
+        message = error.message if isinstance(error, ServiceError) else "unexpected error"
+        yield sse_event("error", {"message": message})
+        return
+    finally:
+        await chunks.aclose()
+    yield sse_event("done", {"chunks": count})
@@ -0,0 +1,32 @@
+import bisect
+from typing import Sequence
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram for `/v1/metrics`: counts, per upper bound, the values at or
+    below it and above the previous bound, plus an overflow bucket.
+
+    Args:
+        bounds (Sequence[float]): Increasing bucket upper bounds.
+    """
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def stats(self) -> dict:
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "buckets": buckets,
+        }
@@ -0,0 +1,162 @@
+import asyncio
+import gc
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+from modules.histogram import Histogram
+
+# Move the objects that exist once startup is done, such as modules, models and indexes, out
+# of the collector's reach, so full collections only scan what requests allocate.
+GC_FREEZE_STARTUP = os.getenv("GC_FREEZE_STARTUP", "1") == "1"
+# Collector thresholds as "gen0,gen1,gen2"; empty keeps the interpreter's. The default makes
+# young collections rarer and leaves full collections to the governor.
+GC_THRESHOLDS = os.getenv("GC_THRESHOLDS", "50000,20,1000")
+# Seconds between two full collections.
+GC_FULL_INTERVAL = float(os.getenv("GC_FULL_INTERVAL", 60))
+# Resident memory, in MiB, above which a full collection runs early; 0 disables the check.
+GC_RSS_WATERMARK_MB = float(os.getenv("GC_RSS_WATERMARK_MB", 0))
+# Seconds between two RSS checks.
+GC_CHECK_INTERVAL = float(os.getenv("GC_CHECK_INTERVAL", 1.0))
+# Least seconds between two full collections, so an RSS the collector cannot bring back
+# under the watermark does not cause one every check.
+GC_MIN_INTERVAL = float(os.getenv("GC_MIN_INTERVAL", 5.0))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb() -> Optional[float]:
+    """Resident memory of this process in MiB, or None where `/proc` is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _parse_thresholds(value: str) -> Optional[Tuple[int, ...]]:
+    if not value.strip():
+        return None
+    return tuple(int(threshold) for threshold in value.split(","))
+
+
+class MemoryGovernor:
+    """
+    Decides when this process collects garbage, instead of every request doing it.
+
+    `install` tunes the collector's thresholds and starts timing its pauses; `freeze` moves
+    the startup heap to the permanent generation; `run` performs full collections every
+    `full_interval` seconds, or sooner when the resident memory exceeds `rss_watermark_mb`,
+    but never more often than every `min_interval` seconds. `uninstall` undoes it all.
+
+    Args:
+        thresholds (tuple): `gc.set_threshold` arguments, or None to keep the current ones.
+        full_interval (float): Seconds between two full collections.
+        rss_watermark_mb (float): RSS in MiB that triggers an early collection; 0 disables it.
+        check_interval (float): Seconds between two RSS checks.
+        min_interval (float): Least seconds between two full collections.
+        rss (Callable): Returns the resident memory in MiB.
+    """
+
+    def __init__(
+        self,
+        thresholds: Optional[Tuple[int, ...]] = _parse_thresholds(GC_THRESHOLDS),
+        full_interval: float = GC_FULL_INTERVAL,
+        rss_watermark_mb: float = GC_RSS_WATERMARK_MB,
+        check_interval: float = GC_CHECK_INTERVAL,
+        min_interval: float = GC_MIN_INTERVAL,
+        rss: Callable[[], Optional[float]] = rss_mb,
+    ) -> None:
+        self.thresholds = thresholds
+        self.full_interval = full_interval
+        self.rss_watermark_mb = rss_watermark_mb
+        self.check_interval = check_interval
+        self.min_interval = min_interval
+        self.rss = rss
+        self.collections = {"timer": 0, "watermark": 0}
+        self.collected = 0
+        self.last_full_ms: Optional[float] = None
+        self.pause_ms = {
+            generation: Histogram([0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200])
+            for generation in range(3)
+        }
+        self._previous_thresholds: Optional[Tuple[int, ...]] = None
+        self._pause_started: Optional[float] = None
+        self._frozen = False
+        self._last_full = time.monotonic()
+
+    def install(self) -> None:
+        self._previous_thresholds = gc.get_threshold()
+        if self.thresholds is not None:
+            gc.set_threshold(*self.thresholds)
+        if self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+
+    def uninstall(self) -> None:
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        if self._previous_thresholds is not None:
+            gc.set_threshold(*self._previous_thresholds)
+            self._previous_thresholds = None
+        if self._frozen:
+            gc.unfreeze()
+            self._frozen = False
+
+    def _on_gc(self, phase: str, info: dict) -> None:
+        if phase == "start":
+            self._pause_started = time.perf_counter()
+        elif self._pause_started is not None:
+            elapsed = (time.perf_counter() - self._pause_started) * 1000
+            self._pause_started = None
+            self.pause_ms[info["generation"]].observe(elapsed)
+            self.collected += info["collected"]
+
+    def freeze(self) -> None:
+        """Collects the startup garbage once, then freezes every object left."""
+        gc.collect()
+        gc.freeze()
+        self._frozen = True
+        self._last_full = time.monotonic()
+
+    def collect(self, trigger: str) -> float:
+        """
+        Runs a full collection and returns its duration in ms.
+        """
+        start = time.perf_counter()
+        gc.collect()
+        self.last_full_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.collections[trigger] += 1
+        self._last_full = time.monotonic()
+        return self.last_full_ms
+
+    def due(self) -> Optional[str]:
+        """Returns why a full collection should run now, or None."""
+        since_last = time.monotonic() - self._last_full
+        if since_last >= self.full_interval:
+            return "timer"
+        if self.rss_watermark_mb > 0 and since_last >= self.min_interval:
+            rss = self.rss()
+            if rss is not None and rss > self.rss_watermark_mb:
+                return "watermark"
+        return None
+
+    async def run(self) -> None:
+        """Background task performing the full collections."""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            trigger = self.due()
+            if trigger is not None:
+                self.collect(trigger)
+
+    def stats(self) -> dict:
+        return {
+            "rss_mb": round(self.rss() or 0, 1),
+            "rss_watermark_mb": self.rss_watermark_mb,
+            "thresholds": gc.get_threshold(),
+            "pending": gc.get_count(),
+            "frozen_objects": gc.get_freeze_count(),
+            "full_collections": dict(self.collections),
+            "last_full_ms": self.last_full_ms,
+            "collected": self.collected,
+            "pause_ms": {f"gen{generation}": h.stats() for generation, h in self.pause_ms.items()},
+        }
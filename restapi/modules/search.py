@@ -1,6 +1,15 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator
+
 from pydantic import BaseModel, Field
 from exceptions import TypingError, ServiceError
-from schemas.search import SearchResponse
+from schemas.search import SearchBatchResponse, SearchItem, SearchResponse
+
+# Hits serialised per chunk written to a streaming response.
+NDJSON_CHUNK_HITS = int(os.getenv("NDJSON_CHUNK_HITS", 256))
+
 
 class UserQuery(BaseModel):
     engine_type: str = Field(
@@ -13,10 +22,22 @@ class UserQuery(BaseModel):
     )
 
 
+def check_context(context_text: str) -> None:
+    if len(context_text) < 5:
+        raise TypingError(message="Invalid input", name="input")
+
+
 def searcher(SearchQuery, search_engine) -> str:
 
     context_text = SearchQuery.context
-    out = search_engine.search(query=context_text)
+    if isinstance(context_text, list):
+        return batch_searcher(SearchQuery, search_engine)
+
+    out = search_engine.search(
+        query=context_text,
+        engine_type=SearchQuery.engine_type,
+        top_k=SearchQuery.top_k,
+    )
 
     if len(context_text) < 5:
         raise TypingError(message="Invalid input", name="input")
@@ -26,3 +47,114 @@ def searcher(SearchQuery, search_engine) -> str:
 
     else:
         return SearchResponse(**out)
+
+
+def _split_batch(context):
+    results = [None] * len(context)
+    valid = []
+    for position, text in enumerate(context):
+        try:
+            check_context(text)
+        except TypingError as error:
+            results[position] = SearchItem(query=text, error=f"{error.message} [{error.name}]")
+        else:
+            valid.append(position)
+    return results, valid
+
+
+def _batch_response(SearchQuery, results, valid, outs) -> SearchBatchResponse:
+    for position, out in zip(valid, outs):
+        results[position] = SearchItem(**out)
+
+    return SearchBatchResponse(
+        engine_type=SearchQuery.engine_type,
+        search_configs=SearchQuery.search_configs,
+        results=results,
+    )
+
+
+def batch_searcher(SearchQuery, search_engine) -> SearchBatchResponse:
+    """
+    Answers every query of a list `context` with one engine call.
+    Queries failing validation get an `error` entry instead of failing the whole batch.
+    """
+    results, valid = _split_batch(SearchQuery.context)
+    outs = search_engine.search_batch(
+        queries=[SearchQuery.context[position] for position in valid],
+        engine_type=SearchQuery.engine_type,
+        top_k=SearchQuery.top_k,
+    )
+    return _batch_response(SearchQuery, results, valid, outs)
+
+
+async def asearcher(SearchQuery, search_engine):
+    """
+    `searcher` for the event loop: remote engines are awaited on the shared connection
+    pool, in-process engines run in a worker thread.
+    """
+    if not search_engine.is_remote(SearchQuery.engine_type):
+        return await asyncio.to_thread(searcher, SearchQuery, search_engine)
+
+    context_text = SearchQuery.context
+    if isinstance(context_text, list):
+        results, valid = _split_batch(context_text)
+        outs = await search_engine.asearch_batch(
+            queries=[context_text[position] for position in valid],
+            engine_type=SearchQuery.engine_type,
+            top_k=SearchQuery.top_k,
+        )
+        return _batch_response(SearchQuery, results, valid, outs)
+
+    check_context(context_text)
+    out = await search_engine.asearch(
+        query=context_text,
+        engine_type=SearchQuery.engine_type,
+        top_k=SearchQuery.top_k,
+    )
+    return SearchResponse(**out)
+
+
+async def stream_searcher(SearchQuery, search_engine) -> AsyncIterator[bytes]:
+    """
+    Yields the search result as NDJSON. A single query gives a header line with the query
+    fields, then one `{"rank", "id", "score"}` line per hit in chunks of `NDJSON_CHUNK_HITS`,
+    so the first bytes go out before the remaining hits are serialised. A list `context`
+    gives one line per query. The context must have passed `check_context`.
+    """
+    context_text = SearchQuery.context
+    if isinstance(context_text, list):
+        result = await asearcher(SearchQuery, search_engine)
+        for item in result.results:
+            yield item.model_dump_json().encode() + b"\n"
+        return
+
+    if search_engine.is_remote(SearchQuery.engine_type):
+        out = await search_engine.asearch(
+            query=context_text,
+            engine_type=SearchQuery.engine_type,
+            top_k=SearchQuery.top_k,
+        )
+        hits = zip(out["ids"], out["scores"])
+    else:
+        hits = await asyncio.to_thread(
+            search_engine.iter_hits,
+            query=context_text,
+            engine_type=SearchQuery.engine_type,
+            top_k=SearchQuery.top_k,
+        )
+    header = {
+        "query": context_text,
+        "engine_type": SearchQuery.engine_type,
+        "search_configs": SearchQuery.search_configs,
+        "top_k": SearchQuery.top_k,
+    }
+    yield json.dumps(header).encode() + b"\n"
+
+    lines = []
+    for rank, (doc_id, score) in enumerate(hits, start=1):
+        lines.append(json.dumps({"rank": rank, "id": doc_id, "score": score}))
+        if len(lines) >= NDJSON_CHUNK_HITS:
+            yield "\n".join(lines).encode() + b"\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines).encode() + b"\n"
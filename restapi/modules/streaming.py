@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Chunks a producer thread may run ahead of the consumer before it blocks.
+STREAM_BUFFER_CHUNKS = int(os.getenv("STREAM_BUFFER_CHUNKS", 8))
+# Streams decoding at the same time; more are shed with 503. Each holds one producer thread.
+GENERATE_MAX_STREAMS = int(os.getenv("GENERATE_MAX_STREAMS", 64))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def stream_executor() -> ThreadPoolExecutor:
+    """
+    Threads the stream producers run on. A producer blocks while its consumer is behind, so
+    they get their own pool instead of starving `asyncio.to_thread` work of the default one.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=GENERATE_MAX_STREAMS, thread_name_prefix="stream"
+        )
+    return _executor
+
+
+def close_stream_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def iterate_in_thread(
+    make_iterable: Callable[[], Iterable[T]],
+    buffer_chunks: int = STREAM_BUFFER_CHUNKS,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[T]:
+    """
+    Runs a blocking iterator in a thread of `executor`, `stream_executor()` by default, and
+    yields its items on the event loop.
+
+    The thread may run at most `buffer_chunks` items ahead of the consumer, so a slow
+    consumer, e.g. a client reading a stream slowly, pauses the producer instead of letting
+    items pile up in memory. When the consumer stops early, because it was closed or
+    cancelled, the thread stops before its next item and the iterator is closed, so
+    abandoned work ends at the next chunk boundary. Exceptions of the iterator are raised
+    to the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    credits = threading.Semaphore(buffer_chunks)
+    stop = threading.Event()
+
+    def send(message) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        except RuntimeError:
+            # the event loop is gone, so nobody is reading
+            stop.set()
+
+    def produce() -> None:
+        iterator = None
+        try:
+            iterator = iter(make_iterable())
+            for item in iterator:
+                credits.acquire()
+                if stop.is_set():
+                    return
+                send((True, item))
+        except BaseException as error:
+            send((False, error))
+        else:
+            send((False, None))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    loop.run_in_executor(executor or stream_executor(), produce)
+    try:
+        while True:
+            ok, item = await queue.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            credits.release()
+            yield item
+    finally:
+        stop.set()
+        # wakes a producer blocked on a full buffer so it can see `stop`
+        credits.release()
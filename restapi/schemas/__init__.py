@@ -1,2 +1,3 @@
 from .generate import GenerateQuery
 from .search import SearchQuery
+from .ingest import DeleteDocuments, IngestDocuments
@@ -0,0 +1,20 @@
+import os
+from typing import List
+
+from pydantic import BaseModel, Field
+
+# Largest number of documents or ids accepted in one ingestion request.
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", 1000))
+
+
+class Document(BaseModel):
+    id: str = Field(min_length=1, description="Document id; ingesting an existing id replaces it")
+    text: str = Field(description="Document text")
+
+
+class IngestDocuments(BaseModel):
+    documents: List[Document] = Field(min_length=1, max_length=INGEST_MAX_BATCH)
+
+
+class DeleteDocuments(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=INGEST_MAX_BATCH)
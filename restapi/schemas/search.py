@@ -1,6 +1,12 @@
-from typing import List, Union
+import os
+from typing import List, Optional, Union
 from pydantic import BaseModel, Field, field_validator
 
+from modules.engines.registry import ENGINE_TYPES
+
+# Largest list `context` answered in one request.
+SEARCH_MAX_BATCH_SIZE = int(os.getenv("SEARCH_MAX_BATCH_SIZE", 512))
+
 
 class SearchQuery(BaseModel):
     engine_type: str = Field(
@@ -12,7 +18,29 @@ class SearchQuery(BaseModel):
         description="search_configs",
     )
     context: Union[str, List[str]] = Field(description="Input context")
+    top_k: int = Field(default=10, ge=1, description="Number of documents to return")
+
+    @field_validator("engine_type")
+    @classmethod
+    def check_engine_type(cls, engine_type):
+        if engine_type not in ENGINE_TYPES:
+            raise ValueError(
+                f"unknown engine_type {engine_type!r}, expected one of {', '.join(ENGINE_TYPES)}"
+            )
+        return engine_type
 
+    @field_validator("context")
+    @classmethod
+    def check_batch_size(cls, context):
+        if isinstance(context, list):
+            if not context:
+                raise ValueError("context list must not be empty")
+            if len(context) > SEARCH_MAX_BATCH_SIZE:
+                raise ValueError(
+                    f"context list holds {len(context)} queries, "
+                    f"at most {SEARCH_MAX_BATCH_SIZE} are allowed"
+                )
+        return context
 
 
 class SearchResponse(BaseModel):
@@ -34,4 +62,30 @@ class SearchResponse(BaseModel):
         default="related_docs",
         description="related_docs",
     )
+    ids: List[str] = Field(default=[], description="Ids of the matched documents, best first")
+    scores: List[float] = Field(default=[], description="Similarity score of each matched document")
+
+
 
+class SearchItem(BaseModel):
+    query: str = Field(description="Input context")
+    related_docs: Optional[str] = Field(default=None, description="related_docs")
+    ids: List[str] = Field(default=[], description="Ids of the matched documents, best first")
+    scores: List[float] = Field(default=[], description="Similarity score of each matched document")
+    error: Optional[str] = Field(default=None, description="Why this query has no results")
+
+
+class SearchBatchResponse(BaseModel):
+    desc : str = Field(
+        default="This is a api testing for searcher module",
+        description="desc",
+    )
+    engine_type: str = Field(
+        default="weaviate",
+        description="engine_type"
+    )
+    search_configs: str = Field(
+        default="search_configs",
+        description="search_configs",
+    )
+    results: List[SearchItem] = Field(description="One result per query, in request order")
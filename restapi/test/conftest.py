@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("USERS_DATABASE_URL", "sqlite://")
+os.environ.setdefault("RATELIMIT_STORAGE_DIR", tempfile.mkdtemp())
+os.environ.setdefault("ADMIN_USERNAMES", "tim")
+os.environ.setdefault(
+    "GENERATION_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "generation_cache.db")
+)
+
+from database.import_users import read_users
+from database.users import user_store
+
+if "tim" not in user_store:
+    user_store.import_users(read_users("database/users.example.csv"))
+
+
+@pytest.fixture
+def auth_headers():
+    from api.middlewares.gen_access_token import GenAccToken
+    from api.routes.limiter import limiter
+
+    # every test starts with full rate-limit buckets
+    limiter.reset()
+    token_generator = GenAccToken()
+    user = token_generator.authenticate_user(username="tim", password="tim1234")
+    token = token_generator.create_access_token(data=user.model_dump())
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(autouse=True)
+def empty_search_cache():
+    from api.routes.search_cache import search_cache
+
+    # tests swap the search engine, so results cached by another test would be stale
+    search_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def empty_generation_cache():
+    from api.routes.generation_cache import generation_cache
+
+    # tests count generator calls, which a cached answer would skip
+    generation_cache.clear()
@@ -0,0 +1,192 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.routes.admission import cancel_on_disconnect, request_admission
+from api.routes.concurrency import AdaptiveConcurrencyLimiter
+from api.routes.limiter import limiter
+from api.routes.search_cache import SearchResultCache
+from exceptions import ClientDisconnected, DeadlineExceeded, ServiceOverloaded, TypingError
+from main import app
+from modules.core import LLMGeneratorInit
+
+
+def _limiter(**kwargs) -> AdaptiveConcurrencyLimiter:
+    return AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_limit=1, **kwargs)
+
+
+def test_slots_go_to_interactive_requests_then_earliest_deadline():
+    slots = _limiter(max_queue=8, queue_timeout=5, batch_queue_timeout=5)
+    order = []
+
+    async def request(name, priority, deadline=None):
+        async with slots.acquire(priority, deadline):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        now = time.monotonic()
+        holder = asyncio.ensure_future(request("first", "interactive"))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.ensure_future(request("batch", "batch")),
+            asyncio.ensure_future(request("late", "interactive", now + 60)),
+            asyncio.ensure_future(request("early", "interactive", now + 30)),
+            asyncio.ensure_future(request("no deadline", "interactive")),
+        ]
+        await asyncio.gather(holder, *waiters)
+
+    asyncio.run(run())
+    assert order == ["first", "early", "late", "no deadline", "batch"]
+
+
+def test_expired_work_is_dropped_before_it_starts():
+    slots = _limiter(max_queue=8, queue_timeout=5)
+    started = []
+
+    async def run():
+        with pytest.raises(DeadlineExceeded):
+            async with slots.acquire("interactive", time.monotonic() - 1):
+                started.append("past")
+
+        async with slots.acquire():
+            # the deadline passes while the request waits for the busy slot
+            with pytest.raises(DeadlineExceeded):
+                async with slots.acquire("interactive", time.monotonic() + 0.05):
+                    started.append("queued")
+
+    asyncio.run(run())
+    assert started == []
+    assert slots.stats()["expired"] == 2
+    assert slots.in_flight == 0
+
+
+def test_full_queue_sheds_batch_requests_for_interactive_ones():
+    slots = _limiter(max_queue=1, queue_timeout=5, batch_queue_timeout=5)
+
+    async def run():
+        async with slots.acquire():
+            batch = asyncio.ensure_future(slots.acquire("batch").__aenter__())
+            await asyncio.sleep(0)
+            interactive = asyncio.ensure_future(slots.acquire("interactive").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(ServiceOverloaded):
+                await batch
+            # a second batch request cannot displace the queued interactive one
+            with pytest.raises(ServiceOverloaded):
+                await slots.acquire("batch").__aenter__()
+        await interactive
+        assert slots.in_flight == 1
+
+    asyncio.run(run())
+
+
+class _Request:
+    def __init__(self, headers=None, disconnect_after=None, user=None) -> None:
+        self.headers = headers or {}
+        self.disconnect_after = disconnect_after
+        self.state = type("State", (), {"user": user})()
+
+    async def receive(self):
+        if self.disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.disconnect_after)
+        return {"type": "http.disconnect"}
+
+
+def test_headers_set_deadline_and_can_only_lower_priority(monkeypatch):
+    from api.routes import admission
+
+    monkeypatch.setitem(admission.ROLE_PRIORITIES, "Reporting", "batch")
+    reporting = type("User", (), {"idm_role": "Reporting"})()
+
+    deadline = time.time() + 10
+    ticket = request_admission(_Request({"x-request-deadline": str(deadline)}))
+    assert ticket.priority == "interactive"
+    assert ticket.deadline == pytest.approx(time.monotonic() + 10, abs=0.1)
+
+    assert request_admission(_Request({"x-request-priority": "batch"})).priority == "batch"
+    promoted = request_admission(_Request({"x-request-priority": "interactive"}, user=reporting))
+    assert promoted.priority == "batch"
+
+    for headers in ({"x-request-priority": "urgent"}, {"x-request-deadline": "soon"}):
+        with pytest.raises(TypingError):
+            request_admission(_Request(headers))
+
+
+def test_disconnect_cancels_work_and_frees_its_slot():
+    slots = _limiter()
+    cancelled = asyncio.Event()
+
+    async def work():
+        async with slots.acquire():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+    async def run():
+        start = time.perf_counter()
+        with pytest.raises(ClientDisconnected):
+            await cancel_on_disconnect(_Request(disconnect_after=0.05), work())
+        assert cancelled.is_set()
+        assert time.perf_counter() - start < 1
+        assert slots.in_flight == 0
+        assert await cancel_on_disconnect(_Request(), asyncio.sleep(0, "done")) == "done"
+
+    asyncio.run(run())
+
+
+def test_merged_requests_survive_the_cancelled_one():
+    cache = SearchResultCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return b"result"
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute(b"key", "numpy", compute))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_compute(b"key", "numpy", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == b"result"
+    assert calls == 2
+
+
+class _CountingGenerator(LLMGeneratorInit):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    def generate_batch(self, queries):
+        self.calls += len(queries)
+        return super().generate_batch(queries)
+
+
+def test_route_rejects_expired_and_invalid_requests(auth_headers):
+    def post(client, path, headers):
+        limiter.reset()
+        body = {"context": "some passage"}
+        return client.post(path, json=body, headers={**auth_headers, **headers})
+
+    with TestClient(app) as client:
+        llm_generator = app.state.llm_generator = _CountingGenerator()
+        response = post(client, "/v1/from_search", {"X-Request-Deadline": str(time.time() - 1)})
+        assert response.status_code == 504
+        assert llm_generator.calls == 0
+
+        response = post(client, "/v1/from_query", {"X-Request-Priority": "urgent"})
+        assert response.status_code == 400
+
+        response = post(client, "/v1/from_search", {"X-Request-Deadline": str(time.time() + 30)})
+        assert response.status_code == 200
+        assert llm_generator.calls == 1
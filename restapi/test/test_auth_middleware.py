@@ -0,0 +1,49 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from api.middlewares import AuthenticationMiddleware
+from api.middlewares.gen_access_token import GenAccToken
+
+app = FastAPI()
+app.add_middleware(AuthenticationMiddleware)
+
+
+@app.post("/whoami")
+async def whoami(request: Request):
+    return {"username": request.state.user.username}
+
+
+@app.get("/public")
+async def public():
+    return {"message": "OK"}
+
+
+client = TestClient(app)
+
+
+def _token() -> str:
+    token_generator = GenAccToken()
+    user = token_generator.authenticate_user(username="tim", password="tim1234")
+    return token_generator.create_access_token(data=user.model_dump())
+
+
+def test_get_is_not_authenticated():
+    assert client.get("/public").status_code == 200
+
+
+def test_missing_token_is_rejected():
+    response = client.post("/whoami")
+    assert response.status_code == 401
+    assert response.json() == "Missing authentication token."
+
+
+def test_invalid_token_is_rejected():
+    response = client.post("/whoami", headers={"Authorization": "Bearer nope"})
+    assert response.status_code == 401
+    assert response.json() == "Invalid authentication token."
+
+
+def test_valid_token_sets_request_user():
+    response = client.post("/whoami", headers={"Authorization": f"Bearer {_token()}"})
+    assert response.status_code == 200
+    assert response.json() == {"username": "tim"}
@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+
+from main import app
+from modules.core import SearcherInit
+from modules.engines.numpy_index import NumpyIndex
+from schemas.search import SEARCH_MAX_BATCH_SIZE
+
+TEXTS = ["the quick brown fox", "a lazy dog sleeps", "quantum physics lecture"]
+
+
+def test_batch_matches_single_queries():
+    searcher = SearcherInit(numpy_index=NumpyIndex.from_texts(TEXTS, ids=["fox", "dog", "physics"]))
+    queries = ["brown fox jumps", "physics lecture notes", "the dog sleeps"]
+
+    batch = searcher.search_batch(queries, engine_type="numpy", top_k=2)
+
+    assert [item["query"] for item in batch] == queries
+    for query, item in zip(queries, batch):
+        single = searcher.search(query, engine_type="numpy", top_k=2)
+        assert item["ids"] == single["ids"]
+
+
+def test_batch_route_reports_per_item_errors(auth_headers):
+    app.state.search_engine = SearcherInit(
+        numpy_index=NumpyIndex.from_texts(TEXTS, ids=["fox", "dog", "physics"])
+    )
+    response = TestClient(app).post(
+        "/v1/from_query",
+        json={"context": ["quick brown fox", "dog", "quantum physics"], "engine_type": "numpy", "top_k": 1},
+        headers=auth_headers,
+    )
+    app.state.search_engine = None
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [r["ids"] for r in results] == [["fox"], [], ["physics"]]
+    assert results[1]["error"] == "Invalid input [input]"
+    assert results[0]["error"] is None
+
+
+def test_batch_size_is_limited(auth_headers):
+    response = TestClient(app).post(
+        "/v1/from_query",
+        json={"context": ["example query"] * (SEARCH_MAX_BATCH_SIZE + 1)},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
@@ -0,0 +1,98 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from main import app
+from modules.core import SearcherInit
+from modules.engines.bm25 import BM25Index
+from modules.engines.fusion import reciprocal_rank_fusion
+from modules.engines.numpy_index import NumpyIndex
+
+
+def _exhaustive(index, query, k):
+    scores = np.zeros(len(index), dtype=np.float32)
+    for term in {index.vocab[t] for t in query.split() if t in index.vocab}:
+        docs, tfs = index._postings(term)
+        scores[docs] += index._score(index.idf[term], tfs, index.norms[docs], index.k1)
+    return np.sort(scores[scores > 0])[::-1][:k]
+
+
+def test_maxscore_matches_exhaustive_scoring(tmp_path):
+    rng = np.random.default_rng(0)
+    vocab_size = 500
+    weights = 1 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+    texts = [
+        " ".join(f"t{w}" for w in rng.choice(vocab_size, rng.integers(3, 30), p=weights))
+        for _ in range(3000)
+    ]
+    index = BM25Index.from_texts(texts, [str(i) for i in range(len(texts))], block_size=8)
+    index.save(tmp_path / "bm25.npz")
+    loaded = BM25Index.load(str(tmp_path / "bm25.npz"))
+
+    for _ in range(100):
+        query = " ".join(f"t{w}" for w in rng.choice(vocab_size, rng.integers(1, 6), p=weights))
+        k = int(rng.integers(1, 20))
+        _, scores = loaded.search_terms(query, k)
+        np.testing.assert_allclose(scores, _exhaustive(index, query, k), rtol=1e-5)
+
+
+def test_exact_codes_are_found():
+    texts = ["error code E1234 in the pump", "pump maintenance guide", "E9999 reset procedure"]
+    index = BM25Index.from_texts(texts, ["a", "b", "c"])
+    ids, scores = index.search(["what does E1234 mean"], k=3)[0]
+    assert ids == ["a"]
+    assert index.search(["unknown words"], k=3)[0] == ([], [])
+
+
+def test_reciprocal_rank_fusion():
+    ids, scores = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=3, rrf_k=60)
+    assert ids == ["b", "a", "d"]
+    assert scores[0] == 1 / 62 + 1 / 61
+
+
+def test_hybrid_route(auth_headers):
+    texts = ["error code E1234 in the pump", "pump maintenance guide", "quantum physics lecture"]
+    ids = ["code", "guide", "physics"]
+    app.state.search_engine = SearcherInit(
+        numpy_index=NumpyIndex.from_texts(texts, ids=ids),
+        bm25_index=BM25Index.from_texts(texts, ids),
+    )
+    response = TestClient(app).post(
+        "/v1/from_query",
+        json={"context": "pump error E1234", "engine_type": "hybrid", "top_k": 2},
+        headers=auth_headers,
+    )
+    app.state.search_engine = None
+
+    assert response.status_code == 200, response.text
+    assert response.json()["engine_type"] == "hybrid"
+    assert response.json()["ids"][0] == "code"
+
+
+def test_maxscore_matches_brute_force_on_random_corpora():
+    # Documents of equal length without repeated words: every posting of a term scores
+    # exactly the term's bound, so many documents tie with the k-th score and the pruning
+    # bounds are tight, where rounding in them would drop a document.
+    for seed in range(20):
+        rng = np.random.default_rng(seed)
+        vocab_size = int(rng.integers(20, 60))
+        length = int(rng.integers(3, 15))
+        texts = [
+            " ".join(f"t{w}" for w in rng.choice(vocab_size, length, replace=False))
+            for _ in range(int(rng.integers(30, 300)))
+        ]
+        index = BM25Index.from_texts(
+            texts, [str(i) for i in range(len(texts))], block_size=int(rng.integers(1, 16))
+        )
+        for _ in range(20):
+            query = " ".join(f"t{w}" for w in rng.permutation(vocab_size)[: rng.integers(1, 40)])
+            k = int(rng.integers(1, 30))
+            rows, scores = index.search_terms(query, k)
+            expected = _exhaustive(index, query, k)
+            np.testing.assert_allclose(scores, expected, rtol=1e-5)
+            # every returned document has the score brute force gives it
+            brute = np.zeros(len(index), dtype=np.float32)
+            for term in {index.vocab[t] for t in query.split() if t in index.vocab}:
+                docs, tfs = index._postings(term)
+                brute[docs] += index._score(index.idf[term], tfs, index.norms[docs], index.k1)
+            np.testing.assert_allclose(brute[rows], scores, rtol=1e-5)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.routes.concurrency import AdaptiveConcurrencyLimiter
+from exceptions import ServiceOverloaded
+from main import app
+
+
+def test_requests_over_the_limit_are_shed():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_queue=1, queue_timeout=0.05)
+
+    async def hold(seconds: float):
+        async with limiter.acquire():
+            await asyncio.sleep(seconds)
+
+    async def run():
+        return await asyncio.gather(
+            *(hold(0.2) for _ in range(4)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    shed = [result for result in results if isinstance(result, ServiceOverloaded)]
+    assert len(shed) == 2
+    assert limiter.stats()["shed"] == 2
+    assert limiter.in_flight == 0
+    assert limiter.queue_depth == 0
+
+
+def test_queued_request_gets_the_released_slot():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue=4, queue_timeout=1)
+    order = []
+
+    async def hold(name: str):
+        async with limiter.acquire():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(hold("a"), hold("b"), hold("c"))
+
+    asyncio.run(run())
+    assert order == ["a", "b", "c"]
+    assert limiter.in_flight == 0
+
+
+def test_limit_backs_off_on_slow_requests_and_grows_when_busy():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, latency_tolerance=2)
+    for _ in range(10):
+        limiter.in_flight += 1
+        limiter._release(0.01, in_flight=10, failed=False)
+    grown = limiter.limit
+    assert grown > 10
+
+    limiter.in_flight += 1
+    limiter._release(0.5, in_flight=10, failed=False)
+    assert limiter.limit == pytest.approx(grown * 0.9)
+
+
+def test_metrics_are_exported():
+    response = TestClient(app).get("/v1/metrics")
+    assert response.status_code == 200
+    assert {"limit", "in_flight", "queue_depth", "shed"} <= set(
+        response.json()["generate_concurrency"]
+    )
@@ -0,0 +1,93 @@
+import unicodedata
+
+import numpy as np
+
+from modules.embedding import HashingEmbedder
+from modules.engines.embedding_cache import QueryEmbeddingCache, embedder_model
+from modules.engines.numpy_index import NumpyIndex
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self, dim: int = 32) -> None:
+        super().__init__(dim)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_hits_match_the_embedder_and_skip_it():
+    embedder = CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder.dim, capacity=8)
+
+    first = cache.embed(["quick  brown fox", "lazy dog", "quick brown fox"], embedder)
+    assert embedder.embedded == ["quick  brown fox", "lazy dog"]
+    expected = HashingEmbedder(embedder.dim).embed(["quick brown fox", "lazy dog"])
+    np.testing.assert_array_equal(first, expected[[0, 1, 0]])
+
+    embedder.embedded.clear()
+    second = cache.embed(["lazy dog", " quick brown fox "], embedder)
+    assert embedder.embedded == []
+    np.testing.assert_array_equal(second, first[[1, 0]])
+    assert cache.stats()["hits"] == 2
+
+
+def test_cached_vectors_equal_fresh_ones_for_every_spelling():
+    embedder = CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder.dim, capacity=8)
+    composed = unicodedata.normalize("NFC", "café au lait")
+    decomposed = unicodedata.normalize("NFD", "café au lait")
+    texts = [composed, decomposed, "  café   au lait ", "café au lait\t"]
+    for text in texts:
+        cache.embed([text], embedder)
+    for text in texts:
+        np.testing.assert_array_equal(cache.embed([text], embedder), embedder.embed([text]))
+
+
+def test_clock_evicts_entries_not_used_since_the_last_pass():
+    embedder = CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder.dim, capacity=3)
+    cache.embed(["a", "b", "c"], embedder)
+    cache.embed(["a"], embedder)  # sets the reference bit of "a"
+
+    cache.embed(["d"], embedder)
+    embedder.embedded.clear()
+    cache.embed(["a", "c", "d"], embedder)
+    assert embedder.embedded == []
+    cache.embed(["b"], embedder)
+    assert embedder.embedded == ["b"]
+    assert len(cache) == 3
+    assert cache.stats()["evictions"] == 2
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "queries.npz")
+    embedder = CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder.dim, capacity=4, model=embedder_model(embedder))
+    vectors = cache.embed(["a cat", "a dog"], embedder)
+    cache.save(path)
+
+    warm = QueryEmbeddingCache(embedder.dim, capacity=4, model=embedder_model(embedder))
+    assert warm.load(path) == 2
+    embedder.embedded.clear()
+    np.testing.assert_array_equal(warm.embed(["a cat", "a dog"], embedder), vectors)
+    assert embedder.embedded == []
+
+    other_model = QueryEmbeddingCache(embedder.dim, capacity=4, model="another-encoder")
+    assert other_model.load(path) == 0
+
+    # a file of the earlier key format is not loaded
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files if name != "key_version"}
+    np.savez(path, **arrays)
+    assert QueryEmbeddingCache(embedder.dim, capacity=4, model=embedder_model(embedder)).load(path) == 0
+
+
+def test_index_searches_through_the_cache():
+    index = NumpyIndex.from_texts(["quick brown fox", "lazy dog"], ids=["fox", "dog"])
+    expected = index.search(["brown fox"], k=1)
+    index.query_cache = QueryEmbeddingCache(index.dim, capacity=4)
+    assert index.search(["brown fox"], k=1) == expected
+    assert index.search(["brown fox"], k=1) == expected
+    assert index.query_cache.stats()["hits"] == 1
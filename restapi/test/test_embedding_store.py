@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pytest
+
+from modules.core import SearcherInit
+from modules.engines.embedding_store import EmbeddingStore, StoreFormatError
+from modules.engines.numpy_index import NumpyIndex, normalize
+
+
+def test_store_round_trip_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "corpus.emb")
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((100, 16)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(99)] + ["dokümant"]
+    EmbeddingStore.write(path, embeddings, ids)
+
+    store = EmbeddingStore(path)
+    assert (store.version, store.dim, store.count) == (1, 16, 100)
+    assert isinstance(store.embeddings, np.memmap)
+    np.testing.assert_allclose(store.embeddings, normalize(embeddings), rtol=1e-6)
+    assert list(store.ids) == ids
+    assert store.ids[-1] == "dokümant"
+    assert not [p for p in os.listdir(tmp_path) if ".tmp-" in p]
+
+
+def test_index_opened_from_store_matches_in_memory_index(tmp_path):
+    path = str(tmp_path / "corpus.emb")
+    texts = ["the quick brown fox", "a lazy dog sleeps", "quantum physics lecture"]
+    NumpyIndex.from_texts(texts, ids=["fox", "dog", "physics"]).save_store(path)
+
+    index = NumpyIndex.open(path)
+    assert isinstance(index.embeddings, np.memmap)
+    ids, _ = index.search(["brown fox"], k=1)[0]
+    assert ids == ["fox"]
+
+
+def test_new_snapshot_is_swapped_in(tmp_path):
+    path = str(tmp_path / "corpus.emb")
+    EmbeddingStore.write(path, np.eye(2, dtype=np.float32), ["a", "b"])
+    searcher = SearcherInit(numpy_index=NumpyIndex.open(path))
+    old_index = searcher.numpy_index
+    assert not searcher.refresh()
+
+    EmbeddingStore.write(path, np.eye(3, dtype=np.float32), ["a", "b", "c"])
+    assert searcher.refresh()
+    assert len(searcher.numpy_index) == 3
+    # the replaced snapshot stays readable for searches that still hold it
+    assert old_index.search_vectors(np.array([0, 1], dtype=np.float32), k=1)[0][0, 0] == 1
+
+
+def test_rejects_files_that_are_not_stores(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"x" * 128)
+    with pytest.raises(StoreFormatError):
+        EmbeddingStore(str(path))
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from modules.core import SearcherInit
+from modules.engines.numpy_index import NumpyIndex
+from modules.engines.registry import EngineRegistry
+
+
+def test_backends_are_built_once_on_first_use():
+    calls = []
+
+    def build():
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+
+    registry = EngineRegistry({"slow": build, "other": build})
+    assert not registry.is_loaded("slow")
+
+    backends = []
+    threads = [
+        threading.Thread(target=lambda: backends.append(registry.get("slow"))) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(backend is backends[0] for backend in backends)
+    assert registry.stats()["slow"]["loaded"]
+    assert not registry.stats()["other"]["loaded"]
+
+
+def test_factories_are_imported_lazily():
+    registry = EngineRegistry({"bm25": "modules.engines.bm25:build_bm25_index"})
+    assert registry.peek("bm25") is None
+    assert len(registry.get("bm25")) == 0
+
+
+def test_prewarm_builds_every_backend_of_an_engine():
+    registry = EngineRegistry({"numpy": object, "bm25": object, "weaviate": object})
+    registry.prewarm(["hybrid"])
+    assert registry.is_loaded("numpy") and registry.is_loaded("bm25")
+    assert not registry.is_loaded("weaviate")
+    with pytest.raises(ValueError):
+        registry.prewarm(["elastic"])
+
+
+def test_searcher_only_builds_the_engines_it_uses():
+    index = NumpyIndex.from_texts(["quick brown fox"], ids=["fox"])
+    searcher = SearcherInit(numpy_index=index)
+    assert searcher.search("brown fox", engine_type="numpy", top_k=1)["ids"] == ["fox"]
+    assert not searcher.backends.is_loaded("bm25")
+    assert not searcher.backends.is_loaded("weaviate")
+
+
+def test_unknown_engine_type_is_rejected_at_validation(auth_headers):
+    response = TestClient(app).post(
+        "/v1/from_query",
+        json={"context": "quick brown fox", "engine_type": "elastic"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+    assert "elastic" in response.text
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+
+from exceptions import ServiceError, ServiceOverloaded
+from modules.executor import EXECUTOR_SHM_MIN_BYTES, ProcessPool, dumps, loads
+
+# Workers are spawned and import this module, so the backend needs no extra setup.
+BACKEND = "test_executor:build_backend"
+
+
+class _Backend:
+    def __init__(self) -> None:
+        self.warm = False
+
+    def warmup(self) -> None:
+        self.warm = True
+
+    def pid(self) -> int:
+        return os.getpid()
+
+    def is_warm(self) -> bool:
+        return self.warm
+
+    def double(self, array: np.ndarray) -> np.ndarray:
+        return array * 2
+
+    def sleep(self, seconds: float) -> int:
+        time.sleep(seconds)
+        return os.getpid()
+
+    def fail(self) -> None:
+        raise ValueError("bad input")
+
+    def count(self, n: int, delay: float = 0.0):
+        for i in range(n):
+            time.sleep(delay)
+            yield i
+
+
+def build_backend() -> _Backend:
+    return _Backend()
+
+
+def _run(coroutine_function):
+    async def main():
+        pool = ProcessPool(BACKEND, workers=1, task_timeout=5, max_tasks_per_worker=0)
+        try:
+            return await coroutine_function(pool)
+        finally:
+            await pool.aclose()
+
+    return asyncio.run(main())
+
+
+def test_large_arrays_travel_through_shared_memory():
+    array = np.arange(EXECUTOR_SHM_MIN_BYTES // 8 + 1, dtype=np.float64)
+    payload = dumps((array, np.zeros(3)))
+    assert len(payload[1]) == 1
+    assert len(payload[0]) < 1024
+
+    restored, small = loads(payload)
+    np.testing.assert_array_equal(restored, array)
+    np.testing.assert_array_equal(small, np.zeros(3))
+    # the segment was unlinked by the receiver
+    with pytest.raises(FileNotFoundError):
+        loads(payload)
+
+
+def test_call_runs_on_a_warm_worker_process():
+    async def check(pool):
+        array = np.arange(EXECUTOR_SHM_MIN_BYTES, dtype=np.int32)
+        pid = await pool.call("pid")
+        return pid, await pool.call("is_warm"), await pool.call("double", array), array
+
+    pid, warm, doubled, array = _run(check)
+    assert pid != os.getpid()
+    assert warm
+    np.testing.assert_array_equal(doubled, array * 2)
+
+
+def test_errors_are_raised_to_the_caller_and_keep_the_worker():
+    async def check(pool):
+        pid = await pool.call("pid")
+        with pytest.raises(ValueError, match="bad input"):
+            await pool.call("fail")
+        return pid, await pool.call("pid")
+
+    before, after = _run(check)
+    assert before == after
+
+
+def test_timeout_replaces_the_worker():
+    async def check(pool):
+        pool.task_timeout = 0.5
+        pid = await pool.call("pid")
+        with pytest.raises(ServiceError):
+            await pool.call("sleep", 5)
+        return pid, await pool.call("pid"), pool.stats()
+
+    before, after, stats = _run(check)
+    assert before != after
+    assert stats["timeouts"] == 1
+    assert stats["workers"] == 1
+
+
+def test_workers_are_recycled_after_max_tasks():
+    async def check(pool):
+        pool.max_tasks_per_worker = 2
+        return [await pool.call("pid") for _ in range(5)], pool.stats()
+
+    pids, stats = _run(check)
+    assert pids[0] == pids[1] != pids[2] == pids[3] != pids[4]
+    assert stats["recycled"] == 2
+
+
+def test_stream_yields_items_and_stops_when_closed():
+    async def check(pool):
+        items = [item async for item in pool.stream("count", 4)]
+
+        stream = pool.stream("count", 1000, 0.01)
+        first = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        # the worker stopped the abandoned stream and took the next task promptly
+        start = time.perf_counter()
+        assert await pool.call("is_warm")
+        return items, first, time.perf_counter() - start, pool.stats()
+
+    items, first, elapsed, stats = _run(check)
+    assert items == [0, 1, 2, 3]
+    assert first == [0, 1]
+    assert elapsed < 1
+    assert stats["failures"] == stats["timeouts"] == 0
+
+
+def test_a_slow_reader_does_not_hold_the_worker():
+    async def check(pool):
+        pool.task_timeout = 0.5
+        pool.stream_buffer = 4
+        stream = pool.stream("count", 1000)
+        first = await stream.__anext__()
+        # the reader stalls; the worker is told to stop once the buffer stays full
+        start = time.perf_counter()
+        assert await pool.call("is_warm")
+        elapsed = time.perf_counter() - start
+        rest = []
+        with pytest.raises(ServiceError, match="too slow"):
+            async for item in stream:
+                rest.append(item)
+        return first, rest, elapsed, pool.stats()
+
+    first, rest, elapsed, stats = _run(check)
+    assert first == 0
+    assert rest == [1, 2, 3, 4]
+    assert elapsed < 1.5
+    assert stats["stalled"] == 1
+    assert stats["failures"] == stats["timeouts"] == 0
+
+
+def test_streams_and_waits_for_a_worker_are_bounded():
+    async def check(pool):
+        pool.acquire_timeout = 0.2
+        stream = pool.stream("count", 1000, 0.01)
+        await stream.__anext__()
+        with pytest.raises(ServiceOverloaded):
+            await pool.stream("count", 1).__anext__()
+        with pytest.raises(ServiceOverloaded):
+            await pool.call("is_warm")
+        await stream.aclose()
+        return await pool.call("is_warm"), pool.stats()
+
+    warm, stats = _run(check)
+    assert warm
+    assert stats["shed"] == 2
+    assert stats["streams"] == 0
+
+
+def test_tasks_run_on_workers_in_parallel():
+    async def check(pool):
+        pool.size = 2
+        await pool.start()
+        start = time.perf_counter()
+        pids = await asyncio.gather(*(pool.call("sleep", 0.5) for _ in range(2)))
+        return pids, time.perf_counter() - start
+
+    pids, elapsed = _run(check)
+    assert len(set(pids)) == 2
+    assert elapsed < 0.9
+
+
+def test_pooled_generator_batches_and_streams_in_workers():
+    from modules.core import ANSWER, PooledGenerator
+    from modules.generate import agenerator
+    from schemas.generate import GenerateQuery
+
+    async def check():
+        pool = ProcessPool("modules.core:build_local_generator", workers=1)
+        generator = PooledGenerator(pool, fingerprint="test")
+        try:
+            await generator.awarmup()
+            queries = [GenerateQuery(context=f"query {i}") for i in range(4)]
+            answers = await asyncio.gather(*(agenerator(query, generator) for query in queries))
+            tokens = [token async for token in generator.astream("q")]
+            return answers, tokens, generator.pool.stats()
+        finally:
+            await generator.aclose()
+
+    answers, tokens, stats = asyncio.run(check())
+    assert answers == [ANSWER] * 4
+    assert "".join(tokens).split() == ANSWER.split()
+    assert stats["tasks"] >= 2
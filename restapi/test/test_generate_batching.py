@@ -0,0 +1,98 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from api.routes.limiter import limiter
+from main import app
+from modules.batching import MicroBatcher
+
+
+def test_concurrent_requests_share_batches():
+    batches = []
+
+    def handle(items):
+        batches.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(handle, max_batch_size=4, max_wait=0.05)
+
+    async def run():
+        results = await asyncio.gather(*(batcher.submit(f"q{i}") for i in range(10)))
+        await batcher.aclose()
+        return results
+
+    assert asyncio.run(run()) == [f"Q{i}" for i in range(10)]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    stats = batcher.stats()
+    assert stats["batches"] == 3
+    assert stats["batch_size"]["buckets"]["le_4"] == 2
+    assert stats["queue_wait_ms"]["count"] == 10
+
+
+def test_a_lone_request_waits_at_most_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait=0.01)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await batcher.submit("q")
+        elapsed = loop.time() - start
+        await batcher.aclose()
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
+
+
+def test_errors_reach_only_their_callers():
+    def handle(items):
+        if "crash" in items:
+            raise RuntimeError("model crashed")
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(handle, max_batch_size=2, max_wait=0.05)
+
+    async def run():
+        first = await asyncio.gather(
+            batcher.submit("good"), batcher.submit("bad"), return_exceptions=True
+        )
+        second = await asyncio.gather(
+            batcher.submit("crash"), batcher.submit("good"), return_exceptions=True
+        )
+        await batcher.aclose()
+        return first, second
+
+    (good, bad), second = asyncio.run(run())
+    assert good == "good"
+    assert isinstance(bad, ValueError)
+    assert all(isinstance(result, RuntimeError) for result in second)
+    assert batcher.stats()["failures"] == 1
+
+
+def test_cancelled_callers_are_left_out_of_the_batch():
+    batches = []
+    batcher = MicroBatcher(lambda items: batches.append(items) or items, max_wait=0.05)
+
+    async def run():
+        cancelled = asyncio.create_task(batcher.submit("gone"))
+        kept = asyncio.create_task(batcher.submit("kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        result = await kept
+        await batcher.aclose()
+        return result
+
+    assert asyncio.run(run()) == "kept"
+    assert batches == [["kept"]]
+
+
+def test_generate_route_goes_through_the_batcher(auth_headers):
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/from_search", json={"context": "a long enough context"}, headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert client.get("/v1/metrics").json()["generate_batching"]["batches"] >= 1
+
+        limiter.reset()
+        response = client.post("/v1/from_search", json={"context": "ab"}, headers=auth_headers)
+        assert response.status_code == 404
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.routes import generate as generate_route
+from api.routes.admission import Admission
+from exceptions import ServiceOverloaded
+from main import app
+from modules.core import LLMGeneratorInit
+from modules.generate import stream_generator
+from modules.streaming import iterate_in_thread
+
+
+def test_producer_is_paused_by_a_slow_consumer_and_stopped_on_close():
+    produced = []
+    closed = threading.Event()
+
+    def tokens():
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield i
+        finally:
+            closed.set()
+
+    async def run():
+        chunks = iterate_in_thread(tokens, buffer_chunks=4)
+        received = [await chunks.__anext__() for _ in range(3)]
+        await asyncio.sleep(0.1)
+        ahead = len(produced) - len(received)
+        await chunks.aclose()
+        return received, ahead
+
+    received, ahead = asyncio.run(run())
+    assert received == [0, 1, 2]
+    assert ahead <= 4 + 1
+    assert closed.wait(1)
+    assert len(produced) < 1000
+
+
+def test_producer_errors_reach_the_consumer():
+    def tokens():
+        yield "a"
+        raise RuntimeError("decoder crashed")
+
+    async def run():
+        return [chunk async for chunk in iterate_in_thread(tokens)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+
+
+def test_stalled_streams_do_not_hold_the_default_executor():
+    def tokens():
+        for i in range(100):
+            yield threading.current_thread().name
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        # consumers that stopped reading keep their producers blocked on a full buffer
+        streams = [iterate_in_thread(tokens, buffer_chunks=1) for _ in range(4)]
+        names = [await asyncio.wait_for(stream.__anext__(), 1) for stream in streams]
+        await asyncio.sleep(0.05)
+        # other off-loop work still gets the default executor
+        result = await asyncio.wait_for(asyncio.to_thread(lambda: "done"), 1)
+        for stream in streams:
+            await stream.aclose()
+        return names, result
+
+    names, result = asyncio.run(run())
+    assert result == "done"
+    assert all(name.startswith("stream") for name in names)
+
+
+class _Generator(LLMGeneratorInit):
+    def __init__(self) -> None:
+        super().__init__()
+        self.stopped = threading.Event()
+
+    def generate_stream(self, query):
+        try:
+            while True:
+                time.sleep(0.01)
+                yield "token "
+        finally:
+            self.stopped.set()
+
+
+class _Query:
+    context = "a long enough context"
+
+
+class _Request:
+    def __init__(self, disconnect_after: float) -> None:
+        self.disconnect_after = disconnect_after
+
+    async def receive(self):
+        await asyncio.sleep(self.disconnect_after)
+        return {"type": "http.disconnect"}
+
+
+def test_disconnect_stops_generation():
+    llm_generator = _Generator()
+    disconnected = generate_route.stream_stats["disconnected"]
+
+    async def run():
+        events = generate_route._stream_events(
+            _Request(0.1),
+            stream_generator(_Query(), llm_generator),
+            time.perf_counter(),
+            Admission("interactive", None),
+        )
+        return [event async for event in events]
+
+    events = asyncio.run(run())
+    assert events and all(event.startswith(b"event: token") for event in events)
+    assert llm_generator.stopped.wait(1)
+    assert generate_route.stream_stats["disconnected"] == disconnected + 1
+    assert generate_route.stream_stats["active"] == 0
+
+
+def test_stream_slots_are_taken_before_the_response_starts(monkeypatch):
+    monkeypatch.setattr(generate_route, "GENERATE_MAX_STREAMS", 2)
+    llm_generator = _Generator()
+    disconnected = generate_route.stream_stats["disconnected"]
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def run():
+        responses = []
+        for _ in range(2):
+            stream_slot = generate_route._StreamSlot()
+            events = generate_route._stream_events(
+                _Request(10),
+                stream_generator(_Query(), llm_generator),
+                time.perf_counter(),
+                Admission("interactive", None),
+                stream_slot,
+            )
+            responses.append(generate_route._SSEResponse(events, stream_slot))
+        with pytest.raises(ServiceOverloaded):
+            generate_route._StreamSlot()
+        # the client is gone before the first chunk, so no body is ever iterated
+        for response in responses:
+            with pytest.raises(OSError):
+                await response({"type": "http"}, _Request(10).receive, send)
+
+    asyncio.run(run())
+    assert generate_route.stream_stats["active"] == 0
+    assert generate_route.stream_stats["disconnected"] == disconnected + 2
+
+
+def test_sse_stream(auth_headers):
+    headers = {**auth_headers, "Accept": "text/event-stream"}
+    with TestClient(app) as client:
+        with client.stream(
+            "POST", "/v1/from_search", json={"context": "a long enough context"}, headers=headers
+        ) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = "".join(response.iter_text())
+
+        events = [block.split("\n") for block in body.strip().split("\n\n")]
+        assert [lines[0] for lines in events[:-1]] == ["event: token"] * (len(events) - 1)
+        assert events[-1][0] == "event: done"
+        text = "".join(
+            json.loads(lines[1][len("data: "):])["text"] for lines in events[:-1]
+        )
+        assert text.strip() == "This is a api testing for generator module"
+
+        stats = client.get("/v1/metrics").json()["generate_stream"]
+        assert stats["time_to_first_token_ms"]["count"] >= 1
@@ -0,0 +1,141 @@
+import asyncio
+import sqlite3
+import threading
+
+from fastapi.testclient import TestClient
+
+from api.routes.generation_cache import GenerationCache, generation_key
+from api.routes.limiter import limiter
+from main import app
+from modules.core import LLMGeneratorInit
+from schemas import GenerateQuery
+
+
+def test_key_covers_query_and_model():
+    a = GenerateQuery(context="some  passage ", domain="history")
+    b = GenerateQuery.model_validate({"domain": "history", "context": "some passage"})
+    assert generation_key(a, "v1") == generation_key(b, "v1")
+    assert generation_key(a, "v1") != generation_key(a, "v2")
+    assert generation_key(a, "v1") != generation_key(
+        GenerateQuery(context="some passage", domain="history", task="best-title"), "v1"
+    )
+
+
+def test_entries_survive_reopening_and_are_evicted_by_size(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = GenerationCache(path, max_bytes=1000)
+    body = "x" * 98  # 100 bytes as JSON
+    for i in range(10):
+        cache.set(bytes([i]), "v1", body)
+    assert cache.bytes_used == 1000
+    assert cache.evictions == 0
+
+    reopened = GenerationCache(path, max_bytes=1000)
+    assert reopened.get(bytes([0])) == body
+    reopened.set(bytes([10]), "v1", body)
+    # the oldest entries go until the low watermark is reached
+    assert reopened.get(bytes([0])) is None
+    assert reopened.get(bytes([1])) is None
+    assert reopened.get(bytes([10])) == body
+    assert reopened.bytes_used <= 900
+    assert reopened.evictions == 2
+
+
+def test_writes_of_every_worker_count_towards_the_bound(tmp_path):
+    path = str(tmp_path / "cache.db")
+    workers = [GenerationCache(path, max_bytes=1000) for _ in range(2)]
+    body = "x" * 98  # 100 bytes as JSON
+    for i in range(12):
+        workers[i % 2].set(bytes([i]), "v1", body)
+    assert GenerationCache(path).bytes_used <= 1000
+    assert sum(worker.evictions for worker in workers) >= 2
+
+    def closed():
+        raise AssertionError("stats read the file")
+
+    workers[0]._connection = closed
+    stats = workers[0].stats()
+    assert stats["bytes_used"] <= 1000
+    assert stats["entries"] == stats["bytes_used"] // 100
+
+
+def test_purge_drops_answers_of_other_models(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.db"))
+    cache.set(b"a", "v1", "old")
+    cache.set(b"b", "v2", "new")
+    assert cache.purge("v2") == 1
+    assert cache.get(b"a") is None
+    assert cache.get(b"b") == "new"
+    assert cache.bytes_used == len('"new"')
+
+
+def test_failures_are_not_cached(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.db"))
+    item = GenerateQuery(context="some passage")
+
+    async def fail():
+        raise RuntimeError("generator down")
+
+    async def run():
+        try:
+            await cache.get_or_compute(item, "v1", fail)
+        except RuntimeError:
+            pass
+        return await cache.get_or_compute(item, "v1", lambda: asyncio.sleep(0, "answer"))
+
+    assert asyncio.run(run()) == "answer"
+    assert cache.misses == 2
+
+
+def test_cache_errors_do_not_fail_requests(tmp_path, monkeypatch):
+    cache = GenerationCache(str(tmp_path / "cache.db"))
+    item = GenerateQuery(context="some passage")
+    loop_thread = threading.current_thread()
+    io_threads = []
+
+    def locked(*args):
+        io_threads.append(threading.current_thread())
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "get", locked)
+    monkeypatch.setattr(cache, "set", locked)
+    answer = asyncio.run(cache.get_or_compute(item, "v1", lambda: asyncio.sleep(0, "answer")))
+
+    assert answer == "answer"
+    assert cache.misses == 1
+    # both the read and the write ran off the event loop
+    assert len(io_threads) == 2 and loop_thread not in io_threads
+
+
+class _CountingGenerator(LLMGeneratorInit):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def generate_batch(self, queries):
+        self.calls += len(queries)
+        return super().generate_batch(queries)
+
+
+def test_repeated_queries_skip_the_generator(auth_headers):
+    with TestClient(app) as client:
+        llm_generator = _CountingGenerator(model_version="1")
+        app.state.llm_generator = llm_generator
+        for _ in range(3):
+            limiter.reset()
+            response = client.post(
+                "/v1/from_search", json={"context": "a shared passage"}, headers=auth_headers
+            )
+            assert response.status_code == 200
+        assert llm_generator.calls == 1
+
+        # a new model version does not serve the old model's answers
+        upgraded = _CountingGenerator(model_version="2")
+        app.state.llm_generator = upgraded
+        limiter.reset()
+        client.post("/v1/from_search", json={"context": "a shared passage"}, headers=auth_headers)
+        assert upgraded.calls == 1
+
+        stats = client.get("/v1/metrics").json()["generation_cache"]
+        assert stats["hits"] >= 2
+        assert stats["entries"] == 2
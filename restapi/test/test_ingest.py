@@ -0,0 +1,152 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from api.routes.limiter import limiter
+from main import app
+from modules.core import SearcherInit
+from modules.engines import segments
+from modules.engines.numpy_index import NumpyIndex
+from modules.engines.segments import SegmentedIndex
+
+TEXTS = ["the quick brown fox", "a lazy dog sleeps", "quantum physics lecture"]
+
+
+def _index(store_path=None):
+    base = NumpyIndex.from_texts(TEXTS, ids=["fox", "dog", "physics"])
+    if store_path is not None:
+        base.save_store(store_path)
+        base = NumpyIndex.open(store_path)
+    return SegmentedIndex(base)
+
+
+def _top(index, query, k=1):
+    return index.search([query], k=k)[0][0]
+
+
+def test_ingest_replace_and_delete_before_compaction():
+    index = _index()
+    index.add(["cat"], ["a cat chasing mice"])
+    assert _top(index, "cat chasing mice") == ["cat"]
+
+    index.add(["fox"], ["stock market report"])
+    assert _top(index, "stock market report") == ["fox"]
+    # only the new version of "fox" is left, and it no longer matches the old text
+    ids, scores = index.search(["quick brown fox"], k=4)[0]
+    assert ids.count("fox") == 1
+    assert scores[ids.index("fox")] < 0.5
+
+    index.delete(["dog"])
+    assert "dog" not in _top(index, "lazy dog sleeps", k=4)
+    assert len(_top(index, "anything at all", k=10)) == 3
+
+
+def test_compaction_keeps_results_and_writes_a_snapshot(tmp_path):
+    index = _index(str(tmp_path / "corpus.emb"))
+    index.add(["cat", "fox"], ["a cat chasing mice", "stock market report"])
+    index.delete(["dog"])
+    queries = ["cat chasing mice", "stock market report", "quantum physics", "lazy dog"]
+    before = index.search(queries, k=3)
+
+    assert index.compact()
+    after = index.search(queries, k=3)
+
+    assert [ids for ids, _ in after] == [ids for ids, _ in before]
+    assert index.stats()["segments"] == 0
+    assert index.stats()["tombstones"] == 0
+    assert index.base.store.path == index.store_path
+    assert sorted(index.base.ids) == ["cat", "fox", "physics"]
+    assert not index.compact()
+
+
+def test_writes_during_compaction_are_kept(tmp_path, monkeypatch):
+    index = _index(str(tmp_path / "corpus.emb"))
+    index.add(["cat"], ["a cat chasing mice"])
+    write_chunks = segments.EmbeddingStore.write_chunks
+
+    def write_while_ingesting(*args, **kwargs):
+        index.add(["owl"], ["an owl at night"])
+        index.delete(["physics"])
+        write_chunks(*args, **kwargs)
+
+    monkeypatch.setattr(segments.EmbeddingStore, "write_chunks", write_while_ingesting)
+    assert index.compact()
+
+    assert index.stats()["segments"] == 1
+    assert _top(index, "owl at night") == ["owl"]
+    assert _top(index, "cat chasing mice") == ["cat"]
+    assert "physics" not in _top(index, "quantum physics lecture", k=5)
+
+
+def test_tombstones_are_part_of_the_searched_state():
+    index = _index()
+    state = index._state
+    index.add(["fox"], ["stock market report"])
+    index.delete(["dog"])
+    # a search holding the earlier state sees neither the new segment nor its tombstones
+    assert state.tombstones == {} and state.segments == ()
+    assert index._state.tombstones == {"fox": 1, "dog": 2}
+
+
+def test_workers_compacting_one_store_keep_each_others_documents(tmp_path):
+    path = str(tmp_path / "corpus.emb")
+    first = _index(path)
+    second = SegmentedIndex(NumpyIndex.open(path))
+    first.add(["cat"], ["a cat chasing mice"])
+    second.add(["owl"], ["an owl at night"])
+    second.delete(["dog"])
+
+    assert first.compact()
+    # the second worker merges into the snapshot the first one wrote, not its stale base
+    assert second.compact()
+    assert sorted(second.base.ids) == ["cat", "fox", "owl", "physics"]
+    assert first.refresh()
+    assert _top(first, "an owl at night") == ["owl"]
+
+
+def test_deletes_and_old_writes_trigger_compaction(monkeypatch):
+    monkeypatch.setattr(segments, "INGEST_COMPACT_DOCS", 2)
+    index = _index()
+    assert not index.needs_compaction()
+    index.delete(["dog", "fox"])
+    assert index.needs_compaction()
+    assert index.compact()
+    assert not index.needs_compaction()
+
+    monkeypatch.setattr(segments, "INGEST_COMPACT_MAX_AGE", 0.05)
+    index.add(["cat"], ["a cat chasing mice"])
+    assert not index.needs_compaction()
+    time.sleep(0.06)
+    assert index.needs_compaction()
+
+
+def test_shutdown_compacts_ingested_documents(tmp_path):
+    path = str(tmp_path / "corpus.emb")
+    with TestClient(app):
+        index = _index(path)
+        app.state.search_engine = SearcherInit(numpy_index=index)
+        index.add(["cat"], ["a cat chasing mice"])
+        index.delete(["dog"])
+    # a restarted worker finds the writes in the store
+    assert sorted(NumpyIndex.open(path).ids) == ["cat", "fox", "physics"]
+
+
+def test_ingestion_route(auth_headers):
+    app.state.search_engine = SearcherInit(numpy_index=_index())
+    client = TestClient(app)
+    response = client.post(
+        "/v1/documents",
+        json={"documents": [{"id": "cat", "text": "a cat chasing mice"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["ingested"] == 1
+
+    search = {"context": "cat chasing mice", "engine_type": "numpy", "top_k": 1}
+    assert client.post("/v1/from_query", json=search, headers=auth_headers).json()["ids"] == ["cat"]
+
+    response = client.post("/v1/documents/delete", json={"ids": ["cat"]}, headers=auth_headers)
+    assert response.status_code == 200
+    limiter.reset()
+    assert client.post("/v1/from_query", json=search, headers=auth_headers).json()["ids"] != ["cat"]
+    app.state.search_engine = None
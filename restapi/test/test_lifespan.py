@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+def test_backends_are_built_once_and_ready_after_warmup():
+    assert TestClient(app).get("/ready").status_code == 503
+
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json() == {"message": "ready"}
+
+        search_engine = app.state.search_engine
+        llm_generator = app.state.llm_generator
+        assert search_engine is not None
+        assert llm_generator is not None
+
+    assert app.state.ready is False
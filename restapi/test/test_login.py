@@ -0,0 +1,138 @@
+import asyncio
+import secrets
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from api.middlewares.gen_access_token import TOKEN_CLAIMS, GenAccToken
+from api.middlewares.password_hasher import PasswordHasher
+from api.middlewares.revocation import TokenRevocationList
+from database.users import user_store
+from main import app
+
+client = TestClient(app)
+
+
+def test_averify_does_not_block_the_event_loop():
+    hasher = PasswordHasher(max_workers=1, max_concurrency=1)
+    hashed = hasher.hash("secret")
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(
+            hasher.averify("secret", hashed), hasher.averify("wrong", hashed)
+        )
+        task.cancel()
+        return results, ticks
+
+    start = time.perf_counter()
+    results, ticks = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    hasher.close()
+
+    assert results == [True, False]
+    # the loop kept running while bcrypt was busy on the worker thread
+    assert ticks >= int(elapsed / 0.01) // 2
+
+
+def test_login_for_access_token():
+    response = client.post(
+        "/login_for_access_token", data={"username": "tim", "password": "tim1234"}
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["token_type"] == "bearer"
+    assert response.json()["refresh_token"]
+
+    response = client.post(
+        "/login_for_access_token", data={"username": "tim", "password": "wrong"}
+    )
+    assert response.status_code == 401
+
+
+def test_refresh_access_token_rotates_refresh_token():
+    response = client.post(
+        "/login_for_access_token", data={"username": "tim", "password": "tim1234"}
+    )
+    refresh_token = response.json()["refresh_token"]
+
+    response = client.post(
+        "/refresh_access_token", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+    assert tokens["refresh_token"] != refresh_token
+
+    # the new access token is accepted, the refresh token is not an access token
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = client.post("/v1/from_query", json={"context": "example"}, headers=headers)
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {tokens['refresh_token']}"}
+    response = client.post("/v1/from_query", json={"context": "example"}, headers=headers)
+    assert response.status_code == 401
+
+    # a used refresh token is revoked
+    response = client.post(
+        "/refresh_access_token", json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 401
+
+
+def test_revocations_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "revoked.db")
+    # two workers open the same file
+    first, second = TokenRevocationList(path), TokenRevocationList(path)
+    jti = secrets.token_hex(16)
+
+    assert first.revoke(jti, expires_at=time.time() + 60)
+    assert second.is_revoked(jti)
+    # the second use of a refresh token loses, whichever worker sees it
+    assert not second.revoke(jti, expires_at=time.time() + 60)
+
+    first.revoke(secrets.token_hex(16), expires_at=time.time() - 1)
+    assert len(second) == 2
+    second.prune()
+    assert len(first) == 1
+
+
+def test_tokens_do_not_carry_the_password_hash():
+    response = client.post(
+        "/login_for_access_token", data={"username": "tim", "password": "tim1234"}
+    )
+    tokens = response.json()
+    for token in (tokens["access_token"], tokens["refresh_token"]):
+        claims = jwt.get_unverified_claims(token)
+        assert "hashed_password" not in claims
+        assert set(claims) <= set(TOKEN_CLAIMS) | {"exp", "typ", "jti"}
+
+    # the claims of a token built from a full user record are filtered too
+    token_generator = GenAccToken()
+    user = token_generator.get_user(db=user_store, token_data="tim")
+    claims = jwt.get_unverified_claims(
+        token_generator.create_access_token(data=user.model_dump())
+    )
+    assert claims["username"] == "tim"
+    assert "hashed_password" not in claims
+
+
+def test_async_login_looks_the_user_up_off_the_event_loop():
+    lookup_threads = []
+
+    class Users(dict):
+        def get(self, username, default=None):
+            lookup_threads.append(threading.current_thread())
+            return user_store.get(username, default)
+
+    token_generator = GenAccToken(users=Users())
+    user = asyncio.run(token_generator.aauthenticate_user("tim", "tim1234"))
+    assert user.username == "tim"
+    assert lookup_threads and threading.main_thread() not in lookup_threads
@@ -0,0 +1,90 @@
+import asyncio
+import gc
+
+from fastapi.testclient import TestClient
+
+from api.routes.limiter import limiter
+from main import app
+from modules.memory import MemoryGovernor, rss_mb
+
+
+def test_install_tunes_thresholds_and_uninstall_restores_them():
+    before = gc.get_threshold()
+    governor = MemoryGovernor(thresholds=(12345, 7, 99))
+    governor.install()
+    try:
+        assert gc.get_threshold() == (12345, 7, 99)
+        governor.freeze()
+        assert gc.get_freeze_count() > 0
+    finally:
+        governor.uninstall()
+    assert gc.get_threshold() == before
+    assert gc.get_freeze_count() == 0
+    assert governor._on_gc not in gc.callbacks
+
+
+def test_pauses_are_recorded_per_generation():
+    governor = MemoryGovernor(thresholds=None)
+    governor.install()
+    try:
+        gc.collect(0)
+        duration = governor.collect("timer")
+    finally:
+        governor.uninstall()
+    stats = governor.stats()
+    assert stats["pause_ms"]["gen0"]["count"] >= 1
+    assert stats["pause_ms"]["gen2"]["count"] >= 1
+    assert stats["full_collections"] == {"timer": 1, "watermark": 0}
+    assert stats["last_full_ms"] == duration
+    assert rss_mb() is None or stats["rss_mb"] > 0
+
+
+def test_collections_run_on_the_timer_or_above_the_watermark():
+    rss = 100.0
+    governor = MemoryGovernor(
+        thresholds=None,
+        full_interval=60,
+        rss_watermark_mb=500,
+        check_interval=0.01,
+        min_interval=0,
+        rss=lambda: rss,
+    )
+    assert governor.due() is None
+
+    async def run_for(seconds):
+        task = asyncio.ensure_future(governor.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+
+    asyncio.run(run_for(0.05))
+    assert governor.collections == {"timer": 0, "watermark": 0}
+
+    rss = 800.0
+    governor.min_interval = 10
+    asyncio.run(run_for(0.05))
+    # the last collection was too recent
+    assert governor.collections["watermark"] == 0
+
+    governor.min_interval = 0
+    asyncio.run(run_for(0.05))
+    assert governor.collections["watermark"] >= 1
+
+    governor.rss_watermark_mb = 0
+    governor.full_interval = 0
+    assert governor.due() == "timer"
+
+
+def test_requests_do_not_collect(auth_headers, monkeypatch):
+    full_collections = []
+    monkeypatch.setattr(gc, "collect", lambda *args: full_collections.append(args) or 0)
+    with TestClient(app) as client:
+        startup = len(full_collections)
+        for path in ("/v1/from_query", "/v1/from_search"):
+            limiter.reset()
+            response = client.post(path, json={"context": "some passage"}, headers=auth_headers)
+            assert response.status_code == 200
+        assert len(full_collections) == startup
+
+        stats = client.get("/v1/metrics").json()["memory"]
+        assert stats["frozen_objects"] > 0
+    assert gc.get_freeze_count() == 0
@@ -0,0 +1,74 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from main import app
+from modules.core import SearcherInit
+from modules.engines import numpy_index
+from modules.engines.numpy_index import NumpyIndex, normalize
+
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((5000, 64)).astype(np.float32)
+    queries = rng.standard_normal((8, 64)).astype(np.float32)
+    index = NumpyIndex(embeddings, [str(i) for i in range(5000)], chunk_rows=700)
+
+    rows, scores = index.search_vectors(queries, k=25)
+
+    exact = normalize(queries) @ normalize(embeddings).T
+    expected = np.argsort(-exact, axis=1)[:, :25]
+    np.testing.assert_array_equal(rows, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(exact, expected, axis=1), rtol=1e-5)
+
+
+def test_big_batches_score_fewer_rows_per_chunk(monkeypatch):
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((3000, 32)).astype(np.float32)
+    queries = rng.standard_normal((64, 32)).astype(np.float32)
+    index = NumpyIndex(embeddings, [str(i) for i in range(3000)], chunk_scores=64 * 500)
+    shapes = []
+    top_k = numpy_index.top_k
+
+    def recording_top_k(scores, k):
+        shapes.append(scores.shape)
+        return top_k(scores, k)
+
+    monkeypatch.setattr(numpy_index, "top_k", recording_top_k)
+    rows, _ = index.search_vectors(queries, k=10)
+
+    # chunk products only; merges of running top-k are (64, 20)
+    products = [shape for shape in shapes if shape[1] > 20]
+    assert max(rows * queries for queries, rows in products) <= 64 * 500
+    exact = normalize(queries) @ normalize(embeddings).T
+    np.testing.assert_array_equal(rows, np.argsort(-exact, axis=1)[:, :10])
+
+
+def test_k_larger_than_corpus_and_empty_index():
+    index = NumpyIndex(np.eye(3, dtype=np.float32), ["a", "b", "c"])
+    rows, _ = index.search_vectors(np.array([0, 1, 0], dtype=np.float32), k=10)
+    assert rows.shape == (1, 3)
+    assert rows[0, 0] == 1
+
+    empty = NumpyIndex(np.zeros((0, 3), dtype=np.float32), [])
+    rows, scores = empty.search_vectors(np.ones(3, dtype=np.float32), k=5)
+    assert rows.shape == (1, 0)
+
+
+def test_search_route_with_numpy_engine(tmp_path, auth_headers):
+    texts = ["the quick brown fox", "a lazy dog sleeps", "quantum physics lecture"]
+    index = NumpyIndex.from_texts(texts, ids=["fox", "dog", "physics"])
+    index.save(tmp_path / "index.npz")
+    app.state.search_engine = SearcherInit(
+        numpy_index=NumpyIndex.load(str(tmp_path / "index.npz"))
+    )
+
+    response = TestClient(app).post(
+        "/v1/from_query",
+        json={"context": "quick brown fox", "engine_type": "numpy", "top_k": 2},
+        headers=auth_headers,
+    )
+    app.state.search_engine = None
+
+    assert response.status_code == 200, response.text
+    assert response.json()["ids"][0] == "fox"
+    assert len(response.json()["scores"]) == 2
@@ -0,0 +1,95 @@
+import multiprocessing
+import time
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from api.middlewares.gen_access_token import GenAccToken
+from api.routes.limiter import RATE_LIMIT_TIERS, limiter, principal_key, role_quota
+from api.routes.token_bucket import SQLiteTokenBuckets
+from main import app
+
+
+def _hammer(directory: str, n_hits: int, queue) -> None:
+    buckets = SQLiteTokenBuckets(directory=directory, shards=2)
+    allowed = sum(
+        buckets.hit("shared", capacity=20, rate=1e-6)[0] for _ in range(n_hits)
+    )
+    queue.put(allowed)
+
+
+def test_bucket_allows_capacity_then_refills(tmp_path):
+    buckets = SQLiteTokenBuckets(directory=str(tmp_path), shards=2)
+    results = [buckets.hit("key", capacity=3, rate=20)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+
+    time.sleep(0.1)
+    assert buckets.hit("key", capacity=3, rate=20)[0]
+    assert buckets.hit("other", capacity=3, rate=20)[0]
+
+
+def test_bucket_is_shared_between_processes(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [
+        context.Process(target=_hammer, args=(str(tmp_path), 25, queue))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    allowed = sum(queue.get(timeout=60) for _ in workers)
+    for worker in workers:
+        worker.join()
+
+    assert allowed == 20
+
+
+def test_prune_drops_full_buckets(tmp_path):
+    buckets = SQLiteTokenBuckets(directory=str(tmp_path), shards=1, prune_every=2)
+    buckets.hit("key", capacity=1, rate=1000)
+    time.sleep(0.01)
+    buckets.hit("other", capacity=1, rate=1e-6)
+
+    rows = buckets._connection(0).execute("SELECT key FROM buckets").fetchall()
+    assert rows == [("other",)]
+
+
+def _token() -> str:
+    token_generator = GenAccToken()
+    user = token_generator.authenticate_user(username="tim", password="tim1234")
+    return token_generator.create_access_token(data=user.model_dump())
+
+
+def test_route_is_rate_limited():
+    headers = {"Authorization": f"Bearer {_token()}"}
+
+    limiter.reset()
+    client = TestClient(app)
+    responses = [
+        client.post("/v1/from_query", json={"context": "example"}, headers=headers)
+        for _ in range(2)
+    ]
+    assert [response.status_code for response in responses] == [200, 429]
+
+
+def test_limits_are_keyed_on_the_verified_principal():
+    request = Request({"type": "http", "headers": [], "client": ("10.0.0.1", 1234)})
+    assert principal_key(request) == "ip:10.0.0.1"
+
+    request.state.user = GenAccToken.get_user(
+        token_data={"username": "tim", "idm_role": "Viewer", "hashed_password": "x"}
+    )
+    assert principal_key(request) == "Viewer:tim"
+    assert role_quota("Viewer:tim") == RATE_LIMIT_TIERS["Viewer"]
+    assert role_quota("ip:10.0.0.1") == RATE_LIMIT_TIERS["default"]
+
+
+def test_rate_limited_response_has_retry_after():
+    limiter.reset()
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {_token()}"}
+    client.post("/v1/from_query", json={"context": "example"}, headers=headers)
+    response = client.post("/v1/from_query", json={"context": "example"}, headers=headers)
+
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 2
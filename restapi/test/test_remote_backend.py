@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.weaviate_standin import BackgroundServer, create_app
+from exceptions import ServiceError
+from modules.core import SearcherInit
+from modules.engines.remote import RemoteSearchBackend
+from modules.search import asearcher
+from schemas import SearchQuery
+
+
+@pytest.fixture(scope="module")
+def standin():
+    app = create_app(latency=0.01)
+    with BackgroundServer(app) as url:
+        yield app, url
+
+
+def test_queries_reuse_pooled_connections(standin):
+    app, url = standin
+    app.state.connections.clear()
+
+    async def run():
+        backend = RemoteSearchBackend(url, max_connections=4)
+        try:
+            for _ in range(5):
+                ids, scores = await backend.search("quick brown fox", top_k=3)
+            results = await asyncio.gather(
+                *(backend.search(f"query {i}", top_k=1) for i in range(40))
+            )
+        finally:
+            await backend.aclose()
+        return ids, scores, results
+
+    ids, scores, results = asyncio.run(run())
+    assert ids == ["doc-0", "doc-1", "doc-2"]
+    assert scores == pytest.approx([1.0, 0.99, 0.98])
+    assert len(results) == 40
+    assert len(app.state.connections) <= 4
+
+
+def test_batch_queries_with_per_item_errors(standin):
+    _, url = standin
+
+    async def run():
+        backend = RemoteSearchBackend(url, batch_size=2)
+        searcher = SearcherInit(engine_type="weaviate", remote=backend)
+        item = SearchQuery(context=["first query", "fail please", "abc", "third query"], top_k=2)
+        try:
+            return await asearcher(item, searcher), backend.requests
+        finally:
+            await backend.aclose()
+
+    response, requests = asyncio.run(run())
+    results = response.results
+    assert results[0].ids == ["doc-0", "doc-1"]
+    assert "cannot vectorize" in results[1].error
+    assert results[2].error == "Invalid input [input]"
+    assert results[3].ids == ["doc-0", "doc-1"]
+    # three valid queries in batches of two
+    assert requests == 2
+
+
+def test_slow_backend_times_out(standin):
+    app, url = standin
+    app.state.latency = 0.5
+
+    async def run():
+        backend = RemoteSearchBackend(url, timeout=0.05)
+        try:
+            await backend.search("quick brown fox")
+        finally:
+            await backend.aclose()
+
+    try:
+        with pytest.raises(ServiceError):
+            asyncio.run(run())
+    finally:
+        app.state.latency = 0.01
+
+
+@pytest.mark.parametrize(
+    "path, content",
+    [
+        ("/v1/graphql", b"<html>bad gateway</html>"),
+        ("/v1/graphql", b"[]"),
+        ("/v1/graphql", b'{"data": {"Get": {"Document": [{"_additional": {}}]}}}'),
+        ("/v1/graphql/batch", b'[{"data": {"Get": {"Document": []}}}]'),
+        ("/v1/graphql/batch", b'{"data": null}'),
+    ],
+)
+def test_malformed_responses_raise_service_errors(path, content):
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(
+            200, content=content, headers={"content-type": "application/json"}
+        )
+    )
+
+    async def run():
+        backend = RemoteSearchBackend("http://weaviate", transport=transport)
+        try:
+            if path == "/v1/graphql":
+                await backend.search("quick brown fox")
+            else:
+                # two queries, at most one answer
+                await backend.search_batch(["first query", "second query"])
+        finally:
+            await backend.aclose()
+
+    with pytest.raises(ServiceError):
+        asyncio.run(run())
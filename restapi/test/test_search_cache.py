@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.routes import admin
+from api.routes.limiter import limiter
+from api.routes.search_cache import (
+    ENTRY_OVERHEAD,
+    SearchResultCache,
+    query_key,
+    search_cache,
+    with_query,
+)
+from main import app
+from schemas import SearchQuery
+
+
+def test_key_ignores_field_order_and_spacing():
+    a = SearchQuery(context="quick  brown fox ", engine_type="numpy")
+    b = SearchQuery.model_validate({"engine_type": "numpy", "context": "quick brown fox"})
+    assert query_key(a) == query_key(b)
+    assert query_key(a) != query_key(SearchQuery(context="quick brown fox"))
+
+
+def test_bounded_by_bytes_and_invalidated_by_engine():
+    cache = SearchResultCache(max_bytes=3 * (100 + ENTRY_OVERHEAD), ttl=60)
+    for i in range(4):
+        cache.set(bytes([i]), b"x" * 100, engine_type="numpy" if i % 2 else "weaviate")
+
+    assert cache.get(bytes([0])) is None
+    assert cache.bytes_used == 3 * (100 + ENTRY_OVERHEAD)
+    assert cache.stats()["evictions"] == 1
+
+    assert cache.invalidate("numpy") == 2
+    assert cache.get(bytes([2])) == b"x" * 100
+    assert cache.bytes_used == 100 + ENTRY_OVERHEAD
+
+
+def test_concurrent_misses_share_one_call():
+    cache = SearchResultCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"result"
+
+    async def burst():
+        return await asyncio.gather(
+            *(cache.get_or_compute(b"key", "numpy", compute) for _ in range(20))
+        )
+
+    assert asyncio.run(burst()) == [b"result"] * 20
+    assert calls == 1
+    assert cache.stats()["merged"] == 19
+
+
+def test_failed_computation_is_not_cached():
+    cache = SearchResultCache()
+
+    async def compute():
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute(b"key", "numpy", compute))
+    assert len(cache) == 0
+
+
+def test_route_hits_cache_and_admin_invalidates(auth_headers):
+    client = TestClient(app)
+    payload = {"context": "example query"}
+    first = client.post("/v1/from_query", json=payload, headers=auth_headers)
+    limiter.reset()
+    second = client.post("/v1/from_query", json=payload, headers=auth_headers)
+    assert first.json() == second.json()
+    assert search_cache.stats()["hits"] >= 1
+
+    response = client.post(
+        "/v1/admin/search_cache/invalidate",
+        json={"engine_type": "weaviate"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["removed"] == 1
+    assert client.get("/v1/metrics").json()["search_cache"]["entries"] == 0
+
+
+def test_invalidate_requires_admin(auth_headers, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_USERNAMES", set())
+    response = TestClient(app).post(
+        "/v1/admin/search_cache/invalidate", json={}, headers=auth_headers
+    )
+    assert response.status_code == 403
+
+
+def test_hit_echoes_the_query_of_the_request(auth_headers):
+    client = TestClient(app)
+    hits = search_cache.hits
+    first = client.post("/v1/from_query", json={"context": "example query"}, headers=auth_headers)
+    limiter.reset()
+    second = client.post(
+        "/v1/from_query", json={"context": "  example   query "}, headers=auth_headers
+    )
+    assert search_cache.hits == hits + 1
+    assert first.json()["query"] == "example query"
+    assert second.json()["query"] == "  example   query "
+    assert {**second.json(), "query": "example query"} == first.json()
+
+
+def test_with_query_restamps_batches():
+    body = b'{"results":[{"query":"a b","ids":[]},{"query":"c","ids":[]}]}'
+    assert with_query(body, ["a b", "c"]) is body
+    restamped = json.loads(with_query(body, ["a  b", "c"]))
+    assert [item["query"] for item in restamped["results"]] == ["a  b", "c"]
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from api.routes.limiter import limiter
+from main import app
+from modules.core import SearcherInit
+from modules.engines.numpy_index import NumpyIndex
+from modules.search import NDJSON_CHUNK_HITS, stream_searcher
+from schemas import SearchQuery
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+def _searcher(size=1000):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((size, 384)).astype(np.float32)
+    return SearcherInit(numpy_index=NumpyIndex(embeddings, [f"doc-{i}" for i in range(size)]))
+
+
+def test_stream_yields_header_then_hits_in_chunks():
+    item = SearchQuery(context="quick brown fox", engine_type="numpy", top_k=600)
+
+    async def collect():
+        return [chunk async for chunk in stream_searcher(item, _searcher())]
+
+    chunks = asyncio.run(collect())
+    header = json.loads(chunks[0])
+    assert header["top_k"] == 600
+    assert len(chunks) == 1 + -(-600 // NDJSON_CHUNK_HITS)
+
+    hits = [json.loads(line) for chunk in chunks[1:] for line in chunk.splitlines()]
+    assert [hit["rank"] for hit in hits] == list(range(1, 601))
+    expected = _searcher().search("quick brown fox", engine_type="numpy", top_k=600)
+    assert [hit["id"] for hit in hits] == expected["ids"]
+
+
+def test_route_streams_ndjson(auth_headers):
+    app.state.search_engine = _searcher()
+    response = TestClient(app).post(
+        "/v1/from_query",
+        json={"context": "quick brown fox", "engine_type": "numpy", "top_k": 50},
+        headers={**auth_headers, **NDJSON},
+    )
+    app.state.search_engine = None
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert json.loads(lines[0])["query"] == "quick brown fox"
+    assert len(lines) == 51
+
+
+def test_stream_keeps_auth_rate_limit_and_validation(auth_headers):
+    client = TestClient(app)
+    payload = {"context": "example query"}
+    assert client.post("/v1/from_query", json=payload, headers=NDJSON).status_code == 401
+
+    headers = {**auth_headers, **NDJSON}
+    assert client.post("/v1/from_query", json=payload, headers=headers).status_code == 200
+    assert client.post("/v1/from_query", json=payload, headers=headers).status_code == 429
+
+    limiter.reset()
+    response = client.post("/v1/from_query", json={"context": "abc"}, headers=headers)
+    assert response.status_code == 404
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from api.middlewares.gen_access_token import GenAccToken
+from api.middlewares.token_cache import TokenCache
+from api.middlewares.user_auth import AuthenticationMiddleware
+
+
+def test_cache_hit_and_miss():
+    cache = TokenCache(max_size=2)
+    assert cache.get("token-a") is None
+
+    cache.set("token-a", "user-a", expires_at=time.time() + 60)
+    assert cache.get("token-a") == "user-a"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TokenCache(max_size=2)
+    cache.set("token-a", "user-a", expires_at=time.time() + 60)
+    cache.set("token-b", "user-b", expires_at=time.time() + 60)
+    cache.get("token-a")
+    cache.set("token-c", "user-c", expires_at=time.time() + 60)
+
+    assert cache.get("token-b") is None
+    assert cache.get("token-a") == "user-a"
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire():
+    cache = TokenCache()
+    cache.set("token-a", "user-a", expires_at=time.time() - 1)
+    assert cache.get("token-a") is None
+
+    cache.set("token-b", "user-b", expires_at=time.time() + 0.05)
+    time.sleep(0.1)
+    assert cache.get("token-b") is None
+    assert len(cache) == 0
+
+
+def test_middleware_reuses_verified_token():
+    token_generator = GenAccToken()
+    user = token_generator.authenticate_user(username="tim", password="tim1234")
+    token = token_generator.create_access_token(data=user.model_dump())
+
+    middleware = AuthenticationMiddleware(app=None)
+    middleware.token_cache.clear()
+    assert asyncio.run(middleware._verify_token(token))
+    assert asyncio.run(middleware._verify_token(token))
+    assert middleware.token_cache.stats()["hits"] >= 1
+    assert not asyncio.run(middleware._verify_token("not-a-token"))
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from database.users import UserStore
+
+
+def _user(username: str, **kwargs) -> dict:
+    user = {
+        "username": username,
+        "email": f"{username}@example.com",
+        "full_name": username,
+        "idm_role": "Viewer",
+        "hashed_password": "hashed",
+        "disabled": False,
+    }
+    user.update(kwargs)
+    return user
+
+
+def test_import_and_get_user():
+    store = UserStore(url="sqlite://")
+    count = store.import_users((_user(f"user{i}") for i in range(2500)), batch_size=1000)
+
+    assert count == 2500
+    assert store.get("user1234")["email"] == "user1234@example.com"
+    assert store.get("missing") is None
+    assert "user0" in store
+
+
+def test_import_is_atomic():
+    store = UserStore(url="sqlite://")
+    with pytest.raises(IntegrityError):
+        store.import_users([_user("alice"), _user("bob"), _user("alice")])
+    assert store.get("bob") is None
+
+
+def test_status_is_served_from_cache():
+    store = UserStore(url="sqlite://", cache_ttl=60)
+    store.import_users([_user("alice")])
+    assert store.get_status("alice") == ("Viewer", False)
+
+    with store.engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE users SET disabled = 1")
+    assert store.get_status("alice") == ("Viewer", False)
+
+    store.invalidate("alice")
+    assert store.get_status("alice") == ("Viewer", True)
+
+
+def test_unknown_users_are_cached():
+    store = UserStore(url="sqlite://", negative_ttl=60)
+    assert store.get_status("alice") is None
+
+    reads = []
+    store.get = lambda username, default=None: reads.append(username)
+    assert store.get_status("alice") is None
+    assert asyncio.run(store.aget_status("alice")) is None
+    assert reads == []
+
+    # importing users drops the cached misses
+    del store.get
+    store.import_users([_user("alice")])
+    assert asyncio.run(store.aget_status("alice")) == ("Viewer", False)
+
+
+def test_aget_status_reads_misses_off_the_event_loop():
+    store = UserStore(url="sqlite://")
+    store.import_users([_user("alice")])
+    threads = []
+    get = store.get
+
+    def get_on_thread(username, default=None):
+        threads.append(threading.current_thread())
+        return get(username, default)
+
+    store.get = get_on_thread
+    assert asyncio.run(store.aget_status("alice")) == ("Viewer", False)
+    assert threads and threads[0] is not threading.main_thread()
+    # the second lookup is a cache hit
+    assert asyncio.run(store.aget_status("alice")) == ("Viewer", False)
+    assert len(threads) == 1